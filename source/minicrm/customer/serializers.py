@@ -1,7 +1,9 @@
 from rest_framework import serializers
+from minicrm.fieldsets import SparseFieldsetSerializerMixin
+from minicrm.metrics import TimedSerializerMixin
 from .models import Customer
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(TimedSerializerMixin, SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Customer
         fields = '__all__'
@@ -1,3 +1,60 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from minicrm.explain import sequential_scans
+
+from .models import Customer
+
+
+class CustomerSparseFieldsetTests(APITestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            name='Alice',
+            email='alice@example.com',
+            phone='500000000',
+            address='Test street 1'
+        )
+
+    def test_fields_select_only_requested_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                f'/api/customers/{self.customer.id}/?fields=name,email')
+
+        self.assertEqual(response.data, {'name': 'Alice', 'email': 'alice@example.com'})
+        self.assertNotIn('address', queries.captured_queries[0]['sql'])
+
+    def test_writes_ignore_fields(self):
+        response = self.client.patch(
+            f'/api/customers/{self.customer.id}/?fields=name',
+            {'phone': '600000000'}, format='json'
+        )
+        self.assertEqual(response.data['phone'], '600000000')
+        self.assertIn('address', response.data)
+
+
+class CustomerQueryPlanTests(TestCase):
+    def setUp(self):
+        Customer.objects.bulk_create([
+            Customer(
+                name=f'Customer {i}',
+                email=f'customer{i}@example.com',
+                phone='500000000',
+                address='Test street 1'
+            )
+            for i in range(50)
+        ])
+
+    def test_lookup_by_email_uses_the_unique_index(self):
+        self.assertEqual(
+            sequential_scans(Customer.objects.filter(email='customer7@example.com')),
+            set()
+        )
+
+    def test_unindexed_lookup_is_reported(self):
+        # Guards the check itself: a filter without an index is a full scan
+        self.assertEqual(
+            sequential_scans(Customer.objects.filter(phone='500000000')),
+            {'customer_customer'}
+        )
@@ -1,10 +1,17 @@
 from django.shortcuts import render
 from rest_framework import viewsets
+from minicrm.asyncviews import AsyncReadViewSetMixin
+from minicrm.export import ExportViewSetMixin
+from minicrm.fastlist import FastListViewSetMixin
+from minicrm.fieldsets import SparseFieldsetViewSetMixin
 from .models import Customer
 from .serializers import CustomerSerializer
 
-class CustomerViewSet(viewsets.ModelViewSet):
+class CustomerViewSet(AsyncReadViewSetMixin, ExportViewSetMixin, FastListViewSetMixin, SparseFieldsetViewSetMixin, viewsets.ModelViewSet):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
+    keyset_ordering = ('id',)
+    # Served from read replicas (see minicrm/routers.py)
+    replica_actions = ('list', 'retrieve', 'export')
 
 # Create your views here.
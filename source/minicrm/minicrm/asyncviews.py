@@ -0,0 +1,198 @@
+"""
+Async read path of the API for ASGI deployments (API_ASYNC_READS).
+
+Under gunicorn's sync workers every request holds a worker process from
+the first byte it sends to the last byte it reads, so a few slow clients
+can occupy all of them. Served by an ASGI server (minicrm/asgi.py, e.g.
+uvicorn workers), one process interleaves many connections; the async
+views below serve the read-only endpoints without holding a thread while
+they wait for the database:
+
+- GET list and detail of customers, products, orders and RFM scores
+  (AsyncReadViewSetMixin: alist, aretrieve)
+- GET /api/rfm/by-segment/ and /api/rfm/statistics/ (RFMScoreViewSet)
+
+They run the DRF viewset's own configuration: get_queryset() with
+?fields= and ?expand=, the serializers, keyset pagination, the fast list
+path and the exception handler; only the queries go through the async
+ORM, so responses are identical to the sync views'. async_read_urls()
+swaps them into the router's URL patterns, keeping the URL names.
+
+Everything else on those URLs goes to the sync DRF view, run in a thread:
+writes, content types other than JSON (the browsable API), and viewsets
+that authenticate, check permissions or throttle, which the async path
+does not do (the API is public: DRF's default AllowAny).
+"""
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse
+from django.urls import URLPattern
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+
+from .metrics import timed_serialization
+
+
+ASYNC_METHODS = ('GET', 'HEAD')
+# Prefix of the async variant of a viewset action (list -> alist)
+ASYNC_ACTION_PREFIX = 'a'
+
+
+class AsyncReadViewSetMixin:
+    """
+    ViewSet mixin adding async variants of list() and retrieve().
+
+    Uses the fast list path when the viewset has FastListViewSetMixin and
+    settings.API_FAST_LIST is on, and the paginator's apaginate_queryset()
+    when it has one.
+    """
+
+    async def apaginate(self, queryset):
+        paginator = self.paginator
+        if paginator is None:
+            return [row async for row in queryset]
+        if hasattr(paginator, 'apaginate_queryset'):
+            return await paginator.apaginate_queryset(queryset, self.request, view=self)
+        return await sync_to_async(paginator.paginate_queryset)(
+            queryset, self.request, view=self)
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        get_list_reader = getattr(self, 'get_list_reader', None)
+        reader = get_list_reader(queryset) if get_list_reader else None
+
+        if reader is None:
+            page = await self.apaginate(queryset)
+            data = self.get_serializer(page, many=True).data
+        else:
+            rows = await self.apaginate(self.get_list_rows(queryset, reader))
+            with timed_serialization():
+                data = await reader.aread(rows)
+        if self.paginator is None:
+            return Response(data)
+        return self.paginator.get_paginated_response(data)
+
+    async def aget_object(self):
+        """get_object() through the async ORM."""
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        filter_kwargs = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        # Same errors as rest_framework.generics.get_object_or_404
+        try:
+            obj = await queryset.aget(**filter_kwargs)
+        except queryset.model.DoesNotExist:
+            raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        return Response(self.get_serializer(instance).data)
+
+
+def is_public(viewset):
+    """Whether a viewset neither restricts nor throttles its requests."""
+    return not viewset.throttle_classes and all(
+        issubclass(permission, AllowAny) for permission in viewset.permission_classes)
+
+
+def render(response):
+    """A rendered DRF Response as a plain HttpResponse."""
+    # Rendered here: Django renders a Response in a thread
+    with timed_serialization():
+        content = response.rendered_content
+    return HttpResponse(content, status=response.status_code, headers=dict(response.items()))
+
+
+async def dispatch(sync_view, request, args, kwargs):
+    """
+    Run the async variant of the GET action of a viewset view.
+
+    Does what APIView.dispatch() does except authentication, permission
+    and throttling checks.
+
+    Returns:
+        HttpResponse, or None when the sync view has to serve the request
+    """
+    viewset = sync_view.cls
+    actions = dict(sync_view.actions)
+    if 'get' in actions and 'head' not in actions:
+        actions['head'] = actions['get']
+    view = viewset(**sync_view.initkwargs)
+    view.action_map = actions
+    for method, action in actions.items():
+        setattr(view, method, getattr(view, action))
+    view.args, view.kwargs = args, kwargs
+    request = view.initialize_request(request, *args, **kwargs)
+    view.request = request
+    view.headers = view.default_response_headers
+    view.format_kwarg = view.get_format_suffix(**kwargs)
+    try:
+        renderer, media_type = view.perform_content_negotiation(request)
+    except NotAcceptable:
+        return None
+    if renderer.format != 'json':
+        return None
+    request.accepted_renderer, request.accepted_media_type = renderer, media_type
+    request.version, request.versioning_scheme = view.determine_version(
+        request, *args, **kwargs)
+
+    try:
+        handler = getattr(view, ASYNC_ACTION_PREFIX + view.action)
+        response = await handler(request, *args, **kwargs)
+    except Exception as exc:
+        response = view.handle_exception(exc)
+    return render(view.finalize_response(request, response, *args, **kwargs))
+
+
+def async_view(sync_view):
+    """
+    Async Django view serving GET and HEAD requests with the async variant
+    of the action of a viewset view (as_view() result), other requests
+    with the view itself.
+    """
+    run_sync = sync_to_async(sync_view)
+    public = is_public(sync_view.cls)
+
+    async def view(request, *args, **kwargs):
+        if public and request.method in ASYNC_METHODS:
+            response = await dispatch(sync_view, request, args, kwargs)
+            if response is not None:
+                return response
+        return await run_sync(request, *args, **kwargs)
+
+    # Like as_view() results, for URL introspection (e.g. schema generation)
+    view.cls = sync_view.cls
+    view.initkwargs = sync_view.initkwargs
+    view.actions = sync_view.actions
+    return csrf_exempt(view)
+
+
+def has_async_read(callback):
+    viewset = getattr(callback, 'cls', None)
+    action = (getattr(callback, 'actions', None) or {}).get('get')
+    return action is not None and hasattr(viewset, ASYNC_ACTION_PREFIX + action)
+
+
+def async_read_urls(urlpatterns):
+    """
+    Router URL patterns with the views whose GET action has an async
+    variant replaced by async_view().
+
+    Args:
+        urlpatterns: List of URLPattern, e.g. router.urls
+
+    Returns:
+        list: The patterns, same routes and names
+    """
+    return [
+        URLPattern(pattern.pattern, async_view(pattern.callback),
+                   pattern.default_args, pattern.name)
+        if has_async_read(pattern.callback) else pattern
+        for pattern in urlpatterns
+    ]
@@ -0,0 +1,160 @@
+"""
+Benchmark suite of the hot paths (manage.py bench).
+
+Each case is timed `repeat` times; results record the median and best
+wall time, the number of queries of one run and the peak Python heap of
+one run (tracemalloc, measured separately since tracing slows the code
+down). Results are plain dicts, written as JSON and compared against a
+stored baseline:
+
+- wall time and peak memory regress when they exceed the baseline by more
+  than the threshold (a fraction, 0.2 = 20%),
+- query counts are deterministic and regress on any increase.
+"""
+
+import platform
+import statistics
+import time
+import tracemalloc
+
+import django
+from django.db import connection
+
+
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.2
+
+
+class BenchCase:
+    """
+    One benchmarked operation.
+
+    Args:
+        name: Result key, e.g. 'api.orders.list'
+        func: Callable running the operation once
+        setup: Optional callable run (untimed) before every run
+    """
+
+    def __init__(self, name, func, setup=None):
+        self.name = name
+        self.func = func
+        self.setup = setup
+
+    def run_once(self):
+        if self.setup:
+            self.setup()
+        started = time.perf_counter()
+        self.func()
+        return time.perf_counter() - started
+
+
+class QueryCounter:
+    """
+    Execute wrapper counting queries.
+
+    Unlike CaptureQueriesContext it survives the reset_queries() that
+    request_started triggers inside test client requests.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(case, repeat=DEFAULT_REPEAT):
+    """
+    Time a case.
+
+    Returns:
+        dict: wall_ms (median), min_ms, queries and peak_kib
+    """
+    times = [case.run_once() for _ in range(repeat)]
+
+    if case.setup:
+        case.setup()
+    queries = QueryCounter()
+    with connection.execute_wrapper(queries):
+        case.func()
+
+    if case.setup:
+        case.setup()
+    tracemalloc.start()
+    try:
+        case.func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'wall_ms': round(statistics.median(times) * 1000, 3),
+        'min_ms': round(min(times) * 1000, 3),
+        'queries': queries.count,
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def run_cases(cases, repeat=DEFAULT_REPEAT, progress=None):
+    """
+    Measure every case.
+
+    Args:
+        cases: Iterable of BenchCase
+        repeat: Timed runs per case
+        progress: Optional callable receiving (name, result) per case
+
+    Returns:
+        dict: Results by case name
+    """
+    results = {}
+    for case in cases:
+        results[case.name] = measure(case, repeat)
+        if progress:
+            progress(case.name, results[case.name])
+    return results
+
+
+def environment():
+    """Versions and backend the results were measured with."""
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'machine': platform.machine(),
+    }
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare results against a baseline.
+
+    Args:
+        results: Results by case name (run_cases)
+        baseline: Results by case name of the baseline
+        threshold: Allowed relative increase of wall time and memory
+
+    Returns:
+        list: One dict per case of both: name, metric changes (ratio of
+        new to baseline) and the metrics that regressed
+    """
+    comparison = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        regressions = []
+        for metric in ('wall_ms', 'peak_kib'):
+            if base[metric] and result[metric] > base[metric] * (1 + threshold):
+                regressions.append(metric)
+        if result['queries'] > base['queries']:
+            regressions.append('queries')
+        comparison.append({
+            'name': name,
+            'wall_ratio': result['wall_ms'] / base['wall_ms'] if base['wall_ms'] else None,
+            'queries_delta': result['queries'] - base['queries'],
+            'memory_ratio': result['peak_kib'] / base['peak_kib'] if base['peak_kib'] else None,
+            'regressions': regressions,
+        })
+    return comparison
@@ -0,0 +1,9 @@
+"""
+PostgreSQL database backend with a built-in connection pool.
+
+ENGINE 'minicrm.db' (set by DB_POOL_MODE, see minicrm/settings.py) is
+django.db.backends.postgresql with a pool of connections per process
+(minicrm/db/pool.py), configured by the POOL key of the database
+settings. Django still "closes" its connection at the end of every
+request (CONN_MAX_AGE = 0); closing returns it to the pool.
+"""
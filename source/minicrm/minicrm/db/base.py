@@ -0,0 +1,115 @@
+"""
+DatabaseWrapper of the pooled PostgreSQL backend (see __init__.py).
+
+Settings, besides those of django.db.backends.postgresql:
+
+- POOL: dict of ConnectionPool options (min_size, max_size, timeout,
+  max_lifetime, max_idle, check); without it the backend does not pool
+- PGBOUNCER: True behind PgBouncer in transaction pooling mode. Server
+  connections are shared between clients transaction by transaction, so
+  nothing may outlive a transaction: the session time zone is not SET
+  (the database's timezone must be UTC) and server-side cursors must be
+  disabled (DISABLE_SERVER_SIDE_CURSORS)
+"""
+
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel, is_psycopg3
+
+from .pool import POOLS, ConnectionPool, PoolTimeout
+
+
+# Transaction status of psycopg 2 and 3 connections (connection.info)
+TRANSACTION_STATUS_IDLE = 0
+TRANSACTION_STATUS_UNKNOWN = 4
+
+_lock = threading.Lock()
+
+
+def connect(conn_params):
+    connection = base.Database.connect(**conn_params)
+    if not is_psycopg3:
+        # As DatabaseWrapper.get_new_connection does
+        base.psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+    return connection
+
+
+def check(connection):
+    """Health check of a reused connection: a round trip to the server."""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+
+def reset(connection):
+    """Roll back what a returned connection left open; False if it is broken."""
+    if connection.closed or connection.info.transaction_status == TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if connection.info.transaction_status != TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+    connection.autocommit = True
+    return True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    @property
+    def connection_pool(self):
+        """The pool of this process for the alias, or None without POOL."""
+        options = self.settings_dict.get('POOL')
+        if not options:
+            return None
+        database = self.settings_dict['NAME']
+        pool = POOLS.get(self.alias)
+        if pool is None or pool.database != database:
+            with _lock:
+                pool = POOLS.get(self.alias)
+                if pool is not None and pool.database != database:
+                    # The test runner switched to the test database
+                    pool.close()
+                    pool = None
+                if pool is None:
+                    if self.settings_dict['CONN_MAX_AGE'] != 0:
+                        raise ImproperlyConfigured(
+                            'Pooled connections are returned at the end of each request; '
+                            'set CONN_MAX_AGE to 0.')
+                    if 'isolation_level' in self.settings_dict['OPTIONS']:
+                        raise ImproperlyConfigured(
+                            'OPTIONS["isolation_level"] is not supported with POOL.')
+                    conn_params = self.get_connection_params()
+                    options = dict(options)
+                    pool = POOLS[self.alias] = ConnectionPool(
+                        self.alias,
+                        connect=lambda: connect(conn_params),
+                        check=check if options.pop('check', True) else None,
+                        reset=reset,
+                        **options,
+                    )
+                    pool.database = database
+        return pool
+
+    def get_new_connection(self, conn_params):
+        pool = self.connection_pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        self.isolation_level = IsolationLevel.READ_COMMITTED
+        try:
+            return pool.getconn()
+        except PoolTimeout as e:
+            raise self.Database.OperationalError(str(e)) from e
+
+    def _close(self):
+        pool = self.connection_pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.putconn(self.connection)
+        # Back in the pool: not usable here any more, even when closed
+        # within an atomic block
+        self.connection = None
+
+    def _configure_timezone(self, connection):
+        if self.settings_dict.get('PGBOUNCER'):
+            # A SET would stay with a server connection other clients get next
+            return False
+        return super()._configure_timezone(connection)
@@ -0,0 +1,238 @@
+"""
+Thread-safe pool of database connections, one per process and alias.
+
+Used by the minicrm.db backend; the pool itself knows nothing about the
+database driver, it is given callables to open, check and reset
+connections.
+
+- At most max_size connections are open; a checkout waits up to timeout
+  seconds for one to be returned, then raises PoolTimeout.
+- min_size connections are opened with the pool and kept when idle;
+  connections above it are closed after max_idle idle seconds.
+- Connections older than max_lifetime seconds are closed instead of
+  being reused (the database side sees sessions recycled, e.g. after a
+  failover or a configuration change).
+- A returned connection is reset (rolled back); one that cannot be, or
+  fails the health check at its next checkout, is closed and replaced.
+
+Waits, utilization, timeouts and discarded connections are exported as
+metrics (minicrm/metrics.py).
+"""
+
+import os
+import threading
+import time
+
+from minicrm.metrics import Counter, Gauge, Histogram
+
+
+POOL_CONNECTIONS = Gauge(
+    'minicrm_db_pool_connections', 'Open pooled database connections by state.',
+    ['alias', 'state'], multiprocess_mode='livesum')
+POOL_MAX_SIZE = Gauge(
+    'minicrm_db_pool_max_connections', 'Largest number of pooled database connections.',
+    ['alias'], multiprocess_mode='livesum')
+POOL_WAIT = Histogram(
+    'minicrm_db_pool_wait_seconds', 'Time to check out a pooled database connection.',
+    ['alias'], buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0))
+POOL_TIMEOUTS = Counter(
+    'minicrm_db_pool_timeouts_total', 'Checkouts that found no free connection in time.',
+    ['alias'])
+POOL_DISCARDED = Counter(
+    'minicrm_db_pool_discarded_total', 'Pooled connections closed, by reason.',
+    ['alias', 'reason'])
+
+
+# The pools of this process by database alias (see minicrm/db/base.py)
+POOLS = {}
+# A forked child must not share its parent's connections: it opens its own
+os.register_at_fork(after_in_child=POOLS.clear)
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the pool's timeout."""
+
+
+class ConnectionPool:
+    """
+    Args:
+        name: Pool name (the database alias) used in metrics
+        connect: Callable opening a new connection
+        check: Optional callable raising an exception when a connection is
+            no longer usable; run on every reused connection at checkout
+        reset: Optional callable preparing a returned connection for reuse;
+            returns False when it should be closed instead
+        min_size: Connections opened up front and kept when idle
+        max_size: Most connections open at once
+        timeout: Seconds a checkout waits for a free connection
+        max_lifetime: Seconds after which a connection is not reused (0:
+            no limit)
+        max_idle: Seconds after which idle connections above min_size are
+            closed (0: never)
+    """
+
+    def __init__(self, name, connect, check=None, reset=None, min_size=1, max_size=4,
+                 timeout=10.0, max_lifetime=1800.0, max_idle=300.0):
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError('Pool sizes must satisfy 0 <= min_size <= max_size, max_size >= 1')
+        self.name = name
+        self.connect = connect
+        self.check = check
+        self.reset = reset
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        # (connection, created_at, returned_at), most recently returned last
+        self.idle = []
+        self.created_at = {}
+        self.size = 0
+        self.waiting = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        POOL_MAX_SIZE.set(name, value=max_size)
+        for _ in range(min_size):
+            self.idle.append((self.connect(), time.monotonic(), time.monotonic()))
+            self.size += 1
+        self.report()
+
+    def expired(self, created_at, now):
+        return bool(self.max_lifetime) and now - created_at >= self.max_lifetime
+
+    def report(self):
+        in_use = self.size - len(self.idle)
+        POOL_CONNECTIONS.set(self.name, 'in_use', value=in_use)
+        POOL_CONNECTIONS.set(self.name, 'idle', value=len(self.idle))
+
+    def discard(self, connection, reason):
+        POOL_DISCARDED.inc(self.name, reason)
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def take(self, deadline):
+        """
+        Reserve a connection under the lock.
+
+        Returns:
+            tuple: (idle connection or None to open a new one, created_at,
+            expired connections to close)
+        """
+        expired = []
+        with self.condition:
+            while True:
+                if self.closed:
+                    raise PoolTimeout(f'Connection pool {self.name} is closed')
+                now = time.monotonic()
+                while self.idle:
+                    connection, created_at, _ = self.idle.pop()
+                    if not self.expired(created_at, now):
+                        return connection, created_at, expired
+                    self.size -= 1
+                    expired.append(connection)
+                if self.size < self.max_size:
+                    self.size += 1
+                    return None, now, expired
+                remaining = deadline - now
+                if remaining <= 0:
+                    POOL_TIMEOUTS.inc(self.name)
+                    raise PoolTimeout(
+                        f'No free connection in pool {self.name} '
+                        f'(max_size={self.max_size}) after {self.timeout}s')
+                self.waiting += 1
+                try:
+                    self.condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+
+    def release_slot(self):
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+            self.report()
+
+    def getconn(self):
+        """Check out a connection, waiting for one up to the pool's timeout."""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        while True:
+            connection, created_at, expired = self.take(deadline)
+            for old in expired:
+                self.discard(old, 'lifetime')
+            if connection is None:
+                try:
+                    connection = self.connect()
+                except BaseException:
+                    self.release_slot()
+                    raise
+            elif self.check is not None:
+                try:
+                    self.check(connection)
+                except Exception:
+                    self.discard(connection, 'failed_check')
+                    self.release_slot()
+                    continue
+            with self.condition:
+                self.created_at[id(connection)] = created_at
+                self.report()
+            POOL_WAIT.observe(self.name, value=time.monotonic() - started)
+            return connection
+
+    def putconn(self, connection):
+        """Return a checked out connection."""
+        with self.condition:
+            created_at = self.created_at.pop(id(connection))
+        reusable = True
+        if self.reset is not None:
+            try:
+                reusable = self.reset(connection)
+            except Exception:
+                reusable = False
+        now = time.monotonic()
+        if not reusable or self.closed or self.expired(created_at, now):
+            self.discard(connection, 'lifetime' if reusable else 'broken')
+            self.release_slot()
+            return
+
+        stale = []
+        with self.condition:
+            self.idle.append((connection, created_at, now))
+            # Shrink back to min_size, least recently used first
+            while (self.max_idle and len(self.idle) > self.min_size
+                   and now - self.idle[0][2] >= self.max_idle):
+                stale.append(self.idle.pop(0)[0])
+                self.size -= 1
+            self.condition.notify()
+            self.report()
+        for old in stale:
+            self.discard(old, 'idle')
+
+    def close(self):
+        """Close the idle connections; checked out ones close when returned."""
+        with self.condition:
+            self.closed = True
+            idle, self.idle = self.idle, []
+            self.size -= len(idle)
+            self.condition.notify_all()
+            self.report()
+        for connection, _, _ in idle:
+            self.discard(connection, 'closed')
+
+    def stats(self):
+        """
+        Returns:
+            dict: size (open connections), idle, in_use, waiting,
+            max_size and utilization (in_use / max_size)
+        """
+        with self.condition:
+            in_use = self.size - len(self.idle)
+            return {
+                'size': self.size,
+                'idle': len(self.idle),
+                'in_use': in_use,
+                'waiting': self.waiting,
+                'max_size': self.max_size,
+                'utilization': round(in_use / self.max_size, 3),
+            }
@@ -0,0 +1,81 @@
+"""
+Query plan inspection for index regression tests.
+
+explain() returns the plan of a queryset or raw SQL as text lines, and
+sequential_scans() the tables the query reads in full, without an index:
+
+- SQLite: EXPLAIN QUERY PLAN lines "SCAN <table>" (with an index they read
+  "SCAN <table> USING INDEX ..." or "SEARCH ...")
+- PostgreSQL: EXPLAIN nodes "Seq Scan on <table>"
+
+On PostgreSQL the plan is taken with enable_seqscan off: on small test
+tables the planner prefers sequential scans even where an index exists,
+so the setting isolates the question the tests ask, whether a usable index
+exists at all.
+"""
+
+import re
+
+from django.db import connection
+
+
+SQLITE_FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\S+)(?: AS \S+)?$')
+POSTGRESQL_FULL_SCAN = re.compile(r'Seq Scan on (\S+)')
+TABLE_ALIAS = re.compile(r'\b(?:FROM|JOIN)\s+"?(\w+)"?(?:\s+(?:AS\s+)?"?(\w+)"?)?', re.IGNORECASE)
+
+
+def explain(query, params=None):
+    """
+    Plan of a query.
+
+    Args:
+        query: QuerySet, or SQL string with params
+        params: Parameters of a SQL string
+
+    Returns:
+        list: Plan lines (one per node)
+    """
+    if hasattr(query, 'query'):
+        query, params = query.query.sql_with_params()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {query}', params)
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute('SET enable_seqscan = off')
+        try:
+            cursor.execute(f'EXPLAIN {query}', params)
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.execute('RESET enable_seqscan')
+
+
+def sequential_scans(query, params=None):
+    """
+    Database tables a query reads in full.
+
+    Names are resolved through the aliases of the statement (SQLite plans
+    name aliased tables by alias); CTEs and subqueries scanned in full are
+    not reported.
+
+    Args:
+        query: QuerySet, or SQL string with params
+        params: Parameters of a SQL string
+
+    Returns:
+        set: Table names
+    """
+    plan = explain(query, params)
+    sql = str(query.query) if hasattr(query, 'query') else query
+    tables = set(connection.introspection.table_names())
+    names = {table: table for table in tables}
+    for table, alias in TABLE_ALIAS.findall(sql):
+        if table in tables and alias:
+            names[alias] = table
+
+    pattern = SQLITE_FULL_SCAN if connection.vendor == 'sqlite' else POSTGRESQL_FULL_SCAN
+    scans = set()
+    for line in plan:
+        match = pattern.search(line.strip())
+        if match and match.group(1).strip('"') in names:
+            scans.add(names[match.group(1).strip('"')])
+    return scans
@@ -0,0 +1,168 @@
+"""
+Streaming exports of whole tables: GET /api/<resource>/export/.
+
+- format: ndjson (default, one JSON object per line) or csv (nested
+  values such as order items are JSON encoded in their cell)
+- fields, expand: as on the list endpoint (see minicrm/fieldsets.py)
+- gzip compressed on the fly when the client sends Accept-Encoding: gzip
+
+Rows are read with QuerySet.iterator(chunk_size=EXPORT_CHUNK_SIZE), a
+server-side cursor on PostgreSQL, in the viewset's keyset_ordering, and
+serialized one chunk at a time through the row readers of
+minicrm/fastlist.py (or the serializer when no reader compiles), so
+memory stays constant whatever the size of the table.
+"""
+
+import csv
+import json
+import re
+from itertools import islice
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+from rest_framework.decorators import action
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .fastlist import get_row_reader
+
+
+DEFAULT_CHUNK_SIZE = 2000
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+
+def encode_json(value):
+    return json.dumps(value, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Newline delimited JSON: one line per object of a list."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        return ''.join(encode_json(row) + '\n' for row in rows).encode()
+
+
+class CSVRenderer(BaseRenderer):
+    """CSV with a header row taken from the keys of the first object."""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        if not rows:
+            return b''
+        return b''.join(csv_lines(rows, list(rows[0])))
+
+
+class Echo:
+    """File-like object handing csv.writer output back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def csv_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        return encode_json(value)
+    return value
+
+
+def csv_lines(rows, fieldnames):
+    """Encoded CSV lines: the header, then one line per row."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(fieldnames).encode()
+    for row in rows:
+        yield writer.writerow([csv_cell(row[name]) for name in fieldnames]).encode()
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def export_rows(queryset, serializer, chunk_size):
+    """
+    Serialized rows of a queryset, read and converted a chunk at a time.
+
+    Yields:
+        list: Output dicts of up to chunk_size rows
+    """
+    reader = get_row_reader(serializer, queryset.model)
+    if reader is None:
+        for chunk in chunked(queryset.iterator(chunk_size=chunk_size), chunk_size):
+            yield [serializer.to_representation(obj) for obj in chunk]
+        return
+    rows = queryset.prefetch_related(None).values_list(*reader.columns)
+    for chunk in chunked(rows.iterator(chunk_size=chunk_size), chunk_size):
+        yield reader.read(chunk, using=queryset.db)
+
+
+def ndjson_stream(chunks):
+    for rows in chunks:
+        yield ''.join(encode_json(row) + '\n' for row in rows).encode()
+
+
+def csv_stream(chunks, fieldnames):
+    yield next(csv_lines((), fieldnames))
+    for rows in chunks:
+        yield b''.join(islice(csv_lines(rows, fieldnames), 1, None))
+
+
+class ExportViewSetMixin:
+    """
+    ViewSet mixin adding the streaming `export` action.
+
+    Exports use the viewset's queryset, filter backends and serializer
+    (?fields=, ?expand=) and are ordered by its keyset_ordering.
+    """
+
+    @action(detail=False, methods=['get'], renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        """
+        Stream every row of the resource as NDJSON (?format=ndjson) or
+        CSV (?format=csv).
+        """
+        serializer = self.get_serializer()
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = getattr(self, 'keyset_ordering', None)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        # The rows are read after the view returns, when the request's
+        # database routing (minicrm/routers.py) no longer applies
+        queryset = queryset.using(queryset.db)
+        chunk_size = getattr(settings, 'EXPORT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+        chunks = export_rows(queryset, serializer, chunk_size)
+
+        renderer = request.accepted_renderer
+        if renderer.format == 'csv':
+            stream = csv_stream(chunks, [
+                name for name, field in serializer.fields.items() if not field.write_only
+            ])
+        else:
+            stream = ndjson_stream(chunks)
+
+        compress = ACCEPTS_GZIP.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        response = StreamingHttpResponse(
+            compress_sequence(stream) if compress else stream,
+            content_type=f'{renderer.media_type}; charset=utf-8',
+        )
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        name = self.basename or queryset.model._meta.model_name
+        response['Content-Disposition'] = f'attachment; filename="{name}.{renderer.format}"'
+        return response
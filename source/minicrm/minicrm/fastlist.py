@@ -0,0 +1,320 @@
+"""
+Fast read path for list endpoints.
+
+A DRF list response builds a model instance per row and walks every
+serializer field through get_attribute() and to_representation(). With
+API_FAST_LIST enabled, list actions instead compile the serializer once
+per field selection into a RowReader:
+
+- the columns to fetch with values_list(), forward relations included
+  (customer__name is part of the same row, no instance is built),
+- one converter per field, specialized for the common column types (UUID,
+  str, int, Decimal, datetime) and otherwise falling back to the field's
+  own to_representation(),
+- one extra values_list() query per nested list (order items), grouped
+  by parent in Python.
+
+The output is identical to the serializer's. Serializers with fields the
+reader cannot map to columns (method fields, source='*', properties
+without Meta.field_columns) keep using the serializer.
+"""
+
+import threading
+from collections import defaultdict
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .metrics import timed_serialization
+
+
+class Unsupported(Exception):
+    """The serializer has a field the row reader cannot compile."""
+
+
+def _skip_none(convert):
+    # Serializer.to_representation outputs None for None attributes
+    def converter(value):
+        return None if value is None else convert(value)
+    return converter
+
+
+def _decimal_converter(field):
+    if (not getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+            or field.localize or field.normalize_output or field.decimal_places is None):
+        return field.to_representation
+    exponent = -field.decimal_places
+
+    def convert(value):
+        # Values already at the field's scale need no quantize()
+        if value.is_finite() and value.as_tuple().exponent == exponent:
+            return '{:f}'.format(value)
+        return field.to_representation(value)
+    return convert
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if (not isinstance(output_format, str) or output_format.lower() != 'iso-8601'
+            or field_timezone is None):
+        return field.to_representation
+
+    def convert(value):
+        if value.tzinfo is None:
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+
+def make_converter(field):
+    """Returns a callable producing field.to_representation(value)."""
+    if isinstance(field, (serializers.ReadOnlyField, serializers.PrimaryKeyRelatedField)):
+        if getattr(field, 'pk_field', None) is not None:
+            return _skip_none(field.to_representation)
+        return lambda value: value
+    if isinstance(field, serializers.UUIDField) and field.uuid_format == 'hex_verbose':
+        convert = str
+    elif isinstance(field, serializers.ChoiceField):
+        convert = field.to_representation
+    elif type(field) in (serializers.CharField, serializers.EmailField):
+        convert = str
+    elif type(field) is serializers.IntegerField:
+        convert = int
+    elif type(field) is serializers.DecimalField:
+        convert = _decimal_converter(field)
+    elif type(field) is serializers.DateTimeField:
+        convert = _datetime_converter(field)
+    else:
+        convert = field.to_representation
+    return _skip_none(convert)
+
+
+class RowReader:
+    """
+    Columns to fetch and how to turn one values_list() row into the
+    serializer's output.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.columns = []
+        self.fields = []
+        self.nested_lists = []
+
+    def column(self, lookup):
+        """Position of a column in the row, adding it if needed."""
+        if lookup not in self.columns:
+            self.columns.append(lookup)
+        return self.columns.index(lookup)
+
+    def compile(self, serializer, model, prefix=''):
+        """
+        Compile the fields of a serializer reading `model` (reached through
+        `prefix` from this reader's model).
+
+        Returns:
+            list: (name, getter(row)) pairs; getter is None for nested lists,
+            which read() fills in afterwards
+        """
+        meta = getattr(serializer, 'Meta', None)
+        field_columns = getattr(meta, 'field_columns', {})
+        compiled = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if name in field_columns:
+                compiled.append((name, self.compile_property(
+                    field, model, prefix, field_columns[name])))
+            else:
+                compiled.append((name, self.compile_field(name, field, model, prefix)))
+        return compiled
+
+    def compile_property(self, field, model, prefix, columns):
+        prop = getattr(model, field.source, None)
+        if not isinstance(prop, property):
+            raise Unsupported(field.source)
+        positions = [(column, self.column(prefix + column)) for column in columns]
+        convert = make_converter(field)
+
+        def getter(row):
+            # The model property reads only the declared columns
+            return convert(prop.fget(SimpleNamespace(
+                **{column: row[position] for column, position in positions})))
+        return getter
+
+    def compile_field(self, name, field, model, prefix):
+        if field.source == '*':
+            raise Unsupported(name)
+        parts = field.source.split('.')
+        try:
+            for depth, part in enumerate(parts):
+                model_field = model._meta.get_field(part)
+                if depth < len(parts) - 1:
+                    if not (model_field.many_to_one or model_field.one_to_one):
+                        raise Unsupported(name)
+                    model = model_field.related_model
+        except FieldDoesNotExist:
+            raise Unsupported(name)
+        lookup = prefix + '__'.join(parts)
+
+        if model_field.one_to_many or model_field.many_to_many:
+            if prefix or not model_field.one_to_many or not isinstance(
+                    field, serializers.ListSerializer):
+                raise Unsupported(name)
+            child = RowReader(model_field.related_model)
+            parent = child.column(model_field.field.attname)
+            child.fields = child.compile(field.child, child.model)
+            if child.nested_lists:
+                raise Unsupported(name)
+            self.column(self.model._meta.pk.name)
+            self.nested_lists.append((name, model_field.field.attname, parent, child))
+            return None
+
+        if isinstance(field, serializers.BaseSerializer):
+            if not model_field.is_relation:
+                raise Unsupported(name)
+            key = self.column(lookup)
+            nested = self.compile(field, model_field.related_model, lookup + '__')
+
+            def getter(row):
+                if row[key] is None:
+                    return None
+                return {nested_name: nested_getter(row) for nested_name, nested_getter in nested}
+            return getter
+
+        position = self.column(lookup)
+        convert = make_converter(field)
+        return lambda row: convert(row[position])
+
+    def build(self, row):
+        return {
+            name: getter(row) if getter is not None else []
+            for name, getter in self.fields
+        }
+
+    def children(self, attname, child, keys, using=None):
+        """values_list() queryset of the rows of a nested list."""
+        return child.model._default_manager.db_manager(using).filter(
+            **{f'{attname}__in': keys}
+        ).values_list(*child.columns)
+
+    def group_parents(self, rows, data):
+        """Output dicts by primary key, to attach nested lists to."""
+        pk = self.columns.index(self.model._meta.pk.name)
+        parents = {}
+        for row, item in zip(rows, data):
+            parents.setdefault(row[pk], []).append(item)
+        return parents
+
+    def attach(self, name, parent, child, parents, children):
+        grouped = defaultdict(list)
+        for child_row in children:
+            grouped[child_row[parent]].append(child.build(child_row))
+        for key, items in parents.items():
+            for item in items:
+                item[name] = grouped.get(key, [])
+
+    def read(self, rows, using=None):
+        """
+        Output dicts for values_list() rows in self.columns order.
+
+        Args:
+            rows: values_list() rows
+            using: Database alias the nested lists are read from (default:
+                routed)
+        """
+        data = [self.build(row) for row in rows]
+        if self.nested_lists and data:
+            parents = self.group_parents(rows, data)
+            for name, attname, parent, child in self.nested_lists:
+                children = self.children(attname, child, list(parents), using)
+                self.attach(name, parent, child, parents, children)
+        return data
+
+    async def aread(self, rows):
+        """read() fetching the nested lists through the async ORM."""
+        data = [self.build(row) for row in rows]
+        if self.nested_lists and data:
+            parents = self.group_parents(rows, data)
+            for name, attname, parent, child in self.nested_lists:
+                children = self.children(attname, child, list(parents))
+                self.attach(name, parent, child, parents, [row async for row in children])
+        return data
+
+
+_readers = {}
+_readers_lock = threading.Lock()
+
+
+def get_row_reader(serializer, model):
+    """
+    Compiled RowReader of a serializer, or None if it cannot be compiled.
+
+    Readers are cached per serializer class and field selection.
+    """
+    key = (
+        type(serializer), model,
+        tuple(getattr(serializer, 'requested_fields', None) or ()),
+        tuple(getattr(serializer, 'requested_expand', None) or ()),
+    )
+    if key not in _readers:
+        reader = RowReader(model)
+        try:
+            reader.fields = reader.compile(serializer, model)
+        except Unsupported:
+            reader = None
+        with _readers_lock:
+            _readers[key] = reader
+    return _readers[key]
+
+
+class FastListViewSetMixin:
+    """
+    ViewSet mixin serving list() from values_list() rows when
+    settings.API_FAST_LIST is on.
+
+    Goes before SparseFieldsetViewSetMixin, whose ?fields= and ?expand=
+    select the compiled reader. Falls back to the serializer when the
+    reader cannot be compiled.
+    """
+
+    def get_list_reader(self, queryset):
+        """Compiled reader of the list serializer; None to use the serializer."""
+        if not getattr(settings, 'API_FAST_LIST', False):
+            return None
+        return get_row_reader(self.get_serializer(), queryset.model)
+
+    def get_list_rows(self, queryset, reader):
+        """values_list() queryset of the reader's columns."""
+        columns = list(reader.columns)
+        paginator = self.paginator
+        if hasattr(paginator, 'key_positions'):
+            # Keyset pagination reads the cursor key from the rows
+            key = [name.lstrip('-') for name in paginator.get_ordering(self)]
+            columns += [name for name in key if name not in columns]
+            paginator.key_positions = [columns.index(name) for name in key]
+        return queryset.prefetch_related(None).values_list(*columns)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        reader = self.get_list_reader(queryset)
+        if reader is None:
+            return super().list(request, *args, **kwargs)
+
+        rows = self.get_list_rows(queryset, reader)
+        paginator = self.paginator
+        if paginator is None:
+            rows = list(rows)
+        else:
+            rows = paginator.paginate_queryset(rows, request, view=self)
+        with timed_serialization():
+            data = reader.read(rows)
+        if paginator is None:
+            return Response(data)
+        return paginator.get_paginated_response(data)
@@ -0,0 +1,182 @@
+"""
+Sparse fieldsets for the API viewsets: ?fields= and ?expand=.
+
+GET requests to list and detail endpoints accept:
+- fields: comma separated response fields to return (default: all)
+- expand: comma separated relations to embed as objects instead of ids
+  (the serializer's Meta.expandable_fields)
+
+e.g. GET /api/orders/?fields=id,status,total_price skips the nested items,
+GET /api/orders/?expand=customer embeds the customer of every order.
+
+The queryset follows the serializer (see optimize_queryset): only the
+columns of the returned fields are selected, and relations are joined
+(select_related) or prefetched (prefetch_related) only when returned, so
+a list page costs a fixed number of queries. Serializer fields that are
+not model fields (properties, method fields) list the columns they read
+in Meta.field_columns; any other such field disables column pruning.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def parse_field_list(value):
+    """Split a comma separated query parameter; None when absent."""
+    if value is None:
+        return None
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    Serializer accepting `fields` and `expand` keyword arguments.
+
+    Meta.expandable_fields maps field names to the serializer class that
+    replaces them when expanded.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        self.requested_fields = fields
+        self.requested_expand = expand
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        unknown = [name for name in self.requested_expand or () if name not in expandable]
+        if unknown:
+            raise serializers.ValidationError({
+                EXPAND_PARAM: [f"Cannot expand: {', '.join(unknown)}"]
+            })
+        for name in self.requested_expand or ():
+            fields[name] = expandable[name](read_only=True)
+
+        if self.requested_fields is not None:
+            unknown = [name for name in self.requested_fields if name not in fields]
+            if unknown:
+                raise serializers.ValidationError({
+                    FIELDS_PARAM: [f"Unknown fields: {', '.join(unknown)}"]
+                })
+            fields = {
+                name: field for name, field in fields.items()
+                if name in self.requested_fields
+            }
+        return fields
+
+
+class QueryPlan:
+    """Columns, joins and prefetches needed to serialize a queryset."""
+
+    def __init__(self):
+        # None once a field reads something other than known columns
+        self.columns = set()
+        self.select_related = set()
+        self.prefetch_related = []
+
+    def add_column(self, lookup):
+        if self.columns is not None:
+            self.columns.add(lookup)
+
+    def add_serializer(self, serializer, model, prefix=''):
+        meta = getattr(serializer, 'Meta', None)
+        field_columns = getattr(meta, 'field_columns', {})
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if name in field_columns:
+                for column in field_columns[name]:
+                    self.add_column(prefix + column)
+                continue
+            self.add_field(field, model, prefix)
+
+    def add_field(self, field, model, prefix):
+        if field.source == '*':
+            self.columns = None
+            return
+        parts = field.source.split('.')
+        try:
+            for depth, part in enumerate(parts):
+                model_field = model._meta.get_field(part)
+                lookup = prefix + '__'.join(parts[:depth + 1])
+                if depth < len(parts) - 1:
+                    # Traversing a forward relation (source='customer.name')
+                    if not (model_field.many_to_one or model_field.one_to_one):
+                        raise FieldDoesNotExist(part)
+                    self.select_related.add(lookup)
+                    self.add_column(lookup)
+                    model = model_field.related_model
+        except FieldDoesNotExist:
+            self.columns = None
+            return
+
+        if model_field.one_to_many or model_field.many_to_many:
+            child = getattr(field, 'child', None) or getattr(field, 'child_relation', None)
+            queryset = model_field.related_model._default_manager.all()
+            if isinstance(child, serializers.BaseSerializer) and model_field.one_to_many:
+                # The prefetched rows need their foreign key to the parent
+                queryset = optimize_queryset(
+                    queryset, child, required_columns=[model_field.field.name])
+            self.prefetch_related.append(Prefetch(lookup, queryset=queryset))
+        elif isinstance(field, serializers.BaseSerializer) and model_field.is_relation:
+            self.select_related.add(lookup)
+            self.add_column(lookup)
+            self.add_serializer(field, model_field.related_model, lookup + '__')
+        else:
+            self.add_column(lookup)
+
+
+def optimize_queryset(queryset, serializer, required_columns=()):
+    """
+    Restrict a queryset to what a serializer outputs.
+
+    Args:
+        queryset: Queryset of the serializer's model
+        serializer: Serializer instance (not bound to data)
+        required_columns: Columns to load even if not serialized
+
+    Returns:
+        QuerySet: With only(), select_related() and prefetch_related()
+        applied
+    """
+    plan = QueryPlan()
+    plan.add_serializer(serializer, queryset.model)
+    if plan.select_related:
+        queryset = queryset.select_related(*sorted(plan.select_related))
+    if plan.prefetch_related:
+        queryset = queryset.prefetch_related(*plan.prefetch_related)
+    if plan.columns is not None:
+        queryset = queryset.only(*sorted(plan.columns | set(required_columns)))
+    return queryset
+
+
+class SparseFieldsetViewSetMixin:
+    """
+    ViewSet mixin applying ?fields= and ?expand= to read requests.
+
+    The serializer classes must use SparseFieldsetSerializerMixin. Writes
+    are unaffected: they validate and return every field.
+    """
+
+    def is_sparse_request(self):
+        request = getattr(self, 'request', None)
+        return request is not None and request.method in SAFE_METHODS
+
+    def get_serializer(self, *args, **kwargs):
+        if self.is_sparse_request():
+            params = self.request.query_params
+            kwargs.setdefault('fields', parse_field_list(params.get(FIELDS_PARAM)))
+            kwargs.setdefault('expand', parse_field_list(params.get(EXPAND_PARAM)))
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not self.is_sparse_request():
+            return queryset
+        return optimize_queryset(queryset, self.get_serializer())
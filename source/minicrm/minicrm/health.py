@@ -1,37 +1,157 @@
 """
-Health check view for Kubernetes liveness and readiness probes.
+Health check views for Kubernetes liveness and readiness probes.
+
+- /health/live: the process serves requests; never touches the database
+- /health/ready: the database answers. A real SELECT 1 runs at most once
+  per HEALTH_READY_INTERVAL seconds per process and the cached result is
+  served in between, so probes of many replicas do not churn database
+  connections. A slow probe (HEALTH_DEGRADED_LATENCY_MS), a database
+  close to max_connections (HEALTH_DEGRADED_SATURATION, PostgreSQL) or a
+  connection pool close to full (looked at on every probe, no query) is
+  reported as degraded, still with 200: the pod stays in rotation.
+- /health, /health/: kept for existing probe configurations, same as
+  /health/ready
 """
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.db.utils import DatabaseError
 from django.http import JsonResponse
-from django.db import connection
-from django.db.utils import OperationalError
 
+from .db.pool import POOLS
+from .metrics import Gauge
 
-def health_check(request):
+
+SERVICE = 'crm-api'
+
+DB_PROBE_LATENCY = Gauge(
+    'minicrm_db_probe_latency_seconds', 'Latency of the latest readiness SELECT 1.')
+DB_CONNECTION_SATURATION = Gauge(
+    'minicrm_db_connection_saturation',
+    'Share of max_connections in use at the latest readiness probe (PostgreSQL).')
+
+_lock = threading.Lock()
+_probe = {'checked_at': None, 'result': None}
+
+
+def connection_saturation():
+    """
+    Connections in use on the database server.
+
+    Returns:
+        dict: used, max and saturation (used / max), or None when the
+        backend has no connection limit (SQLite)
     """
-    Health check endpoint for Kubernetes probes.
-    Returns 200 if the application is healthy, 503 otherwise.
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT (SELECT count(*) FROM pg_stat_activity), "
+            "current_setting('max_connections')::int"
+        )
+        used, maximum = cursor.fetchone()
+    return {'used': used, 'max': maximum, 'saturation': round(used / maximum, 3)}
+
+
+def probe_database():
+    """
+    Run the readiness probe against the database.
+
+    Returns:
+        dict: status ('healthy', 'degraded' or 'unhealthy'), latency_ms,
+        connections (see connection_saturation) and the reasons of a
+        degraded or unhealthy status
     """
+    started = time.perf_counter()
     try:
-        # Check database connection
-        connection.ensure_connection()
-        connection.cursor()
-        
-        return JsonResponse({
-            'status': 'healthy',
-            'service': 'crm-api'
-        }, status=200)
-    except OperationalError:
-        # Database connection failed
-        return JsonResponse({
-            'status': 'unhealthy',
-            'service': 'crm-api',
-            'error': 'database_connection_failed'
-        }, status=503)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+        latency = time.perf_counter() - started
+        connections = connection_saturation()
+    except DatabaseError:
+        return {'status': 'unhealthy', 'error': 'database_connection_failed'}
     except Exception as e:
         # Other errors
-        return JsonResponse({
-            'status': 'unhealthy',
-            'service': 'crm-api',
-            'error': str(e)
-        }, status=503)
+        return {'status': 'unhealthy', 'error': str(e)}
+
+    DB_PROBE_LATENCY.set(value=latency)
+    reasons = []
+    if latency * 1000 > settings.HEALTH_DEGRADED_LATENCY_MS:
+        reasons.append('slow_database')
+    if connections is not None:
+        DB_CONNECTION_SATURATION.set(value=connections['saturation'])
+        if connections['saturation'] >= settings.HEALTH_DEGRADED_SATURATION:
+            reasons.append('connections_saturated')
+    result = {
+        'status': 'degraded' if reasons else 'healthy',
+        'latency_ms': round(latency * 1000, 2),
+        'connections': connections,
+    }
+    if reasons:
+        result['reasons'] = reasons
+    return result
+
+
+def get_readiness():
+    """
+    The cached probe result, probing again once it is older than
+    HEALTH_READY_INTERVAL seconds.
 
+    Returns:
+        tuple: (probe result, age of the result in seconds)
+    """
+    with _lock:
+        now = time.monotonic()
+        checked_at = _probe['checked_at']
+        if checked_at is None or now - checked_at >= settings.HEALTH_READY_INTERVAL:
+            _probe['result'] = probe_database()
+            _probe['checked_at'] = checked_at = now
+        return _probe['result'], now - checked_at
+
+
+def liveness(request):
+    """
+    Liveness probe: 200 as long as the process handles requests.
+    """
+    return JsonResponse({'status': 'alive', 'service': SERVICE})
+
+
+def pool_status(result):
+    """
+    Add the current state of this process's connection pool (minicrm/db)
+    to a probe result; a pool close to full makes it degraded.
+    """
+    pool = POOLS.get(DEFAULT_DB_ALIAS)
+    if pool is None:
+        return result
+    stats = pool.stats()
+    result = {**result, 'pool': stats}
+    if result['status'] != 'unhealthy' and (
+            stats['waiting'] or stats['utilization'] >= settings.HEALTH_DEGRADED_SATURATION):
+        result['status'] = 'degraded'
+        result['reasons'] = result.get('reasons', []) + ['pool_saturated']
+    return result
+
+
+def readiness(request):
+    """
+    Readiness probe: 200 when the database answers (healthy or degraded),
+    503 otherwise.
+    """
+    result, age = get_readiness()
+    result = pool_status(result)
+    return JsonResponse(
+        {**result, 'service': SERVICE, 'age_seconds': round(age, 2)},
+        status=503 if result['status'] == 'unhealthy' else 200,
+    )
+
+
+def health_check(request):
+    """
+    Health check endpoint for Kubernetes probes (/health).
+    Same as the readiness probe: returns 200 if the application is healthy, 503 otherwise.
+    """
+    return readiness(request)
@@ -0,0 +1,431 @@
+"""
+In-process metrics exposed in the Prometheus text format at /metrics.
+
+InstrumentationMiddleware (minicrm/middleware.py) records per route (the
+URL name, e.g. order-list): request count and latency, SQL query count
+and time, and serialization time, that is the time spent in
+to_representation() of the resource serializers (TimedSerializerMixin),
+in the row readers of the fast list path and in rendering the response.
+The same numbers go back to the client in a Server-Timing header.
+RFM calculation runs record their duration and customer counts
+(rfm/services.py).
+
+Counters, gauges and histograms live in the process. Under gunicorn each
+worker has its own: with METRICS_DIR set, every process writes its values
+to a file of its own in that directory (from a timer thread, at most
+METRICS_FLUSH_INTERVAL seconds after a change, and at exit) and /metrics
+adds up the files of all processes (a gauge reports the most recently set
+value, or for livesum gauges the sum over running processes).
+Files of exited workers are kept so counters never go backwards; the
+directory is emptied when the server starts (start.sh).
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+
+class Metric:
+    """
+    A named metric with a fixed set of labels.
+
+    Args:
+        name: Metric name
+        documentation: HELP text
+        labelnames: Names of the labels; values are passed positionally
+        registry: Registry to register with (the process-wide REGISTRY)
+    """
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.registry = registry or REGISTRY
+        self.registry.register(self)
+
+    def update(self, labels, change):
+        labels = tuple(str(label) for label in labels)
+        with self.registry.lock:
+            self.values[labels] = change(self.values.get(labels))
+        self.registry.changed()
+
+    def merge(self, current, other):
+        raise NotImplementedError
+
+    def samples(self, labels, value):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """A count that only goes up; the name should end in _total."""
+
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        self.update(labels, lambda value: (value or 0) + amount)
+
+    def merge(self, current, other):
+        return current + other
+
+    def samples(self, labels, value):
+        yield '', (), value
+
+
+class Gauge(Metric):
+    """
+    A value set at a point in time.
+
+    Across processes the most recently set value wins, or with
+    multiprocess_mode='livesum' the values of the running processes add
+    up (e.g. connections open in each worker).
+    """
+
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), multiprocess_mode='latest',
+                 registry=None):
+        self.multiprocess_mode = multiprocess_mode
+        super().__init__(name, documentation, labelnames, registry)
+
+    def set(self, *labels, value):
+        self.update(labels, lambda current: [value, time.time()])
+
+    def merge(self, current, other):
+        if self.multiprocess_mode == 'livesum':
+            return [current[0] + other[0], max(current[1], other[1])]
+        return max(current, other, key=lambda value: value[1])
+
+    def samples(self, labels, value):
+        yield '', (), value[0]
+
+
+class Histogram(Metric):
+    """Observed values counted in buckets of upper bounds."""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS,
+                 registry=None):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, *labels, value):
+        def change(state):
+            # Per bucket counts (the last one is +Inf), then sum and count
+            state = state or [0] * (len(self.buckets) + 1) + [0.0, 0]
+            state[bisect_left(self.buckets, value)] += 1
+            state[-2] += value
+            state[-1] += 1
+            return state
+        self.update(labels, change)
+
+    def merge(self, current, other):
+        return [a + b for a, b in zip(current, other)]
+
+    def samples(self, labels, value):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), value):
+            cumulative += count
+            yield '_bucket', (('le', format_value(float(bound))),), cumulative
+        yield '_sum', (), value[-2]
+        yield '_count', (), value[-1]
+
+
+def process_alive(pid):
+    """Whether the process of a metrics file still runs (unknown: yes)."""
+    if not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Registry:
+    """The metrics of the process, and their files when METRICS_DIR is set."""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.flushed_at = 0.0
+        self.pending = None
+        self.path = None
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f'Metric {metric.name} is already registered')
+        self.metrics[metric.name] = metric
+
+    def reset(self):
+        """Forget the values inherited from the parent process (after fork)."""
+        for metric in self.metrics.values():
+            metric.values = {}
+        self.pending = None
+        self.path = None
+
+    @property
+    def directory(self):
+        return getattr(settings, 'METRICS_DIR', '') if settings.configured else ''
+
+    def changed(self):
+        """Schedule a flush, at most one per interval and never later than one."""
+        if not self.directory:
+            return
+        interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+        with self.lock:
+            if self.pending is not None:
+                return
+            delay = max(interval - (time.monotonic() - self.flushed_at), 0)
+            self.pending = threading.Timer(delay, self.flush)
+            self.pending.daemon = True
+        self.pending.start()
+
+    def state(self):
+        with self.lock:
+            return {
+                name: [
+                    [list(labels), list(value) if isinstance(value, list) else value]
+                    for labels, value in metric.values.items()
+                ]
+                for name, metric in self.metrics.items() if metric.values
+            }
+
+    def flush(self):
+        """Write the values of this process to its file in METRICS_DIR."""
+        directory = self.directory
+        if not directory:
+            return
+        with self.flush_lock:
+            with self.lock:
+                self.pending = None
+            self.flushed_at = time.monotonic()
+            if self.path is None or os.path.dirname(self.path) != directory:
+                os.makedirs(directory, exist_ok=True)
+                self.path = os.path.join(
+                    directory, f'{os.getpid()}-{uuid.uuid4().hex[:8]}.json')
+            temporary = f'{self.path}.tmp'
+            with open(temporary, 'w') as file:
+                json.dump(self.state(), file)
+            os.replace(temporary, self.path)
+
+    def collect(self):
+        """
+        Values of all processes (or of this one without METRICS_DIR).
+
+        Returns:
+            dict: Values by label tuple, by metric name
+        """
+        directory = self.directory
+        if not directory:
+            states = [(True, self.state())]
+        else:
+            self.flush()
+            states = []
+            for name in sorted(os.listdir(directory)):
+                if not name.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(directory, name)) as file:
+                        states.append((process_alive(name.split('-')[0]), json.load(file)))
+                except (OSError, ValueError):
+                    # Removed or replaced meanwhile
+                    continue
+
+        merged = {}
+        for alive, state in states:
+            for name, values in state.items():
+                metric = self.metrics.get(name)
+                if metric is None:
+                    continue
+                if not alive and getattr(metric, 'multiprocess_mode', None) == 'livesum':
+                    continue
+                target = merged.setdefault(name, {})
+                for labels, value in values:
+                    labels = tuple(labels)
+                    target[labels] = (
+                        metric.merge(target[labels], value) if labels in target else value)
+        return merged
+
+    def expose(self):
+        """All metrics in the Prometheus text exposition format."""
+        merged = self.collect()
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            for labels, value in sorted(merged.get(name, {}).items()):
+                for suffix, extra, sample in metric.samples(labels, value):
+                    lines.append(
+                        f'{name}{suffix}{format_labels(metric.labelnames, labels, extra)} '
+                        f'{format_value(sample)}'
+                    )
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+os.register_at_fork(after_in_child=REGISTRY.reset)
+atexit.register(REGISTRY.flush)
+
+HTTP_REQUESTS = Counter(
+    'minicrm_http_requests_total', 'HTTP requests by route, method and status.',
+    ['route', 'method', 'status'])
+HTTP_LATENCY = Histogram(
+    'minicrm_http_request_duration_seconds', 'Total latency of HTTP requests.',
+    ['route', 'method'])
+HTTP_QUERIES = Histogram(
+    'minicrm_http_db_queries', 'SQL queries per HTTP request.',
+    ['route', 'method'], buckets=QUERY_BUCKETS)
+HTTP_DB_TIME = Histogram(
+    'minicrm_http_db_duration_seconds', 'SQL time per HTTP request.',
+    ['route', 'method'])
+HTTP_SERIALIZATION_TIME = Histogram(
+    'minicrm_http_serialization_duration_seconds', 'Serialization time per HTTP request.',
+    ['route', 'method'])
+
+
+# Timings of the request being handled, set by InstrumentationMiddleware
+current_timings = ContextVar('current_timings', default=None)
+
+
+class RequestTimings:
+    """What one request spent its time on."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self.queries = 0
+        self.db = 0.0
+        self.serialization = 0.0
+        self.serializing = False
+
+    def execute(self, execute, sql, params, many, context):
+        """Time one query (see record_query)."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db += time.perf_counter() - started
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    def server_timing(self):
+        """Value of the Server-Timing header (durations in milliseconds)."""
+        return ', '.join([
+            f'db;desc="{self.queries} queries";dur={self.db * 1000:.2f}',
+            f'serialize;dur={self.serialization * 1000:.2f}',
+            f'total;dur={self.total * 1000:.2f}',
+        ])
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper timing queries for the request of the current context.
+
+    Installed on every connection when it connects: the queries of a
+    request may run on another thread than its middleware (sync and async
+    views under ASGI run in worker threads), so the request is found
+    through the context, not through the connection.
+    """
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    return timings.execute(execute, sql, params, many, context)
+
+
+def instrument_connection(sender, connection, **kwargs):
+    # First in the list: connection.execute_wrapper() blocks pop the last one
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+connection_created.connect(instrument_connection)
+
+
+@contextmanager
+def timed_serialization():
+    """Count the time of the block as serialization time of the current request."""
+    timings = current_timings.get()
+    if timings is None or timings.serializing:
+        yield
+        return
+    timings.serializing = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.serializing = False
+        timings.serialization += time.perf_counter() - started
+
+
+class TimedSerializerMixin:
+    """
+    Serializer mixin counting to_representation() as serialization time.
+
+    Nested serializers count once, within the outermost one.
+    """
+
+    def to_representation(self, instance):
+        with timed_serialization():
+            return super().to_representation(instance)
+
+
+KNOWN_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+def observe_request(route, method, status, timings):
+    """Record the timings of a finished request."""
+    method = method if method in KNOWN_METHODS else 'OTHER'
+    HTTP_REQUESTS.inc(route, method, status)
+    HTTP_LATENCY.observe(route, method, value=timings.total)
+    HTTP_QUERIES.observe(route, method, value=timings.queries)
+    HTTP_DB_TIME.observe(route, method, value=timings.db)
+    HTTP_SERIALIZATION_TIME.observe(route, method, value=timings.serialization)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint."""
+    return HttpResponse(REGISTRY.expose(), content_type=CONTENT_TYPE)
@@ -0,0 +1,29 @@
+"""
+Migration operations shared by the apps.
+
+AddIndexConcurrently builds indexes on the large production tables
+(order_order, rfm_scores) with CREATE INDEX CONCURRENTLY on PostgreSQL,
+so writes continue during the build; a plain CREATE INDEX locks the table
+against writes until it finishes. Other databases (SQLite in development
+and tests) get a plain AddIndex. Like Django's operation, it only runs in
+migrations with atomic = False.
+"""
+
+from django.contrib.postgres import operations
+from django.db.migrations import AddIndex
+
+
+class AddIndexConcurrently(operations.AddIndexConcurrently):
+    """AddIndexConcurrently on PostgreSQL, AddIndex elsewhere."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
@@ -0,0 +1,220 @@
+"""
+Keyset (cursor) pagination for the API viewsets.
+
+Pages are addressed by the sort key of the row they continue from, not by
+an offset: the next page of orders is
+
+    WHERE order_date <= %s AND (order_date < %s OR (order_date = %s AND id < %s))
+    ORDER BY order_date DESC, id DESC LIMIT page_size + 1
+
+which an index on the key answers by seeking straight to the position, so
+page 1000 costs the same as page 1. The trailing unique column (id) makes
+the key total: rows sharing a timestamp are neither skipped nor repeated.
+
+Viewsets declare their key with `keyset_ordering`, a tuple of field names
+ending with a unique one ('-' for descending). Clients follow the opaque
+`next`/`previous` URLs, may pass `page_size` (capped at
+API_MAX_PAGE_SIZE) and get a total `count` only with `count=true`, since
+COUNT(*) is the part of a page whose cost grows with the table.
+"""
+
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+DEFAULT_MAX_PAGE_SIZE = 100
+
+
+def is_true(value):
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+def keyset_filter(ordering, values):
+    """
+    Q selecting the rows that sort after `values` in `ordering`.
+
+    For (a, b, c) ascending that is
+    a >= x AND (a > x OR (a = x AND (b > y OR (b = y AND c > z)))); the
+    leading range condition lets the database seek on an index over the
+    key instead of filtering from the first row.
+    """
+    condition = None
+    for name, value in reversed(list(zip(ordering, values))):
+        field, descending = name.lstrip('-'), name.startswith('-')
+        after = Q(**{f"{field}__{'lt' if descending else 'gt'}": value})
+        condition = after if condition is None else (
+            after | (Q(**{field: value}) & condition))
+    first, value = ordering[0], values[0]
+    field = first.lstrip('-')
+    bound = Q(**{f"{field}__{'lte' if first.startswith('-') else 'gte'}": value})
+    return bound & condition
+
+
+def reverse_ordering(ordering):
+    return tuple(name[1:] if name.startswith('-') else f'-{name}' for name in ordering)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on a composite key (view.keyset_ordering).
+
+    Responses: {"next": url, "previous": url, "results": [...]}, plus
+    "count" when requested with ?count=true.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    count_query_param = 'count'
+    default_ordering = ('pk',)
+    invalid_cursor_message = 'Invalid cursor'
+    # Positions of the key in each row when paginating values_list() rows
+    # (see minicrm/fastlist.py); None for model instances
+    key_positions = None
+
+    def get_page_size(self, request):
+        page_size = api_settings.PAGE_SIZE
+        max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', DEFAULT_MAX_PAGE_SIZE)
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return page_size
+        return min(requested, max_page_size) if requested > 0 else page_size
+
+    def get_ordering(self, view):
+        return tuple(getattr(view, 'keyset_ordering', self.default_ordering))
+
+    def encode_cursor(self, values, reverse):
+        payload = json.dumps({'k': values, 'r': int(reverse)}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+            raw_values, reverse = payload['k'], bool(payload['r'])
+            if len(raw_values) != len(self.ordering):
+                raise ValueError
+            values = [
+                model._meta.get_field(name.lstrip('-')).to_python(value)
+                for name, value in zip(self.ordering, raw_values)
+            ]
+        except (TypeError, ValueError, KeyError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def key_of(self, obj):
+        if self.key_positions is not None:
+            raw_values = [obj[position] for position in self.key_positions]
+        else:
+            raw_values = [
+                getattr(obj, obj._meta.get_field(name.lstrip('-')).attname)
+                for name in self.ordering
+            ]
+        return [
+            value.isoformat() if hasattr(value, 'isoformat') else str(value)
+            for value in raw_values
+        ]
+
+    def page_queryset(self, queryset, request, view=None):
+        """
+        Set up the page of a request.
+
+        Returns:
+            tuple: (queryset to count or None when no count was requested,
+            queryset of the page plus one row, see set_page)
+        """
+        self.request = request
+        self.ordering = self.get_ordering(view)
+        self.page_size = self.get_page_size(request)
+        counted = (
+            queryset
+            if is_true(request.query_params.get(self.count_query_param)) else None
+        )
+        position, reverse = self.decode_cursor(request, queryset.model)
+        self.has_cursor = position is not None
+        self.reverse = reverse
+
+        # The key columns must be loaded even when ?fields= omits them
+        loaded, deferred = queryset.query.deferred_loading
+        if loaded and not deferred and self.key_positions is None:
+            queryset = queryset.only(
+                *loaded, *(name.lstrip('-') for name in self.ordering))
+
+        ordering = reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(keyset_filter(ordering, position))
+        return counted, queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        """The page out of the rows fetched with page_queryset()."""
+        self.has_more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if self.reverse:
+            self.page.reverse()
+        return self.page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        counted, queryset = self.page_queryset(queryset, request, view)
+        self.count = counted.count() if counted is not None else None
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() through the async ORM (minicrm/asyncviews.py)."""
+        counted, queryset = self.page_queryset(queryset, request, view)
+        self.count = await counted.acount() if counted is not None else None
+        return self.set_page([row async for row in queryset])
+
+    def get_link(self, values, reverse):
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(values, reverse))
+
+    def get_next_link(self):
+        # Going backwards, the page we came from always follows
+        if not self.page or not (self.has_more or self.reverse):
+            return None
+        return self.get_link(self.key_of(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if self.reverse and not self.has_more:
+            return None
+        if not self.reverse and not self.has_cursor:
+            return None
+        if not self.page:
+            return remove_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.get_link(self.key_of(self.page[0]), reverse=True)
+
+    def get_paginated_response(self, data):
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_next_link()
+        response['previous'] = self.get_previous_link()
+        response['results'] = data
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer', 'example': 123},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
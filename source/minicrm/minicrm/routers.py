@@ -0,0 +1,131 @@
+"""
+Read replica routing (DB_REPLICAS, settings.DATABASE_REPLICAS).
+
+Reads of the request actions that tolerate replication lag go to a
+replica; everything else goes to the primary (`default`):
+
+- ViewSets list the actions served from replicas in `replica_actions`,
+  e.g. ('list', 'retrieve', 'export', 'by_segment', 'statistics'), and
+  only safe requests (GET, HEAD, OPTIONS) run them there
+- writes, other actions (RFM calculate and job status, admin, health
+  probes), management commands and background RFM jobs use the primary
+- read your writes: a client that sent an unsafe request reads from the
+  primary for DB_REPLICA_STICKY_SECONDS afterwards; the deadline travels
+  in a cookie, so it holds whichever worker or pod serves the next request
+
+ReplicaRoutingMiddleware records the request in a context variable that
+ReplicaRouter looks at per query; the replica is chosen once per request
+(at random), so its queries see one consistent snapshot. Migrations only
+run on the primary: replicas get their schema through replication.
+"""
+
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+
+PRIMARY_COOKIE = 'minicrm_read_primary'
+DEFAULT_STICKY_SECONDS = 5.0
+
+# Routing of the request being handled, set by ReplicaRoutingMiddleware
+current_routing = ContextVar('current_routing', default=None)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+def sticky_seconds():
+    return getattr(settings, 'DB_REPLICA_STICKY_SECONDS', DEFAULT_STICKY_SECONDS)
+
+
+def replica_action(match, method):
+    """Whether the view of a resolved URL serves `method` from replicas."""
+    if match is None or method not in SAFE_METHODS:
+        return False
+    viewset = getattr(match.func, 'cls', None)
+    action = (getattr(match.func, 'actions', None) or {}).get(method.lower())
+    # HEAD runs the GET action
+    if action is None and method == 'HEAD':
+        action = (getattr(match.func, 'actions', None) or {}).get('get')
+    return action is not None and action in getattr(viewset, 'replica_actions', ())
+
+
+class RequestRouting:
+    """
+    Database choice of one request.
+
+    Args:
+        request: The request; its resolver_match is looked at on the first
+            read, once the URL is resolved
+        primary: Whether all reads go to the primary (unsafe method, or a
+            recent write of the client)
+    """
+
+    def __init__(self, request, primary):
+        self.request = request
+        self.primary = primary
+        self.alias = None
+
+    def read_alias(self):
+        if self.alias is None:
+            match = getattr(self.request, 'resolver_match', None)
+            if match is None:
+                # Not resolved yet (middleware): decide on a later read
+                return DEFAULT_DB_ALIAS
+            if self.primary or not replica_action(match, self.request.method):
+                self.alias = DEFAULT_DB_ALIAS
+            else:
+                self.alias = random.choice(replicas())
+        return self.alias
+
+
+class ReplicaRouter:
+    """Database router sending the reads of replica actions to a replica."""
+
+    def db_for_read(self, model, **hints):
+        routing = current_routing.get()
+        if routing is None or not replicas():
+            # Django's default: the database of a hinted instance (e.g.
+            # prefetching for rows read from a replica), else the primary
+            return None
+        if model._meta.app_config.name.startswith('django.'):
+            # Sessions, users, admin: a login must be visible right away
+            return DEFAULT_DB_ALIAS
+        return routing.read_alias()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def reads_primary(request, now=None):
+    """Whether a request's reads must go to the primary."""
+    if request.method not in SAFE_METHODS:
+        return True
+    try:
+        until = float(request.COOKIES.get(PRIMARY_COOKIE, 0))
+    except ValueError:
+        return False
+    return until > (now or time.time())
+
+
+def stick_to_primary(response, now=None):
+    """Route the client's reads to the primary for the sticky window."""
+    seconds = sticky_seconds()
+    if seconds <= 0:
+        return
+    response.set_cookie(
+        PRIMARY_COOKIE, f'{(now or time.time()) + seconds:.3f}',
+        max_age=seconds, httponly=True, samesite='Lax',
+    )
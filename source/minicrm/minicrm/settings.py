@@ -11,8 +11,11 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 from pathlib import Path
+import copy
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -66,6 +69,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'minicrm.middleware.InstrumentationMiddleware',  # First, to time the whole request
+    'minicrm.middleware.ReplicaRoutingMiddleware',  # Only with DB_REPLICAS
     'django.middleware.security.SecurityMiddleware',
     'minicrm.middleware.KubernetesHealthCheckMiddleware',  # Must be before CommonMiddleware
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -124,15 +129,124 @@ if use_postgresql:
             'PORT': os.environ.get('POSTGRES_PORT') or os.environ.get('DB_PORT', '5432'),
         }
     }
+
+    # Connection handling, POSTGRES_POOL_MODE or DB_POOL_MODE:
+    # - 'none': a connection per request, or kept by each worker for
+    #   CONN_MAX_AGE seconds (health checked before reuse)
+    # - 'pool': a pool of connections per process (minicrm/db), checked on
+    #   checkout and recycled after POOL_MAX_LIFETIME seconds
+    # - 'pgbouncer': the pool, connected to PgBouncer in transaction pooling
+    #   mode: no server-side cursors and no session state (the database's
+    #   timezone must be UTC)
+    def db_env(name, default):
+        return os.environ.get(f'POSTGRES_{name}') or os.environ.get(f'DB_{name}', default)
+
+    DB_POOL_MODE = db_env('POOL_MODE', 'none')
+    if DB_POOL_MODE not in ('none', 'pool', 'pgbouncer'):
+        raise ImproperlyConfigured(
+            f"DB_POOL_MODE must be 'none', 'pool' or 'pgbouncer', not {DB_POOL_MODE!r}")
+    if DB_POOL_MODE == 'none':
+        DATABASES['default']['CONN_MAX_AGE'] = int(db_env('CONN_MAX_AGE', '0'))
+        DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+    else:
+        DATABASES['default']['ENGINE'] = 'minicrm.db'
+        DATABASES['default']['POOL'] = {
+            'min_size': int(db_env('POOL_MIN_SIZE', '1')),
+            # Per process: one for the request thread plus background RFM jobs
+            'max_size': int(db_env('POOL_MAX_SIZE', '4')),
+            # Seconds a request waits for a free connection
+            'timeout': float(db_env('POOL_TIMEOUT', '10')),
+            'max_lifetime': float(db_env('POOL_MAX_LIFETIME', '1800')),
+            'max_idle': float(db_env('POOL_MAX_IDLE', '300')),
+            'check': db_env('POOL_CHECK', 'True') == 'True',
+        }
+    if DB_POOL_MODE == 'pgbouncer':
+        DATABASES['default']['PGBOUNCER'] = True
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
 else:
     # Default to SQLite for local development
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                # Take the write lock when a transaction starts, so background
+                # RFM jobs wait for other writers instead of failing with
+                # "database is locked"
+                'transaction_mode': 'IMMEDIATE',
+            },
+            # Tests use a file instead of a shared in-memory database: its
+            # connections wait for the write lock, where in-memory ones fail
+            # with "database table is locked" (concurrent order tests)
+            'TEST': {
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
         }
     }
 
+# Read replicas, POSTGRES_REPLICAS or DB_REPLICAS: comma separated hosts
+# ('host' or 'host:port') on PostgreSQL, database files on SQLite (e.g. a
+# copy of db.sqlite3, for trying routing locally). They become the aliases
+# replica1, replica2, ... with the settings of 'default'; reads of the
+# viewsets' replica_actions go to them (see minicrm/routers.py)
+DATABASE_REPLICAS = []
+replica_locations = (
+    os.environ.get('POSTGRES_REPLICAS') or os.environ.get('DB_REPLICAS', '')
+).split(',')
+for number, location in enumerate(filter(None, map(str.strip, replica_locations)), 1):
+    alias = f'replica{number}'
+    replica = copy.deepcopy(DATABASES['default'])
+    if use_postgresql:
+        host, _, port = location.partition(':')
+        replica['HOST'] = host
+        replica['PORT'] = port or replica['PORT']
+    else:
+        replica['NAME'] = BASE_DIR / location
+    # Tests read the test database through the replica aliases
+    replica['TEST'] = {'MIRROR': 'default'}
+    DATABASES[alias] = replica
+    DATABASE_REPLICAS.append(alias)
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['minicrm.routers.ReplicaRouter']
+# Seconds a client reads from the primary after sending a write
+DB_REPLICA_STICKY_SECONDS = float(os.environ.get('DB_REPLICA_STICKY_SECONDS', '5'))
+
+# Covering indexes (Index.include) are created without their non-key columns
+# on SQLite; the warning about it is expected in local development
+SILENCED_SYSTEM_CHECKS = ['models.W040']
+
+# Caches
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# RFM summary endpoints (by-segment, statistics) are cached in the 'rfm'
+# cache, keyed by the RFM generation. RFM_CACHE_BACKEND selects its backend:
+# 'locmem' (per process), 'file' or 'db' (shared by all workers; the table is
+# created with `python manage.py createcachetable`)
+RFM_CACHE_BACKEND = os.environ.get('RFM_CACHE_BACKEND', 'locmem')
+RFM_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'rfm',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('RFM_CACHE_LOCATION', '/tmp/minicrm-rfm-cache'),
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': os.environ.get('RFM_CACHE_LOCATION', 'rfm_cache'),
+    },
+}
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'rfm': {
+        **RFM_CACHE_BACKENDS[RFM_CACHE_BACKEND],
+        # Entries of older generations are never read again and expire
+        'TIMEOUT': int(os.environ.get('RFM_CACHE_TIMEOUT', '3600')),
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -153,9 +267,70 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 REST_FRAMEWORK = {
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    # Keyset pagination on each viewset's keyset_ordering (see minicrm/pagination.py)
+    'DEFAULT_PAGINATION_CLASS': 'minicrm.pagination.KeysetPagination',
     'PAGE_SIZE': 10,
 }
+# Largest ?page_size= clients may request
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', '100'))
+# Serve list endpoints from values_list() rows instead of model instances
+# (same output, see minicrm/fastlist.py)
+API_FAST_LIST = os.environ.get('API_FAST_LIST', 'False') == 'True'
+# Serve GET list/detail and the RFM summaries with async views (see
+# minicrm/asyncviews.py); for ASGI deployments (minicrm.asgi, start.sh)
+API_ASYNC_READS = os.environ.get('API_ASYNC_READS', 'False') == 'True'
+# Rows fetched and serialized per chunk by the streaming /export/ endpoints
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', '2000'))
+
+# RFM analysis
+# Scoring engine: 'sql' (CTE/NTILE query in the database) or 'numpy'
+# (vectorized in-process scoring, works on any database backend)
+RFM_ENGINE = os.environ.get('RFM_ENGINE', 'sql')
+# Rows per bulk_create when persisting RFM scores on non-PostgreSQL backends
+RFM_BATCH_SIZE = int(os.environ.get('RFM_BATCH_SIZE', '1000'))
+# Rows streamed from the database per round trip (server-side cursor on PostgreSQL)
+RFM_CHUNK_SIZE = int(os.environ.get('RFM_CHUNK_SIZE', '2000'))
+# Parallel partitions (threads with one database session each) for full
+# RFM runs; 1 runs the selected engine serially
+RFM_WORKERS = int(os.environ.get('RFM_WORKERS', '1'))
+# Incremental runs fall back to a full rebuild when the share of customers in
+# any score bucket moved by more than this, or the boundaries are too old
+RFM_INCREMENTAL_DRIFT_THRESHOLD = float(os.environ.get('RFM_INCREMENTAL_DRIFT_THRESHOLD', '0.05'))
+RFM_INCREMENTAL_MAX_AGE_DAYS = int(os.environ.get('RFM_INCREMENTAL_MAX_AGE_DAYS', '7'))
+# POST /api/rfm/calculate runs jobs in a background thread; set RFM_JOBS_EAGER
+# to run them inside the request instead (tests, debugging)
+RFM_JOBS_EAGER = os.environ.get('RFM_JOBS_EAGER', 'False') == 'True'
+# Active jobs without a heartbeat (refreshed every third of this) for this
+# long are marked failed
+RFM_JOB_STALE_SECONDS = int(os.environ.get('RFM_JOB_STALE_SECONDS', '600'))
+# Snapshot history retention: every run is kept for RFM_SNAPSHOT_KEEP_ALL_DAYS,
+# then the last run of each month until RFM_SNAPSHOT_KEEP_MONTHLY_DAYS
+RFM_SNAPSHOT_KEEP_ALL_DAYS = int(os.environ.get('RFM_SNAPSHOT_KEEP_ALL_DAYS', '31'))
+RFM_SNAPSHOT_KEEP_MONTHLY_DAYS = int(os.environ.get('RFM_SNAPSHOT_KEEP_MONTHLY_DAYS', '730'))
+
+# Health checks (minicrm/health.py): seconds a /health/ready database probe
+# is served from cache, and the probe latency (ms) and share of PostgreSQL
+# max_connections in use above which the database is reported as degraded
+HEALTH_READY_INTERVAL = float(os.environ.get('HEALTH_READY_INTERVAL', '5'))
+HEALTH_DEGRADED_LATENCY_MS = float(os.environ.get('HEALTH_DEGRADED_LATENCY_MS', '250'))
+HEALTH_DEGRADED_SATURATION = float(os.environ.get('HEALTH_DEGRADED_SATURATION', '0.9'))
+
+# Metrics (minicrm/metrics.py): per-route request timings in Server-Timing
+# headers and at /metrics
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True') == 'True'
+# Directory where each process (gunicorn worker) writes its metrics for
+# /metrics to add up; empty keeps them in the process
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+# Seconds between two writes of a process's metrics file
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '1.0'))
+
+# Orders
+# Largest list accepted by POST /api/orders/bulk/ (rejected with 400 above it)
+ORDER_BULK_MAX_ORDERS = int(os.environ.get('ORDER_BULK_MAX_ORDERS', '10000'))
+# Rows per INSERT when bulk creating orders and order items
+ORDER_BULK_BATCH_SIZE = int(os.environ.get('ORDER_BULK_BATCH_SIZE', '1000'))
+# Rows per batch (and transaction) of manage.py import_data
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '5000'))
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
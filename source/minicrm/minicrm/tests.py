@@ -0,0 +1,177 @@
+import sqlite3
+import threading
+import time
+import uuid
+from unittest import mock
+
+from django.apps import apps
+from django.contrib.sessions.models import Session
+from django.db import connection
+from django.db.migrations.state import ProjectState
+from django.db.models import Index
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import resolve
+from rest_framework.test import APITestCase
+
+from order.models import Order
+from rfm.models import RFMScore
+from . import health
+from .db.pool import POOLS, ConnectionPool, PoolTimeout
+from .middleware import ReplicaRoutingMiddleware
+from .operations import AddIndexConcurrently
+from .routers import PRIMARY_COOKIE, ReplicaRouter
+
+
+class HealthCheckTests(APITestCase):
+    def setUp(self):
+        health._probe['checked_at'] = None
+
+    def test_liveness_never_touches_the_database(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/health/live')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'alive')
+
+    def test_readiness_probe_is_cached_for_the_interval(self):
+        with self.settings(HEALTH_READY_INTERVAL=60):
+            with self.assertNumQueries(1):
+                response = self.client.get('/health/ready')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['status'], 'healthy')
+            self.assertIn('latency_ms', response.json())
+            with self.assertNumQueries(0):
+                self.client.get('/health/ready')
+                self.client.get('/health')
+        with self.settings(HEALTH_READY_INTERVAL=0), self.assertNumQueries(1):
+            self.client.get('/health/ready')
+
+    def test_slow_database_is_degraded_but_ready(self):
+        with self.settings(HEALTH_DEGRADED_LATENCY_MS=-1):
+            response = self.client.get('/health/ready')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'degraded')
+        self.assertEqual(response.json()['reasons'], ['slow_database'])
+
+    def test_full_connection_pool_is_degraded(self):
+        pool = ConnectionPool('default', connect=lambda: sqlite3.connect(':memory:'),
+                              min_size=0, max_size=1)
+        POOLS['default'] = pool
+        try:
+            connection = pool.getconn()
+            response = self.client.get('/health/ready')
+            pool.putconn(connection)
+        finally:
+            del POOLS['default']
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'degraded')
+        self.assertEqual(response.json()['pool']['in_use'], 1)
+        self.assertIn('pool_saturated', response.json()['reasons'])
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def make_pool(self, **options):
+        self.opened = 0
+
+        def connect():
+            self.opened += 1
+            return sqlite3.connect(':memory:', check_same_thread=False)
+
+        options = {'min_size': 0, 'max_size': 1, 'timeout': 0.05, **options}
+        return ConnectionPool('test', connect, check=lambda c: c.execute('SELECT 1'), **options)
+
+    def test_connections_are_reused_up_to_max_size(self):
+        pool = self.make_pool()
+        connection = pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        pool.putconn(connection)
+        self.assertIs(pool.getconn(), connection)
+        self.assertEqual(self.opened, 1)
+        self.assertEqual(pool.stats()['utilization'], 1.0)
+
+    def test_checkout_waits_for_a_returned_connection(self):
+        pool = self.make_pool(timeout=5)
+        connection = pool.getconn()
+        threading.Timer(0.05, pool.putconn, [connection]).start()
+        started = time.monotonic()
+        self.assertIs(pool.getconn(), connection)
+        self.assertGreaterEqual(time.monotonic() - started, 0.04)
+
+    def test_old_and_broken_connections_are_replaced(self):
+        pool = self.make_pool(max_lifetime=0.01)
+        old = pool.getconn()
+        pool.putconn(old)
+        time.sleep(0.02)
+        self.assertIsNot(pool.getconn(), old)
+
+        pool = self.make_pool(min_size=1)
+        broken = pool.getconn()
+        pool.putconn(broken)
+        broken.close()
+        replacement = pool.getconn()
+        self.assertIsNot(replacement, broken)
+        self.assertEqual(pool.stats()['size'], 1)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], DB_REPLICA_STICKY_SECONDS=5)
+class ReplicaRoutingTests(SimpleTestCase):
+    def route(self, method, path, model=Order, cookies=None):
+        """Database of a read of `model` in the view, and the response."""
+        request = RequestFactory().generic(method, path)
+        request.COOKIES.update(cookies or {})
+        seen = []
+
+        def view(request):
+            request.resolver_match = resolve(request.path_info)
+            seen.append(ReplicaRouter().db_for_read(model))
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(view)(request)
+        return seen[0], response
+
+    def test_safe_reads_of_replica_actions_go_to_a_replica(self):
+        for path in ('/api/orders/', f'/api/customers/{uuid.uuid4()}/',
+                     '/api/rfm/statistics/', '/api/rfm/by-segment/', '/api/orders/export/'):
+            with self.subTest(path=path):
+                self.assertEqual(self.route('GET', path, RFMScore)[0], 'replica1')
+
+    def test_writes_and_other_actions_use_the_primary(self):
+        self.assertEqual(self.route('POST', '/api/orders/')[0], 'default')
+        self.assertEqual(self.route('POST', '/api/rfm/calculate/')[0], 'default')
+        self.assertEqual(self.route('GET', f'/api/rfm/jobs/{uuid.uuid4()}/')[0], 'default')
+        self.assertEqual(self.route('GET', '/api/orders/', Session)[0], 'default')
+        # Outside requests (commands, background jobs): Django's default
+        self.assertIsNone(ReplicaRouter().db_for_read(Order))
+        self.assertEqual(ReplicaRouter().db_for_write(Order), 'default')
+
+    def test_clients_read_their_writes_from_the_primary(self):
+        _, response = self.route('PATCH', f'/api/customers/{uuid.uuid4()}/')
+        cookie = response.cookies[PRIMARY_COOKIE]
+        self.assertEqual(cookie['max-age'], 5)
+        self.assertGreater(float(cookie.value), time.time())
+
+        cookies = {PRIMARY_COOKIE: cookie.value}
+        self.assertEqual(self.route('GET', '/api/orders/', cookies=cookies)[0], 'default')
+        expired = {PRIMARY_COOKIE: str(time.time() - 1)}
+        self.assertEqual(self.route('GET', '/api/orders/', cookies=expired)[0], 'replica1')
+        _, response = self.route('GET', '/api/orders/')
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+
+
+class AddIndexConcurrentlyTests(SimpleTestCase):
+    def add_index(self, vendor):
+        operation = AddIndexConcurrently(
+            'order', Index(fields=['status'], name='order_status_test_idx'))
+        state = ProjectState.from_apps(apps)
+        to_state = state.clone()
+        operation.state_forwards('order', to_state)
+        schema_editor = mock.Mock(connection=mock.Mock(vendor=vendor, in_atomic_block=False))
+        operation.database_forwards('order', schema_editor, state, to_state)
+        return schema_editor.add_index.call_args
+
+    def test_postgresql_builds_without_blocking_writes(self):
+        self.assertEqual(self.add_index('postgresql').kwargs, {'concurrently': True})
+
+    def test_other_databases_add_a_plain_index(self):
+        self.assertEqual(self.add_index(connection.vendor).kwargs, {})
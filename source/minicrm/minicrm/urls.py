@@ -24,7 +24,9 @@ from customer.views import CustomerViewSet
 from order.views import OrderViewSet
 from product.views import ProductViewSet
 from rfm.views import RFMScoreViewSet
-from .health import health_check
+from .asyncviews import async_read_urls
+from .health import health_check, liveness, readiness
+from .metrics import metrics_view
 
 router = DefaultRouter()
 router.register(r'customers', CustomerViewSet)
@@ -34,9 +36,12 @@ router.register(r'rfm', RFMScoreViewSet, basename='rfm')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/', include(router.urls)),
+    path('api/', include(async_read_urls(router.urls) if settings.API_ASYNC_READS else router.urls)),
+    path('health/live', liveness, name='health-live'),
+    path('health/ready', readiness, name='health-ready'),
     path('health/', health_check, name='health'),
     path('health', health_check, name='health-no-slash'),  # Support both with and without trailing slash
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Serve static files in development/production (for DRF browsable API CSS)
@@ -0,0 +1,122 @@
+"""
+Maintenance of the per-customer order aggregates (CustomerOrderAggregate).
+
+Order writes refresh the aggregates of the affected customers from their
+orders (an indexed lookup on order_order.customer_id), so the result does
+not depend on what changed. The rebuild recomputes every customer in two
+set-based statements and repairs any drift left by bulk writes.
+"""
+
+from django.db import connection, transaction
+from django.db.models import Count, Max, Min, Sum
+
+from customer.models import Customer
+from .models import CustomerOrderAggregate, Order
+
+
+AGGREGATE_FIELDS = [
+    'order_count', 'total_spent', 'first_order_date', 'last_order_date', 'updated_at'
+]
+
+# Order fields the aggregates are computed from (names and attnames)
+AGGREGATED_ORDER_FIELDS = frozenset({'customer', 'customer_id', 'order_date', 'total_price'})
+
+REBUILD_AGGREGATES_QUERY = """
+INSERT INTO order_customer_aggregates (
+    customer_id,
+    order_count,
+    total_spent,
+    first_order_date,
+    last_order_date,
+    updated_at
+)
+SELECT
+    customer_id,
+    COUNT(*),
+    COALESCE(SUM(total_price), 0),
+    MIN(order_date),
+    MAX(order_date),
+    CURRENT_TIMESTAMP
+FROM order_order
+GROUP BY customer_id;
+"""
+
+
+def changes_aggregates(update_fields):
+    """
+    Whether an Order save can change its customer's aggregates.
+
+    Args:
+        update_fields: The update_fields of the save (None: every field)
+    """
+    return update_fields is None or not AGGREGATED_ORDER_FIELDS.isdisjoint(update_fields)
+
+
+def aggregate_orders(customer_ids):
+    """
+    Order aggregates of the given customers, one values() row per customer
+    with orders; answered from order_customer_date_idx.
+    """
+    return (
+        Order.objects.filter(customer_id__in=customer_ids)
+        .values('customer_id')
+        .annotate(
+            order_count=Count('id'),
+            total_spent=Sum('total_price'),
+            first_order_date=Min('order_date'),
+            last_order_date=Max('order_date'),
+        ).order_by()
+    )
+
+
+def refresh_customer_aggregates(customer_ids):
+    """
+    Recompute the order aggregates of the given customers.
+
+    Locks the customers' rows first (SELECT ... FOR UPDATE where supported),
+    so concurrent order writes for one customer are applied one after the
+    other and the last refresh sees every committed order.
+
+    Args:
+        customer_ids: Iterable of customer primary keys
+    """
+    customer_ids = set(customer_ids)
+    if not customer_ids:
+        return
+    with transaction.atomic():
+        locked = list(
+            Customer.objects.select_for_update()
+            .filter(pk__in=customer_ids).order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        aggregates = [
+            CustomerOrderAggregate(**row) for row in aggregate_orders(locked)
+        ]
+        if len(aggregates) < len(locked):
+            # Customers without orders have no row, as after a rebuild
+            CustomerOrderAggregate.objects.filter(customer_id__in=locked).exclude(
+                customer_id__in=[aggregate.customer_id for aggregate in aggregates]
+            ).delete()
+        CustomerOrderAggregate.objects.bulk_create(
+            aggregates,
+            update_conflicts=True,
+            unique_fields=['customer'],
+            update_fields=AGGREGATE_FIELDS,
+        )
+
+
+def rebuild_customer_aggregates():
+    """
+    Recompute the aggregates of every customer from order_order.
+
+    Customers without orders get no row; readers treat a missing row as
+    zero orders (LEFT JOIN).
+
+    Returns:
+        int: Number of customers with orders
+    """
+    with transaction.atomic():
+        CustomerOrderAggregate.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(REBUILD_AGGREGATES_QUERY)
+    return CustomerOrderAggregate.objects.count()
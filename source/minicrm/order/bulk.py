@@ -0,0 +1,149 @@
+"""
+Bulk order creation (POST /api/orders/bulk/).
+
+POST /api/orders/ writes one order per request: OrderSerializer.create
+inserts it with its total and adds its items with one INSERT, but
+validation looks up the customer and each product on its own, stock is
+reserved with one UPDATE per product, and the order's post_save refreshes
+its customer's aggregates (3 statements) and marks the customer for RFM
+rescoring. A one-item order takes 9 statements plus savepoints, and one
+more to return its items. A bulk request instead:
+
+1. loads every referenced customer and product in two queries,
+2. validates each order on its own with BulkOrderSerializer, so an
+   invalid order is reported without rejecting the batch,
+3. reserves stock for the batch (order/stock.py allocate_stock): orders
+   whose products ran out are rejected individually,
+4. computes totals in Python and inserts the accepted orders and their
+   items with batched bulk_create calls in the same transaction, then
+   refreshes the order aggregates of the affected customers once.
+
+bulk_create does not send post_save; receivers that must see bulk
+inserted orders listen to signals.orders_bulk_created instead.
+"""
+
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+
+from customer.models import Customer
+from product.models import Product
+from .aggregates import refresh_customer_aggregates
+from .models import Order, OrderItem
+from .serializers import BulkOrderSerializer
+from .signals import orders_bulk_created
+from .stock import allocate_stock, required_quantities
+
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def get_batch_size(batch_size=None):
+    """Returns the explicit batch size or the ORDER_BULK_BATCH_SIZE setting."""
+    return batch_size or getattr(settings, 'ORDER_BULK_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+
+def _referenced_ids(values):
+    # Malformed ids are left to the serializer fields to report
+    ids = set()
+    for value in values:
+        try:
+            ids.add(uuid.UUID(str(value)))
+        except (TypeError, ValueError, AttributeError):
+            pass
+    return ids
+
+
+def prefetch_references(data):
+    """
+    Load the customers and products referenced by a list of raw orders.
+
+    Returns:
+        dict: Serializer context with 'customers' and 'products', each
+        {primary key: instance}
+    """
+    orders = [order for order in data if isinstance(order, dict)]
+    items = [
+        item for order in orders
+        if isinstance(order.get('items'), list)
+        for item in order['items'] if isinstance(item, dict)
+    ]
+    customer_ids = _referenced_ids(order.get('customer') for order in orders)
+    product_ids = _referenced_ids(item.get('product') for item in items)
+    return {
+        'customers': Customer.objects.in_bulk(customer_ids),
+        'products': Product.objects.in_bulk(product_ids),
+    }
+
+
+def validate_orders(data):
+    """
+    Validate a list of raw orders independently of each other.
+
+    Args:
+        data: List of order payloads as accepted by POST /api/orders/
+
+    Returns:
+        tuple: (valid, errors) where valid is a list of (index,
+        validated_data) and errors a list of (index, serializer errors)
+    """
+    context = prefetch_references(data)
+    valid, errors = [], []
+    for index, order in enumerate(data):
+        serializer = BulkOrderSerializer(data=order, context=context)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append((index, serializer.errors))
+    return valid, errors
+
+
+def create_orders_in_bulk(validated_orders, batch_size=None):
+    """
+    Reserve stock for validated orders and insert those that fit, in one
+    transaction.
+
+    Args:
+        validated_orders: validated_data of BulkOrderSerializer, one per order
+        batch_size: Rows per INSERT (defaults to ORDER_BULK_BATCH_SIZE)
+
+    Returns:
+        list: One entry per input order, in input order: the created Order,
+        or the InsufficientStock error that rejected it
+    """
+    batch_size = get_batch_size(batch_size)
+    with transaction.atomic():
+        rejections = allocate_stock([
+            required_quantities(
+                (item['product'].pk, item['quantity']) for item in data['items']
+            )
+            for data in validated_orders
+        ])
+
+        results, orders, items = [], [], []
+        for data, rejection in zip(validated_orders, rejections):
+            if rejection is not None:
+                results.append(rejection)
+                continue
+            order = Order(
+                customer=data['customer'],
+                status=data['status'],
+                total_price=sum(
+                    (item['product'].price * item['quantity'] for item in data['items']),
+                    0
+                ),
+            )
+            results.append(order)
+            orders.append(order)
+            items.extend(
+                OrderItem(order=order, product=item['product'], quantity=item['quantity'])
+                for item in data['items']
+            )
+
+        Order.objects.bulk_create(orders, batch_size=batch_size)
+        OrderItem.objects.bulk_create(items, batch_size=batch_size)
+        customer_ids = {order.customer_id for order in orders}
+        refresh_customer_aggregates(customer_ids)
+        orders_bulk_created.send(sender=Order, orders=orders, customer_ids=customer_ids)
+    return results
@@ -0,0 +1,348 @@
+"""
+Bulk import of historical customers, products, orders and order items
+(manage.py import_data).
+
+Each source file (CSV with a header row, or NDJSON; optionally .gz) is
+read in batches of IMPORT_BATCH_SIZE rows. A batch is
+
+1. cleaned row by row with the model fields (types, lengths, email
+   format); rows without a value for a field with a default get the
+   default,
+2. checked in bulk: one query per foreign key for the referenced rows,
+   one per unique column (customer email) for rows owned by another id;
+   rows that fail are written to the rejects file with their errors,
+3. merged into the table, keyed on the primary key (a re-imported row
+   overwrites the stored one; items have no key and are appended):
+   - PostgreSQL: COPY FROM STDIN into a temporary staging table, then one
+     INSERT ... SELECT ... ON CONFLICT DO UPDATE,
+   - other backends: executemany() of INSERT ... ON CONFLICT DO UPDATE,
+4. committed together with the number of source rows consumed
+   (ImportCheckpoint), so an interrupted import resumes after the last
+   committed batch without importing a row twice.
+
+Orders are historical: importing them reserves no stock. Each batch
+sends orders_imported so RFM marks the customers for rescoring; the order
+aggregates are rebuilt set-based once the orders file is done (after an
+interruption they are stale until the resumed import finishes).
+"""
+
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.utils import timezone
+
+from customer.models import Customer
+from product.models import Product
+from .aggregates import rebuild_customer_aggregates
+from .models import ImportCheckpoint, Order, OrderItem
+from .signals import orders_imported
+
+
+DEFAULT_BATCH_SIZE = 5000
+
+
+def get_batch_size(batch_size=None):
+    """Returns the explicit batch size or the IMPORT_BATCH_SIZE setting."""
+    return batch_size or getattr(settings, 'IMPORT_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+
+class ImportSpec:
+    """
+    How the rows of one source map onto a model's table.
+
+    Args:
+        name: Source name (command option, checkpoint and rejects label)
+        model: Model class of the table
+        fields: Names of the imported model fields; foreign keys are read
+            from the column `name` or `name_id`
+        merge_key: Field whose conflicts update the stored row, or None to
+            only insert
+    """
+
+    def __init__(self, name, model, fields, merge_key='id'):
+        self.name = name
+        self.model = model
+        self.fields = [model._meta.get_field(field) for field in fields]
+        self.merge_key = model._meta.get_field(merge_key) if merge_key else None
+
+    @property
+    def references(self):
+        return [field for field in self.fields if field.is_relation]
+
+    @property
+    def unique_fields(self):
+        return [
+            field for field in self.fields
+            if field.unique and field is not self.merge_key
+        ]
+
+
+SPECS = {
+    spec.name: spec for spec in (
+        ImportSpec('customers', Customer, ['id', 'name', 'email', 'phone', 'address']),
+        ImportSpec('products', Product, ['id', 'name', 'description', 'price', 'stock']),
+        ImportSpec('orders', Order, ['id', 'customer', 'status', 'order_date', 'total_price']),
+        ImportSpec('items', OrderItem, ['order', 'product', 'quantity'], merge_key=None),
+    )
+}
+
+# Dependency order: rows reference rows of the sources before them
+SOURCE_ORDER = ['customers', 'products', 'orders', 'items']
+
+
+def open_source(path):
+    """
+    Rows of a CSV or NDJSON file, as dicts of raw values.
+
+    The format follows the extension: .csv, or .ndjson/.jsonl, either
+    optionally followed by .gz.
+    """
+    name = path[:-3] if path.endswith('.gz') else path
+    opener = gzip.open if path.endswith('.gz') else open
+    if name.endswith('.csv'):
+        with opener(path, 'rt', newline='', encoding='utf-8') as file:
+            yield from csv.DictReader(file)
+    elif name.endswith(('.ndjson', '.jsonl')):
+        with opener(path, 'rt', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Rejected by clean_row like any other non-object
+                    yield line.rstrip('\n')
+    else:
+        raise ValueError(f'Unsupported file format: {path} (expected .csv or .ndjson)')
+
+
+def clean_value(field, raw):
+    """Python value of a raw field value; raises ValidationError."""
+    if raw is None or raw == '':
+        if field.has_default():
+            return field.get_default()
+        if field.null:
+            return None
+        raise ValidationError('This field is required.')
+    if field.is_relation:
+        return field.target_field.to_python(raw)
+    value = field.clean(raw, None)
+    if isinstance(value, datetime.datetime) and timezone.is_naive(value):
+        # Naive timestamps in the files are UTC
+        value = timezone.make_aware(value, datetime.timezone.utc)
+    return value
+
+
+def clean_row(spec, raw):
+    """
+    Returns:
+        tuple: (values by attname, errors by field name)
+    """
+    values, errors = {}, {}
+    if not isinstance(raw, dict):
+        return values, {'row': ['Expected an object']}
+    for field in spec.fields:
+        try:
+            values[field.attname] = clean_value(
+                field, raw.get(field.name, raw.get(field.attname)))
+        except ValidationError as exc:
+            errors[field.name] = exc.messages
+    return values, errors
+
+
+def check_batch(spec, rows):
+    """
+    Bulk checks of cleaned rows: foreign keys and unique columns.
+
+    Args:
+        rows: List of (line, raw, values) of rows that passed clean_row
+
+    Returns:
+        tuple: (accepted rows, rejected (line, raw, errors))
+    """
+    errors = {}
+    for field in spec.references:
+        target = field.related_model
+        ids = {values[field.attname] for _, _, values in rows}
+        existing = set(
+            target._default_manager.filter(pk__in=ids).values_list('pk', flat=True))
+        for line, _, values in rows:
+            if values[field.attname] not in existing:
+                errors.setdefault(line, {})[field.name] = [
+                    f'{target._meta.verbose_name.capitalize()} '
+                    f'{values[field.attname]} does not exist.'
+                ]
+
+    key = spec.merge_key.attname if spec.merge_key else None
+    for field in spec.unique_fields:
+        owners = dict(
+            spec.model._default_manager.filter(
+                **{f'{field.attname}__in': {values[field.attname] for _, _, values in rows}}
+            ).values_list(field.attname, 'pk')
+        )
+        for line, _, values in rows:
+            owner = owners.setdefault(values[field.attname], values.get(key, line))
+            if owner != values.get(key, line):
+                errors.setdefault(line, {})[field.name] = [
+                    f'{field.verbose_name.capitalize()} {values[field.attname]} '
+                    'belongs to another row.'
+                ]
+
+    accepted = [row for row in rows if row[0] not in errors]
+    rejected = [(line, raw, errors[line]) for line, raw, _ in rows if line in errors]
+    return accepted, rejected
+
+
+def upsert_sql(spec, table, columns, select=None):
+    quote = connection.ops.quote_name
+    names = ', '.join(quote(column) for column in columns)
+    source = select or f"VALUES ({', '.join(['%s'] * len(columns))})"
+    sql = f'INSERT INTO {quote(table)} ({names}) {source}'
+    if spec.merge_key:
+        updates = ', '.join(
+            f'{quote(column)} = EXCLUDED.{quote(column)}'
+            for column in columns if column != spec.merge_key.column
+        )
+        sql += f' ON CONFLICT ({quote(spec.merge_key.column)}) DO UPDATE SET {updates}'
+    return sql
+
+
+def copy_merge(spec, cursor, columns, values):
+    """Merge rows through COPY into a staging table (PostgreSQL)."""
+    quote = connection.ops.quote_name
+    table = spec.model._meta.db_table
+    staging = quote(f'import_staging_{table}')
+    names = ', '.join(quote(column) for column in columns)
+    cursor.execute(
+        f'CREATE TEMPORARY TABLE IF NOT EXISTS {staging} ON COMMIT DELETE ROWS '
+        f'AS SELECT {names} FROM {quote(table)} WITH NO DATA'
+    )
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in values:
+        writer.writerow(['\\N' if value is None else value for value in row])
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {staging} ({names}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+    # Conflicting keys update; the staging rows go at commit
+    cursor.execute(upsert_sql(spec, table, columns, select=f'SELECT {names} FROM {staging}'))
+
+
+def write_rows(spec, rows):
+    """Insert or update cleaned rows (values by attname) in the spec's table."""
+    if spec.merge_key:
+        # A key repeated within the batch: the last row wins, as across batches
+        rows = list({row[spec.merge_key.attname]: row for row in rows}.values())
+    columns = [field.column for field in spec.fields]
+    # The connection itself, not the thread-local proxy looked up per value
+    database = connections[DEFAULT_DB_ALIAS]
+    values = [
+        [field.get_db_prep_save(row[field.attname], database) for field in spec.fields]
+        for row in rows
+    ]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            copy_merge(spec, cursor, columns, values)
+        else:
+            cursor.executemany(upsert_sql(spec, spec.model._meta.db_table, columns), values)
+
+
+def affected_customer_ids(rows):
+    """Customers whose orders change with imported order rows."""
+    customer_ids = {row['customer_id'] for row in rows}
+    # Re-imported orders may have moved to another customer
+    customer_ids.update(
+        Order.objects.filter(pk__in=[row['id'] for row in rows])
+        .values_list('customer_id', flat=True)
+    )
+    return customer_ids
+
+
+def import_batch(spec, batch, checkpoint, rows_done):
+    """
+    Clean, check and write one batch, and move the checkpoint, in one
+    transaction.
+
+    Returns:
+        tuple: (imported count, rejected (line, raw, errors))
+    """
+    cleaned, rejected = [], []
+    for line, raw in batch:
+        values, errors = clean_row(spec, raw)
+        if errors:
+            rejected.append((line, raw, errors))
+        else:
+            cleaned.append((line, raw, values))
+
+    with transaction.atomic():
+        accepted, invalid = check_batch(spec, cleaned) if cleaned else ([], [])
+        rejected.extend(invalid)
+        rows = [values for _, _, values in accepted]
+        customer_ids = affected_customer_ids(rows) if spec.model is Order else ()
+        if rows:
+            write_rows(spec, rows)
+        if customer_ids:
+            orders_imported.send(sender=Order, customer_ids=customer_ids)
+        checkpoint.rows_done = rows_done
+        checkpoint.save()
+    rejected.sort(key=lambda reject: reject[0])
+    return len(rows), rejected
+
+
+def import_file(name, path, batch_size=None, rejects=None, restart=False, progress=None):
+    """
+    Import one source file, resuming from its checkpoint.
+
+    Args:
+        name: Source name (a key of SPECS)
+        path: CSV or NDJSON file
+        batch_size: Rows per batch (defaults to IMPORT_BATCH_SIZE)
+        rejects: Text file receiving one JSON line per rejected row
+        restart: Ignore the checkpoint and import from the first row
+        progress: Optional callable receiving the result dict after each
+            batch
+
+    Returns:
+        dict: source, file, skipped (rows before the checkpoint), rows,
+        imported, rejected, seconds and rows_per_sec
+    """
+    spec = SPECS[name]
+    batch_size = get_batch_size(batch_size)
+    checkpoint, _ = ImportCheckpoint.objects.get_or_create(
+        source=f'{name}:{os.path.abspath(path)}')
+    if restart:
+        checkpoint.rows_done = 0
+        checkpoint.save()
+    skipped = checkpoint.rows_done
+
+    result = {
+        'source': name, 'file': path, 'skipped': skipped,
+        'rows': 0, 'imported': 0, 'rejected': 0, 'seconds': 0.0, 'rows_per_sec': 0.0,
+    }
+    started = time.perf_counter()
+    rows = islice(enumerate(open_source(path), start=1), skipped, None)
+    while batch := list(islice(rows, batch_size)):
+        imported, rejected = import_batch(spec, batch, checkpoint, batch[-1][0])
+        for line, raw, errors in rejected:
+            if rejects is not None:
+                rejects.write(json.dumps({
+                    'source': name, 'file': path, 'line': line, 'row': raw, 'errors': errors,
+                }, default=str) + '\n')
+        result['rows'] += len(batch)
+        result['imported'] += imported
+        result['rejected'] += len(rejected)
+        result['seconds'] = time.perf_counter() - started
+        result['rows_per_sec'] = result['rows'] / result['seconds'] if result['seconds'] else 0.0
+        if progress:
+            progress(result)
+    if spec.model is Order:
+        # bulk writes bypass the signals maintaining the aggregates
+        rebuild_customer_aggregates()
+    return result
@@ -0,0 +1,89 @@
+"""
+Management command to bulk import historical data from CSV/NDJSON files.
+
+Files are imported in dependency order (customers, products, orders,
+items) in batches; see order/importer.py. An interrupted import resumes
+from the last committed batch of each file when run again.
+
+Usage:
+    python manage.py import_data --customers customers.csv --orders orders.csv
+    python manage.py import_data --products products.ndjson --items items.csv.gz
+    python manage.py import_data --orders orders.csv --batch-size 20000
+    python manage.py import_data --orders orders.csv --rejects rejected.ndjson
+    python manage.py import_data --orders orders.csv --restart
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from order.importer import SOURCE_ORDER, import_file
+
+
+class Command(BaseCommand):
+    help = 'Bulk import customers, products, orders and order items from CSV/NDJSON files'
+
+    def add_arguments(self, parser):
+        for name in SOURCE_ORDER:
+            parser.add_argument(
+                f'--{name}',
+                metavar='FILE',
+                help=f'CSV or NDJSON file of {name} (optionally .gz)',
+            )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Rows per batch and transaction (default: IMPORT_BATCH_SIZE)',
+        )
+        parser.add_argument(
+            '--rejects',
+            default='import_rejects.ndjson',
+            help='File the rejected rows and their errors are appended to '
+                 '(default: import_rejects.ndjson)',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore checkpoints and import every file from its first row',
+        )
+
+    def handle(self, *args, **options):
+        sources = [(name, options[name]) for name in SOURCE_ORDER if options[name]]
+        if not sources:
+            raise CommandError(
+                'Pass at least one of ' + ', '.join(f'--{name}' for name in SOURCE_ORDER))
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        self.stdout.write(f'Importing into the {connection.vendor} database...')
+        rejected = 0
+        with open(options['rejects'], 'a', encoding='utf-8') as rejects:
+            for name, path in sources:
+                try:
+                    result = import_file(
+                        name, path,
+                        batch_size=options['batch_size'],
+                        rejects=rejects,
+                        restart=options['restart'],
+                        progress=self.report_progress if options['verbosity'] > 1 else None,
+                    )
+                except (OSError, ValueError) as e:
+                    raise CommandError(f'{name}: {e}')
+                rejected += result['rejected']
+                if result['skipped']:
+                    self.stdout.write(
+                        f"{name}: resumed after {result['skipped']} rows (checkpoint)")
+                self.stdout.write(self.style.SUCCESS(
+                    f"{name}: {result['imported']} imported, {result['rejected']} rejected "
+                    f"of {result['rows']} rows in {result['seconds']:.1f}s "
+                    f"({result['rows_per_sec']:.0f} rows/sec)"
+                ))
+
+        if rejected:
+            self.stdout.write(self.style.WARNING(
+                f"{rejected} rejected rows written to {options['rejects']}"))
+
+    def report_progress(self, result):
+        self.stdout.write(
+            f"  {result['source']}: {result['rows']} rows "
+            f"({result['rows_per_sec']:.0f} rows/sec)"
+        )
@@ -0,0 +1,23 @@
+"""
+Management command to rebuild the per-customer order aggregates.
+
+Recomputes order_customer_aggregates from order_order, repairing drift
+left by writes that bypass Order signals (QuerySet.update, bulk_create,
+raw SQL, data imports).
+
+Usage:
+    python manage.py rebuild_order_aggregates
+"""
+
+from django.core.management.base import BaseCommand
+from order.aggregates import rebuild_customer_aggregates
+
+
+class Command(BaseCommand):
+    help = 'Rebuild per-customer order aggregates (count, spend, first/last order) from orders'
+
+    def handle(self, *args, **options):
+        customers = rebuild_customer_aggregates()
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt order aggregates for {customers} customers')
+        )
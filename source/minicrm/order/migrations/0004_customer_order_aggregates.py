@@ -0,0 +1,44 @@
+# Generated by Django 5.1.7 on 2026-10-17 18:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0001_initial'),
+        ('order', '0003_fix_orderitem_product_fk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerOrderAggregate',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='order_aggregate', serialize=False, to='customer.customer')),
+                ('order_count', models.IntegerField(default=0)),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('first_order_date', models.DateTimeField(blank=True, null=True)),
+                ('last_order_date', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'order_customer_aggregates',
+            },
+        ),
+        # Backfill aggregates for existing orders
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO order_customer_aggregates (
+                    customer_id, order_count, total_spent,
+                    first_order_date, last_order_date, updated_at
+                )
+                SELECT
+                    customer_id, COUNT(*), COALESCE(SUM(total_price), 0),
+                    MIN(order_date), MAX(order_date), CURRENT_TIMESTAMP
+                FROM order_order
+                GROUP BY customer_id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
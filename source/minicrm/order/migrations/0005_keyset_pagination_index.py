@@ -0,0 +1,22 @@
+# Generated by Django 5.1.7 on 2026-10-17 19:09
+
+from django.db import migrations, models
+
+from minicrm.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('customer', '0001_initial'),
+        ('order', '0004_customer_order_aggregates'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['order_date', 'id'], name='order_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-17 19:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from minicrm.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('customer', '0001_initial'),
+        ('order', '0005_keyset_pagination_index'),
+    ]
+
+    operations = [
+        # Create the composite index before dropping the FK index it replaces
+        # (a plain DROP INDEX: no build, but it waits for running queries)
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['customer', 'order_date'], include=('total_price',), name='order_customer_date_idx'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='customer',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='customer.customer'),
+        ),
+    ]
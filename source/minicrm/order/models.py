@@ -3,11 +3,27 @@ from django.db import models
 
 class Order(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    customer = models.ForeignKey('customer.Customer', on_delete=models.CASCADE)
+    # Indexed by order_customer_date_idx (customer_id first)
+    customer = models.ForeignKey('customer.Customer', on_delete=models.CASCADE, db_index=False)
     order_date = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=200)
     total_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination key of the order list (see minicrm/pagination.py)
+            models.Index(fields=['order_date', 'id'], name='order_date_id_idx'),
+            # Per-customer aggregates (order/aggregates.py): count, totals and
+            # first/last order date of a customer are read from the index alone
+            # (INCLUDE is PostgreSQL only; elsewhere total_price is read from
+            # the table)
+            models.Index(
+                fields=['customer', 'order_date'],
+                include=['total_price'],
+                name='order_customer_date_idx',
+            ),
+        ]
+
     def __str__(self):
         return f"{self.customer.name} - {self.id}"
 
@@ -18,3 +34,46 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.product.name} x{self.quantity}"
+
+class CustomerOrderAggregate(models.Model):
+    """
+    Per-customer order totals, kept in sync with Order writes.
+
+    Updated in the same transaction as every Order save/delete (see
+    order/signals.py). Bulk writes that bypass signals (QuerySet.update,
+    bulk_create, raw SQL) leave it stale; repair with
+    `python manage.py rebuild_order_aggregates`.
+    """
+    customer = models.OneToOneField(
+        'customer.Customer',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='order_aggregate'
+    )
+    order_count = models.IntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    first_order_date = models.DateTimeField(null=True, blank=True)
+    last_order_date = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'order_customer_aggregates'
+
+    def __str__(self):
+        return f"{self.customer_id}: {self.order_count} orders, {self.total_spent}"
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Source rows already committed by manage.py import_data, per source
+    file; an interrupted import resumes after them (see order/importer.py).
+    """
+    source = models.CharField(max_length=1000, primary_key=True)
+    rows_done = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'order_import_checkpoints'
+
+    def __str__(self):
+        return f"{self.source}: {self.rows_done} rows"
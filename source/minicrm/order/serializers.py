@@ -1,6 +1,12 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
 from rest_framework import serializers
+from minicrm.fieldsets import SparseFieldsetSerializerMixin
+from minicrm.metrics import TimedSerializerMixin
 from .models import Order, OrderItem
+from .stock import InsufficientStock, required_quantities, reserve_stock
 from customer.models import Customer
+from customer.serializers import CustomerSerializer
 from product.models import Product
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -10,7 +16,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
         model = OrderItem
         fields = ['product', 'quantity']
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(TimedSerializerMixin, SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True)
     customer = serializers.PrimaryKeyRelatedField(queryset=Customer.objects.all())
 
@@ -18,16 +24,69 @@ class OrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = ['id', 'customer', 'status', 'order_date', 'total_price', 'items']
         read_only_fields = ['id', 'order_date', 'total_price']
+        expandable_fields = {'customer': CustomerSerializer}
 
+    @transaction.atomic
     def create(self, validated_data):
+        # Stock, order, items and the customer's order aggregates commit together
         items_data = validated_data.pop('items')
-        order = Order.objects.create(**validated_data)
-        total = 0
-        for item in items_data:
-            product = item['product']
-            quantity = item['quantity']
-            OrderItem.objects.create(order=order, product=product, quantity=quantity)
-            total += product.price * quantity
-        order.total_price = total
-        order.save()
+        try:
+            reserve_stock(required_quantities(
+                (item['product'].pk, item['quantity']) for item in items_data
+            ))
+        except InsufficientStock as exc:
+            raise serializers.ValidationError({'items': [str(exc)]})
+        # Saved once, with its total: every Order save refreshes aggregates
+        order = Order.objects.create(
+            total_price=sum(
+                (item['product'].price * item['quantity'] for item in items_data), 0
+            ),
+            **validated_data
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=item['product'], quantity=item['quantity'])
+            for item in items_data
+        )
         return order
+
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key field resolved from objects prefetched for a whole batch.
+
+    Looks objects up in serializer context[context_key], a dict keyed by
+    primary key, instead of querying the database once per value.
+    """
+
+    def __init__(self, context_key, **kwargs):
+        self.context_key = context_key
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        try:
+            pk = self.queryset.model._meta.pk.to_python(data)
+        except (TypeError, ValueError, DjangoValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return self.context[self.context_key][pk]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+
+
+class BulkOrderItemSerializer(OrderItemSerializer):
+    product = PrefetchedPrimaryKeyRelatedField(
+        context_key='products', queryset=Product.objects.all()
+    )
+
+
+class BulkOrderSerializer(OrderSerializer):
+    """
+    Validates one order of a bulk request (see order/bulk.py).
+
+    Customers and products are resolved from the batch's prefetched
+    objects; orders are inserted by create_orders_in_bulk, not create().
+    """
+    items = BulkOrderItemSerializer(many=True)
+    customer = PrefetchedPrimaryKeyRelatedField(
+        context_key='customers', queryset=Customer.objects.all()
+    )
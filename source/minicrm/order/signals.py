@@ -0,0 +1,61 @@
+"""
+Signal handlers that keep CustomerOrderAggregate in sync with orders.
+
+They run inside the transaction of the Order write, so the aggregates
+commit or roll back together with the order. Saves with update_fields
+that leave the customer, date and total alone skip the refresh.
+
+orders_bulk_created is sent by order/bulk.py, inside its transaction,
+after orders were inserted with bulk_create (which sends no post_save).
+Arguments: orders (the created Order instances) and customer_ids.
+
+orders_imported is sent by order/importer.py, inside the transaction of
+each batch of imported orders. Argument: customer_ids (the customers
+whose orders changed).
+"""
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from customer.models import Customer
+from .aggregates import changes_aggregates, refresh_customer_aggregates
+from .models import Order
+
+
+orders_bulk_created = Signal()
+orders_imported = Signal()
+
+
+@receiver(pre_save, sender=Order)
+def remember_previous_customer(sender, instance, raw=False, update_fields=None, **kwargs):
+    # An order moved to another customer changes both customers' totals
+    instance._previous_customer_id = None
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and update_fields.isdisjoint({'customer', 'customer_id'}):
+        return
+    instance._previous_customer_id = (
+        Order.objects.filter(pk=instance.pk)
+        .values_list('customer_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Order)
+def refresh_aggregates_on_order_save(sender, instance, raw=False, update_fields=None,
+                                     **kwargs):
+    if raw or not changes_aggregates(update_fields):
+        return
+    customer_ids = {instance.customer_id}
+    previous = getattr(instance, '_previous_customer_id', None)
+    if previous is not None:
+        customer_ids.add(previous)
+    refresh_customer_aggregates(customer_ids)
+
+
+@receiver(post_delete, sender=Order)
+def refresh_aggregates_on_order_delete(sender, instance, origin=None, **kwargs):
+    # A customer cascade delete removes the aggregate row as well
+    origin_model = getattr(origin, 'model', type(origin))
+    if origin_model is Customer:
+        return
+    refresh_customer_aggregates([instance.customer_id])
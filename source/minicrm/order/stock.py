@@ -0,0 +1,124 @@
+"""
+Stock reservation for new orders.
+
+Stock is decremented in the database with one conditional UPDATE per
+product:
+
+    UPDATE product_product SET stock = stock - q WHERE id = %s AND stock >= q
+
+The check and the decrement are a single statement, so concurrent orders
+can neither oversell nor lose each other's updates (as a read, subtract,
+save sequence would). An UPDATE matching no row means insufficient stock;
+InsufficientStock is raised and the caller's transaction rolls back the
+decrements already applied for the order.
+
+Products are always updated in primary key order. Two transactions
+reserving overlapping products therefore lock their rows in the same
+order and wait for each other instead of deadlocking.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from product.models import Product
+
+
+class InsufficientStock(Exception):
+    """A product has less stock than requested."""
+
+    def __init__(self, product_id, requested, available):
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+        super().__init__(
+            f'Insufficient stock for product {product_id}: '
+            f'requested {requested}, available {available}'
+        )
+
+
+def required_quantities(items):
+    """
+    Sum item quantities per product.
+
+    Args:
+        items: Iterable of (product_id, quantity) pairs
+
+    Returns:
+        dict: {product_id: total quantity}
+    """
+    quantities = defaultdict(int)
+    for product_id, quantity in items:
+        quantities[product_id] += quantity
+    return dict(quantities)
+
+
+def reserve_stock(quantities):
+    """
+    Decrement the stock of several products, all or nothing.
+
+    Runs in a transaction (a savepoint when nested), so a rejection also
+    undoes the decrements already applied for other products.
+
+    Args:
+        quantities: {product_id: quantity}
+
+    Raises:
+        InsufficientStock: for the first product (in primary key order)
+            without enough stock
+    """
+    with transaction.atomic():
+        for product_id in sorted(quantities):
+            quantity = quantities[product_id]
+            updated = Product.objects.filter(
+                pk=product_id, stock__gte=quantity
+            ).update(stock=F('stock') - quantity)
+            if not updated:
+                available = (
+                    Product.objects.filter(pk=product_id)
+                    .values_list('stock', flat=True).first()
+                )
+                raise InsufficientStock(product_id, quantity, available or 0)
+
+
+def allocate_stock(orders):
+    """
+    Reserve stock for many orders, rejecting those that do not fit.
+
+    Locks every referenced product first (in primary key order), so the
+    stock read is authoritative until commit. Orders are then accepted in
+    input order while stock lasts, and the accepted totals are applied with
+    one conditional UPDATE per product (reserve_stock).
+
+    Args:
+        orders: List of {product_id: quantity}, one per order
+
+    Returns:
+        list: One entry per order: None if accepted, else InsufficientStock
+    """
+    product_ids = sorted({pk for quantities in orders for pk in quantities})
+    with transaction.atomic():
+        available = dict(
+            Product.objects.select_for_update()
+            .filter(pk__in=product_ids).order_by('pk')
+            .values_list('pk', 'stock')
+        )
+        totals = defaultdict(int)
+        results = []
+        for quantities in orders:
+            rejection = next(
+                (
+                    InsufficientStock(pk, quantities[pk], available.get(pk, 0))
+                    for pk in sorted(quantities)
+                    if quantities[pk] > available.get(pk, 0)
+                ),
+                None
+            )
+            if rejection is None:
+                for pk, quantity in quantities.items():
+                    available[pk] -= quantity
+                    totals[pk] += quantity
+            results.append(rejection)
+        reserve_stock(totals)
+    return results
@@ -1,3 +1,745 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.urls import include, path
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from customer.models import Customer
+from product.models import Product
+from minicrm.asyncviews import async_read_urls
+from minicrm.explain import sequential_scans
+from minicrm.pagination import keyset_filter
+from .aggregates import aggregate_orders, rebuild_customer_aggregates
+from .bulk import validate_orders
+from .models import CustomerOrderAggregate, ImportCheckpoint, Order, OrderItem
+from .views import OrderViewSet
+from .stock import InsufficientStock, allocate_stock, reserve_stock
+from minicrm.urls import router
+from rfm.models import RFMDirtyCustomer
+
+
+# URLconf of OrderAsyncReadTests: the API with its async read views
+urlpatterns = [path('api/', include(async_read_urls(router.urls)))]
+
+
+def create_customer(name='Alice'):
+    return Customer.objects.create(
+        name=name,
+        email=f'{name.lower()}@example.com',
+        phone='500000000',
+        address='Test street 1'
+    )
+
+
+class CustomerOrderAggregateTests(APITestCase):
+    def setUp(self):
+        self.customer = create_customer()
+        self.product = Product.objects.create(
+            name='Widget', price=Decimal('12.50'), stock=100
+        )
+
+    def test_api_order_create_updates_aggregate(self):
+        for quantity in (2, 1):
+            response = self.client.post('/api/orders/', {
+                'customer': str(self.customer.id),
+                'status': 'new',
+                'items': [{'product': self.product.id, 'quantity': quantity}],
+            }, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        aggregate = CustomerOrderAggregate.objects.get(customer=self.customer)
+        orders = Order.objects.filter(customer=self.customer)
+        self.assertEqual(aggregate.order_count, 2)
+        self.assertEqual(aggregate.total_spent, Decimal('37.50'))
+        self.assertEqual(
+            aggregate.first_order_date, orders.order_by('order_date')[0].order_date
+        )
+        self.assertEqual(
+            aggregate.last_order_date, orders.order_by('-order_date')[0].order_date
+        )
+
+    def test_api_order_create_saves_order_once(self):
+        payload = {
+            'customer': str(self.customer.id),
+            'status': 'new',
+            'items': [{'product': self.product.id, 'quantity': 2}],
+        }
+        # Validation (2), stock reservation (3), order insert, aggregate
+        # refresh (5), RFM dirty mark, item insert, transaction (2) and
+        # the items of the response
+        with self.assertNumQueries(16):
+            response = self.client.post('/api/orders/', payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['total_price'], '25.00')
+        self.assertEqual(
+            CustomerOrderAggregate.objects.get(customer=self.customer).total_spent,
+            Decimal('25.00')
+        )
+
+    def test_save_of_other_fields_skips_refresh(self):
+        order = Order.objects.create(
+            customer=self.customer, status='new', total_price=Decimal('10'))
+        order.status = 'shipped'
+
+        with self.assertNumQueries(1):
+            order.save(update_fields=['status'])
+
+        order.total_price = Decimal('15')
+        order.save(update_fields=['total_price'])
+        self.assertEqual(
+            CustomerOrderAggregate.objects.get(customer=self.customer).total_spent,
+            Decimal('15')
+        )
+
+    def test_delete_and_reassign_update_both_customers(self):
+        other = create_customer('Bob')
+        first = Order.objects.create(
+            customer=self.customer, status='new', total_price=Decimal('10'))
+        second = Order.objects.create(
+            customer=self.customer, status='new', total_price=Decimal('5'))
+
+        second.customer = other
+        second.save()
+        first.delete()
+
+        self.assertFalse(
+            CustomerOrderAggregate.objects.filter(customer=self.customer).exists()
+        )
+        aggregate = CustomerOrderAggregate.objects.get(customer=other)
+        self.assertEqual(aggregate.order_count, 1)
+        self.assertEqual(aggregate.total_spent, Decimal('5'))
+
+    def test_rebuild_repairs_drift(self):
+        order = Order.objects.create(
+            customer=self.customer, status='new', total_price=Decimal('10'))
+        # QuerySet.update() bypasses the signals
+        Order.objects.filter(pk=order.pk).update(total_price=Decimal('99'))
+        self.assertEqual(
+            CustomerOrderAggregate.objects.get(customer=self.customer).total_spent,
+            Decimal('10')
+        )
+
+        self.assertEqual(rebuild_customer_aggregates(), 1)
+
+        aggregate = CustomerOrderAggregate.objects.get(customer=self.customer)
+        self.assertEqual(aggregate.order_count, 1)
+        self.assertEqual(aggregate.total_spent, Decimal('99'))
+        self.assertEqual(aggregate.last_order_date, order.order_date)
+
+
+class BulkOrderCreateTests(APITestCase):
+    def setUp(self):
+        self.customer = create_customer()
+        self.other = create_customer('Bob')
+        self.widget = Product.objects.create(
+            name='Widget', price=Decimal('12.50'), stock=100
+        )
+        self.gadget = Product.objects.create(
+            name='Gadget', price=Decimal('3.00'), stock=100
+        )
+
+    def order(self, customer, *items):
+        return {
+            'customer': str(customer.id),
+            'status': 'new',
+            'items': [
+                {'product': str(product.id), 'quantity': quantity}
+                for product, quantity in items
+            ],
+        }
+
+    def test_bulk_create_inserts_orders_items_and_aggregates(self):
+        payload = [
+            self.order(self.customer, (self.widget, 2), (self.gadget, 1)),
+            self.order(self.customer, (self.gadget, 3)),
+            self.order(self.other, (self.widget, 1)),
+        ]
+        # Customers and products: 2 queries for the whole batch
+        with self.assertNumQueries(2):
+            valid, errors = validate_orders(payload)
+        self.assertEqual((len(valid), errors), (3, []))
+
+        response = self.client.post('/api/orders/bulk/', payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual([r['index'] for r in response.data['results']], [0, 1, 2])
+        first = Order.objects.get(id=response.data['results'][0]['id'])
+        self.assertEqual(first.total_price, Decimal('28.00'))
+        self.assertEqual(OrderItem.objects.filter(order=first).count(), 2)
+        self.assertEqual(OrderItem.objects.count(), 4)
+
+        aggregate = CustomerOrderAggregate.objects.get(customer=self.customer)
+        self.assertEqual(aggregate.order_count, 2)
+        self.assertEqual(aggregate.total_spent, Decimal('37.00'))
+        self.assertEqual(
+            set(RFMDirtyCustomer.objects.values_list('customer_id', flat=True)),
+            {self.customer.id, self.other.id}
+        )
+
+    def test_bulk_create_reports_per_order_errors(self):
+        missing = Product(name='Missing', price=Decimal('1'), stock=0)
+        payload = [
+            self.order(self.customer, (self.widget, 1)),
+            self.order(self.customer, (missing, 1)),
+            {'customer': 'not-a-uuid', 'status': 'new', 'items': []},
+        ]
+
+        response = self.client.post('/api/orders/bulk/', payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 2))
+        results = response.data['results']
+        self.assertIn('id', results[0])
+        self.assertIn('items', results[1]['errors'])
+        self.assertIn('customer', results[2]['errors'])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_bulk_create_rejects_invalid_batches(self):
+        response = self.client.post(
+            '/api/orders/bulk/', self.order(self.customer), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with self.settings(ORDER_BULK_MAX_ORDERS=1):
+            response = self.client.post('/api/orders/bulk/', [
+                self.order(self.customer, (self.widget, 1)),
+                self.order(self.other, (self.widget, 1)),
+            ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post('/api/orders/bulk/', [
+            {'customer': str(self.customer.id), 'items': []},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['created'], 0)
+        self.assertFalse(Order.objects.exists())
+
+
+class StockReservationTests(APITestCase):
+    def setUp(self):
+        self.customer = create_customer()
+        self.widget = Product.objects.create(
+            name='Widget', price=Decimal('12.50'), stock=5
+        )
+        self.gadget = Product.objects.create(
+            name='Gadget', price=Decimal('3.00'), stock=1
+        )
+
+    def post_order(self, *items):
+        return self.client.post('/api/orders/', {
+            'customer': str(self.customer.id),
+            'status': 'new',
+            'items': [
+                {'product': str(product.id), 'quantity': quantity}
+                for product, quantity in items
+            ],
+        }, format='json')
+
+    def test_order_decrements_stock(self):
+        # Quantities of repeated products are reserved together
+        response = self.post_order((self.widget, 2), (self.gadget, 1), (self.widget, 1))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.widget.refresh_from_db()
+        self.gadget.refresh_from_db()
+        self.assertEqual((self.widget.stock, self.gadget.stock), (2, 0))
+
+    def test_insufficient_stock_rejects_whole_order(self):
+        response = self.post_order((self.widget, 2), (self.gadget, 2))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Insufficient stock', response.data['items'][0])
+        self.assertFalse(Order.objects.exists())
+        self.widget.refresh_from_db()
+        self.assertEqual(self.widget.stock, 5)
+
+    def test_reserve_stock_raises_for_first_short_product(self):
+        with self.assertRaises(InsufficientStock) as raised:
+            reserve_stock({self.widget.pk: 6})
+        self.assertEqual(
+            (raised.exception.requested, raised.exception.available), (6, 5)
+        )
+
+    def test_bulk_allocates_in_input_order(self):
+        rejections = allocate_stock([
+            {self.widget.pk: 3},
+            {self.widget.pk: 3, self.gadget.pk: 1},
+            {self.widget.pk: 2},
+        ])
+        self.assertIsNone(rejections[0])
+        self.assertEqual(rejections[1].product_id, self.widget.pk)
+        self.assertIsNone(rejections[2])
+        self.widget.refresh_from_db()
+        self.gadget.refresh_from_db()
+        self.assertEqual((self.widget.stock, self.gadget.stock), (0, 1))
+
+
+class ConcurrentStockReservationTests(TransactionTestCase):
+    """
+    Many threads ordering the same hot products at once.
+
+    Throughput under this contention is measured by
+    scripts/benchmark_orders.py --threads.
+    """
+
+    threads = 8
+    orders_per_thread = 15
+
+    def test_parallel_orders_never_oversell(self):
+        customer = create_customer()
+        stock = 50
+        hot = [
+            Product.objects.create(name=f'Hot {i}', price=Decimal('1.00'), stock=stock)
+            for i in range(3)
+        ]
+        # Every order takes one of each hot product in a different item order
+        payloads = [
+            {
+                'customer': str(customer.id),
+                'status': 'new',
+                'items': [
+                    {'product': str(product.id), 'quantity': 1}
+                    for product in (hot[n % 3:] + hot[:n % 3])
+                ],
+            }
+            for n in range(self.threads * self.orders_per_thread)
+        ]
+        start = threading.Barrier(self.threads)
+
+        def place_orders(thread):
+            client = APIClient()
+            statuses = []
+            start.wait()
+            try:
+                for payload in payloads[thread::self.threads]:
+                    statuses.append(
+                        client.post('/api/orders/', payload, format='json').status_code
+                    )
+            finally:
+                connection.close()
+            return statuses
+
+        with ThreadPoolExecutor(self.threads) as executor:
+            statuses = sum(executor.map(place_orders, range(self.threads)), [])
+
+        created = statuses.count(status.HTTP_201_CREATED)
+        self.assertEqual(created, stock)
+        self.assertEqual(statuses.count(status.HTTP_400_BAD_REQUEST), len(payloads) - stock)
+        self.assertEqual(Order.objects.count(), stock)
+        for product in hot:
+            product.refresh_from_db()
+            self.assertEqual(product.stock, 0)
+        self.assertEqual(
+            CustomerOrderAggregate.objects.get(customer=customer).order_count, stock
+        )
+
+
+class OrderListQueryTests(APITestCase):
+    def setUp(self):
+        product = Product.objects.create(name='Widget', price=Decimal('2.00'), stock=100)
+        for name in ('Alice', 'Bob', 'Carol'):
+            customer = create_customer(name)
+            for _ in range(2):
+                order = Order.objects.create(customer=customer, status='new')
+                OrderItem.objects.create(order=order, product=product, quantity=1)
+                OrderItem.objects.create(order=order, product=product, quantity=2)
+
+    def test_list_prefetches_items(self):
+        # The page and one query for the items of every order on the page
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/orders/')
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertNotIn('count', response.data)
+        self.assertEqual(len(response.data['results'][0]['items']), 2)
+
+    def test_fields_skip_items_and_unselected_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/orders/?fields=id,status')
+
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertNotIn('total_price', queries.captured_queries[0]['sql'])
+        self.assertEqual(set(response.data['results'][0]), {'id', 'status'})
+
+    def test_expand_embeds_customer_with_a_join(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/orders/?expand=customer&fields=id,customer')
+        customer = response.data['results'][0]['customer']
+        self.assertEqual(set(customer), {'id', 'name', 'email', 'phone', 'address'})
+
+    def test_unknown_fields_are_rejected(self):
+        self.assertEqual(
+            self.client.get('/api/orders/?fields=id,nope').status_code,
+            status.HTTP_400_BAD_REQUEST
+        )
+        self.assertEqual(
+            self.client.get('/api/orders/?expand=items').status_code,
+            status.HTTP_400_BAD_REQUEST
+        )
+
+
+class OrderKeysetPaginationTests(APITestCase):
+    def setUp(self):
+        customer = create_customer()
+        orders = [Order.objects.create(customer=customer, status='new') for _ in range(7)]
+        # Several orders share a timestamp: the id breaks the tie
+        same_time = orders[0].order_date
+        Order.objects.filter(pk__in=[o.pk for o in orders[:4]]).update(order_date=same_time)
+        self.expected = [
+            str(pk) for pk in Order.objects.order_by('-order_date', '-id')
+            .values_list('id', flat=True)
+        ]
+
+    def follow(self, url, link):
+        """Page ids in the order visited, following the given link."""
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append([order['id'] for order in response.data['results']])
+            url = response.data[link]
+        return pages, response
+
+    def test_pages_follow_the_key_without_gaps_or_repeats(self):
+        pages, last = self.follow('/api/orders/?page_size=3&fields=id', 'next')
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), self.expected)
+
+        # And back again from the last page
+        backwards, _ = self.follow(last.data['previous'], 'previous')
+        self.assertEqual(sum(reversed(backwards), []), self.expected[:6])
+
+    def test_page_size_cap_count_and_invalid_cursor(self):
+        with self.settings(API_MAX_PAGE_SIZE=5):
+            response = self.client.get('/api/orders/?page_size=500&count=true')
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(response.data['count'], 7)
+
+        response = self.client.get('/api/orders/?cursor=bm9wZQ')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class OrderFastListTests(APITestCase):
+    def setUp(self):
+        product = Product.objects.create(name='Widget', price=Decimal('2.50'), stock=100)
+        for name in ('Alice', 'Bob'):
+            customer = create_customer(name)
+            for quantity in (1, 3):
+                order = Order.objects.create(customer=customer, status='new')
+                OrderItem.objects.create(order=order, product=product, quantity=quantity)
+        Order.objects.create(customer=customer, status='empty')
+
+    def test_fast_list_matches_serializers(self):
+        for url in (
+            '/api/orders/',
+            '/api/orders/?page_size=2',
+            '/api/orders/?fields=id,items',
+            '/api/orders/?expand=customer&fields=customer,total_price',
+        ):
+            with self.settings(API_FAST_LIST=False):
+                expected = self.client.get(url)
+            with self.settings(API_FAST_LIST=True):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.content, expected.content, url)
+
+    def test_fast_list_follows_cursors(self):
+        with self.settings(API_FAST_LIST=True):
+            first = self.client.get('/api/orders/?page_size=2&fields=status')
+            second = self.client.get(first.data['next'])
+        expected = self.client.get(first.data['next'])
+        self.assertEqual(second.content, expected.content)
+
+
+class OrderExportTests(APITestCase):
+    def setUp(self):
+        product = Product.objects.create(name='Widget', price=Decimal('2.50'), stock=100)
+        for name in ('Alice', 'Bob', 'Carol'):
+            order = Order.objects.create(customer=create_customer(name), status='new')
+            OrderItem.objects.create(order=order, product=product, quantity=2)
+        self.listed = self.client.get('/api/orders/?page_size=100').json()['results']
+
+    def export(self, url, **extra):
+        response = self.client.get(url, **extra)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_ndjson_export_streams_list_rows_in_chunks(self):
+        # One cursor over the orders, and one items query per chunk of two
+        with self.settings(EXPORT_CHUNK_SIZE=2), self.assertNumQueries(3):
+            response, content = self.export('/api/orders/export/')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertEqual([json.loads(line) for line in content.splitlines()], self.listed)
+
+    def test_csv_export_with_fields_and_gzip(self):
+        response, content = self.export(
+            '/api/orders/export/?format=csv&fields=id,total_price,items',
+            HTTP_ACCEPT_ENCODING='gzip, deflate'
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        rows = list(csv.DictReader(gzip.decompress(content).decode().splitlines()))
+        self.assertEqual(rows, [
+            {
+                'id': order['id'],
+                'total_price': order['total_price'],
+                'items': json.dumps(order['items'], separators=(',', ':')),
+            }
+            for order in self.listed
+        ])
+
+    def test_export_rejects_unknown_fields_and_formats(self):
+        response = self.client.get('/api/orders/export/?fields=nope')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/orders/export/?format=xml')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class OrderInstrumentationTests(APITestCase):
+    def setUp(self):
+        product = Product.objects.create(name='Widget', price=Decimal('2.50'), stock=100)
+        order = Order.objects.create(customer=create_customer(), status='new')
+        OrderItem.objects.create(order=order, product=product, quantity=2)
+
+    def requests_sample(self, metrics):
+        line = 'minicrm_http_requests_total{route="order-list",method="GET",status="200"} '
+        for sample in metrics.splitlines():
+            if sample.startswith(line):
+                return int(sample[len(line):])
+        return 0
+
+    def test_server_timing_reports_queries_and_serialization(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/orders/')
+        timing = dict(
+            entry.strip().split(';', 1) for entry in response['Server-Timing'].split(','))
+        self.assertIn(f'desc="{len(queries)} queries"', timing['db'])
+        self.assertGreater(float(timing['serialize'].split('dur=')[1]), 0)
+        self.assertGreater(float(timing['total'].split('dur=')[1]), 0)
+
+    def test_metrics_add_up_the_files_of_all_processes(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(METRICS_DIR=directory):
+            self.client.get('/api/orders/')
+            own = self.requests_sample(self.client.get('/metrics').content.decode())
+            self.assertGreater(own, 0)
+            # Another gunicorn worker served five more
+            with open(os.path.join(directory, 'worker.json'), 'w') as file:
+                json.dump({'minicrm_http_requests_total': [
+                    [['order-list', 'GET', '200'], 5],
+                ]}, file)
+            response = self.client.get('/metrics')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        metrics = response.content.decode()
+        self.assertEqual(self.requests_sample(metrics), own + 5)
+        self.assertIn(
+            'minicrm_http_db_queries_bucket{route="order-list",method="GET",le="+Inf"}', metrics)
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class OrderAsyncReadTests(APITestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='Widget', price=Decimal('2.50'), stock=100)
+        for name in ('Alice', 'Bob', 'Carol'):
+            order = Order.objects.create(customer=create_customer(name), status='new')
+            OrderItem.objects.create(order=order, product=self.product, quantity=2)
+        self.order = order
+
+    def async_get(self, url, **extra):
+        return async_to_sync(self.async_client.get)(url, **extra)
+
+    def assertSameResponse(self, url):
+        expected = self.client.get(url)
+        response = self.async_get(url)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response['Content-Type'], expected['Content-Type'])
+        self.assertEqual(response.content, expected.content)
+        return response
+
+    def test_lists_match_the_sync_views(self):
+        for url in (
+            '/api/orders/', '/api/orders/?page_size=2&count=true',
+            '/api/orders/?fields=id,status&expand=customer',
+            '/api/customers/', '/api/products/', '/api/rfm/',
+        ):
+            with self.subTest(url=url):
+                self.assertSameResponse(url)
+        with self.settings(API_FAST_LIST=True):
+            self.assertSameResponse('/api/orders/')
+
+    def test_cursor_pages_match_the_sync_views(self):
+        next_url = self.assertSameResponse('/api/orders/?page_size=2').json()['next']
+        self.assertSameResponse(next_url)
+        self.assertEqual(self.async_get('/api/orders/?cursor=bogus').status_code, 404)
+
+    def test_details_match_the_sync_views(self):
+        self.assertSameResponse(f'/api/orders/{self.order.id}/')
+        self.assertSameResponse(f'/api/customers/{self.order.customer_id}/?fields=id,name')
+        self.assertSameResponse(f'/api/products/{self.product.id}/')
+        self.assertEqual(self.assertSameResponse(f'/api/orders/{uuid.uuid4()}/').status_code, 404)
+        self.assertEqual(self.assertSameResponse('/api/customers/not-a-uuid/').status_code, 404)
+        self.assertEqual(self.assertSameResponse('/api/orders/?fields=nope').status_code, 400)
+
+    def test_async_reads_do_not_run_the_sync_actions(self):
+        with mock.patch.object(OrderViewSet, 'list', side_effect=AssertionError), \
+                mock.patch.object(OrderViewSet, 'retrieve', side_effect=AssertionError):
+            self.assertEqual(self.async_get('/api/orders/').status_code, 200)
+            self.assertEqual(self.async_get(f'/api/orders/{self.order.id}/').status_code, 200)
+
+    def test_async_reads_are_instrumented(self):
+        # Orders, then their items
+        response = self.async_get('/api/orders/')
+        self.assertIn('db;desc="2 queries"', response['Server-Timing'])
+        self.assertIn('Accept', response['Vary'])
+
+    def test_writes_and_browsable_api_use_the_sync_views(self):
+        response = async_to_sync(self.async_client.post)(
+            '/api/orders/',
+            {'customer': str(self.order.customer_id), 'status': 'new',
+             'items': [{'product': str(self.product.id), 'quantity': 1}]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 4)
+        response = self.async_get('/api/orders/', headers={'Accept': 'text/html'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+
+
+class ImportDataTests(APITestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.rejects = self.path('rejects.ndjson')
+        self.customer = create_customer()
+        self.product = Product.objects.create(name='Widget', price=Decimal('2.00'), stock=5)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def write_csv(self, name, header, rows):
+        with open(self.path(name), 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(header)
+            writer.writerows(rows)
+        return self.path(name)
+
+    def import_data(self, **files):
+        call_command(
+            'import_data', rejects=self.rejects, batch_size=2, stdout=io.StringIO(),
+            **files
+        )
+
+    def read_rejects(self):
+        with open(self.rejects) as file:
+            return [json.loads(line) for line in file]
+
+    def test_imports_and_rejects_rows_in_bulk(self):
+        bob = 'b0b00000-0000-4000-8000-000000000001'
+        customers = self.write_csv('customers.csv', ['id', 'name', 'email', 'phone', 'address'], [
+            [bob, 'Bob', 'bob@example.com', '500000001', 'Street 2'],
+            ['', 'Eve', 'not-an-email', '500000002', 'Street 3'],
+            ['', 'Mallory', 'alice@example.com', '500000003', 'Street 4'],
+        ])
+        orders = self.path('orders.ndjson')
+        with open(orders, 'w') as file:
+            for order_id, customer_id, total in (
+                ('0d000000-0000-4000-8000-000000000001', bob, '10.00'),
+                ('0d000000-0000-4000-8000-000000000002', str(self.customer.id), '5.50'),
+                ('0d000000-0000-4000-8000-000000000003', str(uuid.uuid4()), '1.00'),
+            ):
+                file.write(json.dumps({
+                    'id': order_id, 'customer': customer_id, 'status': 'delivered',
+                    'order_date': '2024-03-01T10:00:00Z', 'total_price': total,
+                }) + '\n')
+            file.write('{broken\n')
+        items = self.write_csv('items.csv', ['order_id', 'product_id', 'quantity'], [
+            ['0d000000-0000-4000-8000-000000000001', str(self.product.id), 5],
+            ['0d000000-0000-4000-8000-000000000003', str(self.product.id), 1],
+        ])
+
+        self.import_data(customers=customers, orders=orders, items=items)
+
+        self.assertEqual(Customer.objects.get(pk=bob).email, 'bob@example.com')
+        self.assertEqual(Customer.objects.count(), 2)
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(OrderItem.objects.get().quantity, 5)
+        # Historical orders reserve no stock
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+        self.assertEqual(CustomerOrderAggregate.objects.get(customer_id=bob).total_spent,
+                         Decimal('10.00'))
+        self.assertTrue(RFMDirtyCustomer.objects.filter(customer_id=bob).exists())
+
+        rejects = {(reject['source'], reject['line']): reject for reject in self.read_rejects()}
+        self.assertEqual(sorted(rejects), [
+            ('customers', 2), ('customers', 3), ('items', 2), ('orders', 3), ('orders', 4),
+        ])
+        self.assertIn('email', rejects['customers', 2]['errors'])
+        self.assertIn('belongs to another row', rejects['customers', 3]['errors']['email'][0])
+        self.assertIn('does not exist', rejects['orders', 3]['errors']['customer'][0])
+
+    def test_resumes_from_checkpoint_and_merges_on_key(self):
+        header = ['id', 'customer', 'status', 'order_date', 'total_price']
+        rows = [
+            [str(uuid.uuid4()), str(self.customer.id), 'new', '2024-01-0%d 12:00' % day, '1.00']
+            for day in range(1, 6)
+        ]
+        orders = self.write_csv('orders.csv', header, rows[:3])
+        self.import_data(orders=orders)
+        self.assertEqual(ImportCheckpoint.objects.get().rows_done, 3)
+
+        # Rows appended after an interruption: only those are read
+        rows[0][2] = 'cancelled'
+        self.write_csv('orders.csv', header, rows)
+        self.import_data(orders=orders)
+        self.assertEqual(Order.objects.count(), 5)
+        self.assertEqual(Order.objects.get(pk=rows[0][0]).status, 'new')
+        self.assertEqual(ImportCheckpoint.objects.get().rows_done, 5)
+
+        # --restart reads everything again; stored orders are updated
+        call_command('import_data', orders=orders, restart=True,
+                     rejects=self.rejects, stdout=io.StringIO())
+        self.assertEqual(Order.objects.count(), 5)
+        self.assertEqual(Order.objects.get(pk=rows[0][0]).status, 'cancelled')
+        self.assertEqual(CustomerOrderAggregate.objects.get(customer=self.customer).order_count, 5)
+
+
+class OrderQueryPlanTests(APITestCase):
+    """The hot order queries must be answered from indexes."""
+
+    def setUp(self):
+        self.customers = [create_customer(name) for name in ('Alice', 'Bob', 'Carol')]
+        Order.objects.bulk_create([
+            Order(customer=customer, status='new', total_price=Decimal(i))
+            for i in range(20) for customer in self.customers
+        ])
+        self.ordering = ('-order_date', '-id')
+        self.orders = Order.objects.order_by(*self.ordering)
+
+    def test_list_pages_use_the_keyset_index(self):
+        first_page = self.orders[:11]
+        last = self.orders[30]
+        deep_page = self.orders.filter(
+            keyset_filter(self.ordering, [last.order_date, last.id]))[:11]
+        self.assertEqual(sequential_scans(first_page), set())
+        self.assertEqual(sequential_scans(deep_page), set())
+
+    def test_customer_aggregates_use_the_customer_index(self):
+        self.assertEqual(
+            sequential_scans(aggregate_orders([self.customers[0].pk])), set())
@@ -1,12 +1,80 @@
+from django.conf import settings
 from django.shortcuts import render
-from rest_framework import viewsets
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from minicrm.asyncviews import AsyncReadViewSetMixin
+from minicrm.export import ExportViewSetMixin
+from minicrm.fastlist import FastListViewSetMixin
+from minicrm.fieldsets import SparseFieldsetViewSetMixin
+from .bulk import create_orders_in_bulk, validate_orders
 from .models import Order
 from .serializers import OrderSerializer
+from .stock import InsufficientStock
 
-class OrderViewSet(viewsets.ModelViewSet):
+DEFAULT_BULK_MAX_ORDERS = 10000
+
+
+class OrderViewSet(AsyncReadViewSetMixin, ExportViewSetMixin, FastListViewSetMixin, SparseFieldsetViewSetMixin, viewsets.ModelViewSet):
+    # Items and customers are prefetched/joined per request, for the
+    # returned fields only (see minicrm/fieldsets.py)
     queryset = Order.objects.all().order_by('-order_date')
     serializer_class = OrderSerializer
+    keyset_ordering = ('-order_date', '-id')
+    # Served from read replicas (see minicrm/routers.py)
+    replica_actions = ('list', 'retrieve', 'export')
     lookup_field = 'id'
     lookup_value_regex = '[0-9a-f-]{36}'
 
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Create many orders in one request.
+
+        Expects a JSON list of orders in the format of POST /api/orders/.
+        Valid orders are created together even if others fail validation
+        or run out of stock.
+
+        Returns 201 when every order was created, 207 when only some were
+        and 400 when none were. The body lists one result per input order:
+        {"index": i, "id": ...} or {"index": i, "errors": {...}}.
+        """
+        data = request.data
+        if not isinstance(data, list):
+            return Response(
+                {'error': 'Expected a list of orders'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        max_orders = getattr(settings, 'ORDER_BULK_MAX_ORDERS', DEFAULT_BULK_MAX_ORDERS)
+        if len(data) > max_orders:
+            return Response(
+                {'error': f'At most {max_orders} orders per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        valid, errors = validate_orders(data)
+        created = create_orders_in_bulk([order for _, order in valid]) if valid else []
+
+        results = [{'index': index, 'errors': order_errors} for index, order_errors in errors]
+        created_count = 0
+        for (index, _), result in zip(valid, created):
+            if isinstance(result, InsufficientStock):
+                errors.append((index, result))
+                results.append({'index': index, 'errors': {'items': [str(result)]}})
+            else:
+                created_count += 1
+                results.append({'index': index, 'id': str(result.id)})
+        results.sort(key=lambda result: result['index'])
+
+        if not errors:
+            response_status = status.HTTP_201_CREATED
+        elif created_count:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response(
+            {'created': created_count, 'failed': len(errors), 'results': results},
+            status=response_status
+        )
+
 # Create your views here.
@@ -1,7 +1,9 @@
 from rest_framework import serializers
+from minicrm.fieldsets import SparseFieldsetSerializerMixin
+from minicrm.metrics import TimedSerializerMixin
 from .models import Product
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(TimedSerializerMixin, SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = '__all__'
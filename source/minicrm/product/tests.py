@@ -1,3 +1,19 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from rest_framework.test import APITestCase
+
+from .models import Product
+
+
+class ProductFastListTests(APITestCase):
+    def setUp(self):
+        Product.objects.create(name='Widget', description='', price=Decimal('2.5'), stock=3)
+        Product.objects.create(name='Gadget', description='Blue', price=Decimal('10.00'), stock=0)
+
+    def test_fast_list_matches_serializers(self):
+        # Prices not stored at the field's scale go through quantize()
+        with self.settings(API_FAST_LIST=False):
+            expected = self.client.get('/api/products/')
+        with self.settings(API_FAST_LIST=True):
+            response = self.client.get('/api/products/')
+        self.assertEqual(response.content, expected.content)
@@ -1,10 +1,16 @@
 from django.shortcuts import render
 from rest_framework import viewsets
+from minicrm.asyncviews import AsyncReadViewSetMixin
+from minicrm.fastlist import FastListViewSetMixin
+from minicrm.fieldsets import SparseFieldsetViewSetMixin
 from .models import Product
 from .serializers import ProductSerializer
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(AsyncReadViewSetMixin, FastListViewSetMixin, SparseFieldsetViewSetMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    keyset_ordering = ('id',)
+    # Served from read replicas (see minicrm/routers.py)
+    replica_actions = ('list', 'retrieve')
 
 # Create your views here.
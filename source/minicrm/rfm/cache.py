@@ -0,0 +1,109 @@
+"""
+Versioned cache for the RFM summary endpoints.
+
+by-segment and statistics aggregate the whole rfm_scores table, which only
+changes when a calculation finishes. Their responses are cached under a
+key that includes the RFM generation: the id of the latest RFMRun, which
+every successful calculation inserts as its last step (see
+services.calculate_rfm_scores). A new run therefore switches all readers
+to new keys at once, in every worker process, without invalidating
+anything: there are no stale reads after a recalculation, and entries of
+older generations simply expire.
+
+Responses are stored in the 'rfm' cache (settings.CACHES, backend chosen
+with RFM_CACHE_BACKEND). Hits and misses are counted per process.
+"""
+
+import threading
+
+from django.core.cache import caches
+
+from .models import RFMRun
+
+
+RFM_CACHE_ALIAS = 'rfm'
+
+
+class CacheStats:
+    """Thread-safe hit/miss counters of this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def as_dict(self):
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / requests, 4) if requests else None,
+            }
+
+
+stats = CacheStats()
+
+
+def get_generation():
+    """
+    Returns the current RFM generation (0 before the first calculation).
+
+    A primary key index lookup, far cheaper than the cached aggregates.
+    """
+    return generation_queryset().first() or 0
+
+
+def generation_queryset():
+    return RFMRun.objects.order_by('-pk').values_list('pk', flat=True)
+
+
+async def aget_generation():
+    """get_generation() through the async ORM."""
+    return await generation_queryset().afirst() or 0
+
+
+def get_cached(name, compute):
+    """
+    Returns the cached value of a summary for the current generation,
+    computing and storing it on a miss.
+
+    Args:
+        name: Summary name, part of the cache key
+        compute: Callable producing the value (must not return None)
+
+    Returns:
+        tuple: (value, hit)
+    """
+    cache = caches[RFM_CACHE_ALIAS]
+    key = f'rfm:{name}:{get_generation()}'
+    value = cache.get(key)
+    hit = value is not None
+    if not hit:
+        value = compute()
+        cache.set(key, value)
+    stats.record(hit)
+    return value, hit
+
+
+async def aget_cached(name, compute):
+    """
+    get_cached() for async views: `compute` is a coroutine function and
+    the cache is read and written through its async API.
+    """
+    cache = caches[RFM_CACHE_ALIAS]
+    key = f'rfm:{name}:{await aget_generation()}'
+    value = await cache.aget(key)
+    hit = value is not None
+    if not hit:
+        value = await compute()
+        await cache.aset(key, value)
+    stats.record(hit)
+    return value, hit
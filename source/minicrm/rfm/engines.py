@@ -0,0 +1,304 @@
+"""
+Pluggable RFM scoring engines.
+
+- SQLEngine: scores customers inside the database with the CTE/NTILE
+  query from rfm/queries.py (PostgreSQL and SQLite).
+- NumpyEngine: pulls raw per-customer aggregates through the ORM as
+  compact arrays and computes quintiles and segments in vectorized form,
+  so it works on any database backend.
+
+Both engines break ties at quintile edges by customer id and therefore
+produce identical scores; they yield the same rows, with UUID customer
+ids and Decimal monetary values, on every backend. The engine is selected with the RFM_ENGINE
+setting ('sql' or 'numpy').
+
+Rows are streamed rather than materialized: the SQL engine reads through
+a server-side cursor on PostgreSQL (chunked fetchmany() elsewhere), and
+the NumPy engine keeps only fixed-width arrays (roughly 100 bytes per
+customer including sort buffers) and yields result tuples chunk by chunk. Chunk size comes from
+the RFM_CHUNK_SIZE setting.
+"""
+
+import uuid
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from customer.models import Customer
+from .incremental import NO_ORDERS_RECENCY_DAYS
+from .persistence import (
+    bulk_upsert_rfm_scores,
+    iter_batches,
+    upsert_rfm_scores_in_database,
+)
+from .queries import get_rfm_calculation_query
+from .segments import SEGMENT_NAMES, SEGMENT_TABLE, segment_index
+
+
+DEFAULT_ENGINE = 'sql'
+DEFAULT_CHUNK_SIZE = 2000
+
+# Scale of RFMScore.monetary
+CENTS = Decimal('0.01')
+
+
+def get_chunk_size(chunk_size=None):
+    """Returns the explicit chunk size or the RFM_CHUNK_SIZE setting."""
+    return chunk_size or getattr(settings, 'RFM_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+
+def stream_query(sql, chunk_size):
+    """
+    Execute a query and yield its rows as tuples, chunk_size at a time.
+
+    Uses a named server-side cursor on PostgreSQL (via chunked_cursor),
+    so the client never holds more than one chunk of the result.
+    """
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield from rows
+
+
+class RFMEngine:
+    """Base class for RFM scoring engines."""
+
+    name = None
+
+    def __init__(self, chunk_size=None):
+        self.chunk_size = get_chunk_size(chunk_size)
+
+    def fetch_rows(self):
+        """
+        Calculate RFM scores for all customers without persisting them.
+
+        Returns:
+            iterator: Tuples in RFM_SCORE_COLUMNS order, sorted by customer id
+        """
+        raise NotImplementedError
+
+    def persist(self, batch_size=None, progress=None):
+        """
+        Calculate and persist RFM scores for all customers.
+
+        Args:
+            batch_size: Rows per INSERT (defaults to RFM_BATCH_SIZE)
+            progress: Optional callable receiving the number of rows processed
+
+        Returns:
+            tuple: (created, updated) counts
+        """
+        return bulk_upsert_rfm_scores(self.fetch_rows(), batch_size, progress)
+
+
+class SQLEngine(RFMEngine):
+    """Scores customers in the database with NTILE window functions."""
+
+    name = 'sql'
+
+    def fetch_rows(self):
+        # Same row types as NumpyEngine: SQLite returns customer ids as hex
+        # strings and monetary as a float
+        customer_id_to_python = Customer._meta.pk.to_python
+        rows = stream_query(get_rfm_calculation_query(connection.vendor), self.chunk_size)
+        for customer_id, recency_days, frequency, monetary, *scores in rows:
+            yield (
+                customer_id_to_python(customer_id), recency_days, frequency,
+                Decimal(str(monetary)).quantize(CENTS), *scores
+            )
+
+    def persist(self, batch_size=None, progress=None):
+        if connection.vendor == 'postgresql':
+            return upsert_rfm_scores_in_database(progress)
+        return super().persist(batch_size, progress)
+
+
+def ntile(positions, count, buckets=5):
+    """
+    Vectorized equivalent of SQL NTILE(buckets) for 0-based positions.
+
+    Like NTILE, the first (count % buckets) buckets get one extra row.
+    """
+    size, remainder = divmod(count, buckets)
+    boundary = remainder * (size + 1)
+    large = positions // (size + 1) + 1
+    if size == 0:
+        return large
+    small = remainder + (positions - boundary) // size + 1
+    return np.where(positions < boundary, large, small)
+
+
+def rank_scores(sort_order):
+    """
+    Convert an ordering (indices of rows in rank order) into NTILE(5)
+    buckets for each row.
+    """
+    count = len(sort_order)
+    positions = np.empty(count, dtype=np.int64)
+    positions[sort_order] = np.arange(count, dtype=np.int64)
+    return ntile(positions, count).astype(np.int8)
+
+
+# Compiled segment rules as an array, indexed with segment_index()
+SEGMENT_LOOKUP = np.array(SEGMENT_TABLE, dtype=np.int8)
+
+
+def assign_segments(r, f, m):
+    """
+    Vectorized segment assignment: one lookup in the compiled segment table
+    per customer.
+
+    Returns:
+        ndarray: int8 indexes into SEGMENT_NAMES
+    """
+    return SEGMENT_LOOKUP[
+        segment_index(r.astype(np.intp), f.astype(np.intp), m.astype(np.intp))
+    ]
+
+
+def recency_days_from(last_order_seconds, now):
+    """
+    Days since the last order for an array of POSIX timestamps (NaN for
+    customers without orders), rounded like the SQL ::INTEGER cast.
+    """
+    days = (now.timestamp() - last_order_seconds) / 86400
+    # Round half away from zero
+    days = np.sign(days) * np.floor(np.abs(days) + 0.5)
+    return np.where(np.isnan(days), NO_ORDERS_RECENCY_DAYS, days).astype(np.int64)
+
+
+def iter_score_rows(customer_ids, recency_days, frequency, monetary_cents,
+                    r, f, m, segment, chunk_size):
+    """
+    Yield result tuples in RFM_SCORE_COLUMNS order from scored arrays,
+    converting only chunk_size rows to Python objects at a time.
+    """
+    for start in range(0, len(customer_ids), chunk_size):
+        end = start + chunk_size
+        yield from zip(
+            (uuid.UUID(bytes=value.tobytes()) for value in customer_ids[start:end]),
+            recency_days[start:end].tolist(),
+            frequency[start:end].tolist(),
+            (Decimal(cents).scaleb(-2) for cents in monetary_cents[start:end].tolist()),
+            r[start:end].tolist(),
+            f[start:end].tolist(),
+            m[start:end].tolist(),
+            (SEGMENT_NAMES[code] for code in segment[start:end].tolist()),
+        )
+
+
+class NumpyEngine(RFMEngine):
+    """Scores customers in-process with NumPy; works on any backend."""
+
+    name = 'numpy'
+
+    def fetch_aggregates(self, customers=None):
+        """
+        Fetch raw per-customer aggregates ordered by customer id.
+
+        Rows are read chunk_size at a time and packed into fixed-width
+        arrays, so no per-customer Python objects outlive a chunk.
+
+        Args:
+            customers: Customer queryset to aggregate (default: all)
+
+        Returns:
+            tuple: (customer_ids, last_order_seconds, frequency,
+            monetary_cents) where customer_ids is a V16 array of raw UUID
+            bytes, last_order_seconds a float64 array of POSIX timestamps
+            (NaN without orders), and frequency and monetary_cents int64
+            arrays.
+        """
+        if customers is None:
+            customers = Customer.objects.all()
+        # One row per customer from the order aggregates (LEFT JOIN)
+        rows = customers.order_by('id').values_list(
+            'id',
+            'order_aggregate__last_order_date',
+            'order_aggregate__order_count',
+            'order_aggregate__total_spent',
+        ).iterator(chunk_size=self.chunk_size)
+
+        chunks = []
+        for batch in iter_batches(rows, self.chunk_size):
+            chunks.append((
+                np.frombuffer(b''.join(row[0].bytes for row in batch), dtype='V16'),
+                np.array(
+                    [np.nan if row[1] is None else row[1].timestamp() for row in batch],
+                    dtype=np.float64,
+                ),
+                np.array([row[2] or 0 for row in batch], dtype=np.int64),
+                np.array([int((row[3] or 0) * 100) for row in batch], dtype=np.int64),
+            ))
+
+        if not chunks:
+            return (
+                np.empty(0, dtype='V16'), np.empty(0, dtype=np.float64),
+                np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64),
+            )
+        return tuple(np.concatenate(column) for column in zip(*chunks))
+
+    def score(self, last_order_seconds, frequency, monetary_cents, now):
+        """
+        Compute recency days, R/F/M scores and segments from raw arrays.
+
+        Rows must be ordered by customer id: position is the tie-breaker.
+
+        Returns:
+            tuple: (recency_days, recency_score, frequency_score,
+            monetary_score, segment) arrays; scores are int8 and segment
+            holds int8 indexes into SEGMENT_NAMES
+        """
+        count = len(frequency)
+        index = np.arange(count)
+        recency_days = recency_days_from(last_order_seconds, now)
+
+        # np.lexsort sorts by the last key first
+        recency_score = 6 - rank_scores(np.lexsort((index, recency_days)))
+        frequency_score = rank_scores(np.lexsort((index, -frequency)))
+        monetary_score = rank_scores(np.lexsort((index, -monetary_cents)))
+        segment = assign_segments(recency_score, frequency_score, monetary_score)
+
+        return recency_days, recency_score, frequency_score, monetary_score, segment
+
+    def fetch_rows(self):
+        now = timezone.now()
+        customer_ids, last_order_seconds, frequency, monetary_cents = (
+            self.fetch_aggregates()
+        )
+        recency_days, r, f, m, segment = self.score(
+            last_order_seconds, frequency, monetary_cents, now
+        )
+        yield from iter_score_rows(
+            customer_ids, recency_days, frequency, monetary_cents,
+            r, f, m, segment, self.chunk_size
+        )
+
+
+ENGINES = {
+    SQLEngine.name: SQLEngine,
+    NumpyEngine.name: NumpyEngine,
+}
+
+
+def get_engine(name=None, chunk_size=None):
+    """
+    Returns an RFM engine instance.
+
+    Args:
+        name: Engine name; defaults to the RFM_ENGINE setting
+        chunk_size: Rows fetched per round trip; defaults to RFM_CHUNK_SIZE
+    """
+    name = name or getattr(settings, 'RFM_ENGINE', DEFAULT_ENGINE)
+    try:
+        return ENGINES[name](chunk_size)
+    except KeyError:
+        raise ValueError(
+            f'Unknown RFM engine "{name}"; choose one of: {", ".join(ENGINES)}'
+        )
@@ -0,0 +1,109 @@
+"""
+RFM snapshot history.
+
+rfm_scores only holds the latest scores per customer. After every
+calculation the whole table is appended to rfm_snapshots under a new
+RFMRun (one INSERT ... SELECT), which makes questions like "how many Loyal
+Customers became At Risk this month" answerable with a single
+self-join of two runs (transition_matrix).
+
+Retention is applied after each snapshot (compact_snapshots):
+- every run younger than RFM_SNAPSHOT_KEEP_ALL_DAYS is kept,
+- beyond that only the latest run of each calendar month is kept,
+- runs older than RFM_SNAPSHOT_KEEP_MONTHLY_DAYS are deleted.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import RFMRun
+from .queries import get_rfm_snapshot_query, get_rfm_transitions_query
+from .segments import SEGMENT_NAMES
+
+
+DEFAULT_KEEP_ALL_DAYS = 31
+DEFAULT_KEEP_MONTHLY_DAYS = 730
+
+
+def record_snapshot(mode):
+    """
+    Append the current rfm_scores table to the snapshot history.
+
+    Args:
+        mode: 'full' or 'incremental', the kind of run that produced it
+
+    Returns:
+        RFMRun: The new run
+    """
+    with transaction.atomic():
+        run = RFMRun.objects.create(mode=mode)
+        with connection.cursor() as cursor:
+            cursor.execute(get_rfm_snapshot_query(), {'run_id': run.pk})
+            run.customer_count = cursor.rowcount
+        run.save(update_fields=['customer_count'])
+    compact_snapshots()
+    return run
+
+
+def compact_snapshots(now=None):
+    """
+    Delete snapshot runs that fall outside the retention policy.
+
+    Snapshots of deleted runs are removed with a single DELETE
+    (the cascade needs no per-row work).
+
+    Returns:
+        int: Number of runs deleted
+    """
+    now = now or timezone.now()
+    keep_all = timedelta(days=getattr(
+        settings, 'RFM_SNAPSHOT_KEEP_ALL_DAYS', DEFAULT_KEEP_ALL_DAYS))
+    keep_monthly = timedelta(days=getattr(
+        settings, 'RFM_SNAPSHOT_KEEP_MONTHLY_DAYS', DEFAULT_KEEP_MONTHLY_DAYS))
+
+    expired = []
+    kept_months = set()
+    old_runs = RFMRun.objects.filter(
+        created_at__lt=now - keep_all
+    ).order_by('-created_at').values_list('id', 'created_at')
+    for run_id, created_at in old_runs:
+        month = (created_at.year, created_at.month)
+        if created_at < now - keep_monthly or month in kept_months:
+            expired.append(run_id)
+        else:
+            kept_months.add(month)
+
+    if expired:
+        RFMRun.objects.filter(id__in=expired).delete()
+    return len(expired)
+
+
+def transition_matrix(from_run, to_run):
+    """
+    Count customers moving between segments from one run to another.
+
+    Only customers present in both runs are counted.
+
+    Args:
+        from_run: Earlier RFMRun
+        to_run: Later RFMRun
+
+    Returns:
+        dict: {from_segment: {to_segment: customers}} over all
+        SEGMENT_NAMES, zero-filled
+    """
+    matrix = {
+        source: {target: 0 for target in SEGMENT_NAMES}
+        for source in SEGMENT_NAMES
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(
+            get_rfm_transitions_query(),
+            {'from_run': from_run.pk, 'to_run': to_run.pk}
+        )
+        for source, target, customers in cursor.fetchall():
+            matrix[SEGMENT_NAMES[source]][SEGMENT_NAMES[target]] = customers
+    return matrix
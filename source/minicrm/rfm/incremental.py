@@ -0,0 +1,253 @@
+"""
+Incremental RFM recalculation.
+
+Instead of rescanning every order, an incremental run only recomputes the
+raw R/F/M values of customers marked dirty by Order save/delete signals
+(see rfm/signals.py) and scores them against the quintile boundaries
+stored by the last full run (RFMBoundaries).
+
+A full rebuild is required when:
+- no full run has stored boundaries yet,
+- the stored boundaries are older than RFM_INCREMENTAL_MAX_AGE_DAYS
+  (recency of untouched customers goes stale over time),
+- after the incremental update, the share of customers in any score
+  bucket moved by more than RFM_INCREMENTAL_DRIFT_THRESHOLD compared to
+  the full run, i.e. the stored boundaries no longer describe quintiles.
+"""
+
+import math
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+from customer.models import Customer
+from .models import RFMBoundaries, RFMDirtyCustomer, RFMScore
+from .persistence import bulk_upsert_rfm_scores, get_batch_size, iter_batches
+from .segments import assign_segment
+
+
+# Recency assigned to customers without orders (matches the SQL COALESCE)
+NO_ORDERS_RECENCY_DAYS = 9999
+
+SCORES = range(1, 6)
+
+# Whether higher raw values get higher scores, per dimension. Must match
+# the orderings of the engines (rfm/queries.py): recency ranks ASC and is
+# inverted (6 - NTILE), frequency and monetary rank DESC, so in all three
+# the lowest values get score 5.
+RECENCY_HIGHER_IS_BETTER = False
+FREQUENCY_HIGHER_IS_BETTER = False
+MONETARY_HIGHER_IS_BETTER = False
+
+DEFAULT_DRIFT_THRESHOLD = 0.05
+DEFAULT_MAX_AGE_DAYS = 7
+
+
+def mark_customers_dirty(customer_ids):
+    """Mark customers for the next incremental RFM recalculation."""
+    marked_at = timezone.now()
+    RFMDirtyCustomer.objects.bulk_create(
+        [RFMDirtyCustomer(customer_id=customer_id, marked_at=marked_at)
+         for customer_id in customer_ids],
+        update_conflicts=True,
+        unique_fields=['customer'],
+        update_fields=['marked_at'],
+    )
+
+
+def clear_dirty_customers(before):
+    """Remove dirty marks that were set no later than `before`."""
+    RFMDirtyCustomer.objects.filter(marked_at__lte=before).delete()
+
+
+def _score_distribution(score_field, value_field, higher_is_better):
+    # A score's boundary is its worst value: the lowest value when higher
+    # values score better, the highest otherwise
+    bound = Min(value_field) if higher_is_better else Max(value_field)
+    rows = RFMScore.objects.values(score_field).annotate(
+        bound=bound, count=Count('customer_id')
+    ).order_by()
+    by_score = {row[score_field]: row for row in rows}
+    bounds = [by_score[s]['bound'] if s in by_score else None for s in SCORES]
+    counts = [by_score[s]['count'] if s in by_score else 0 for s in SCORES]
+    return bounds, counts
+
+
+def capture_boundaries():
+    """
+    Store the quintile boundaries of the current rfm_scores table.
+
+    Called at the end of every full RFM run.
+    """
+    recency_bounds, recency_counts = _score_distribution(
+        'recency_score', 'recency_days', RECENCY_HIGHER_IS_BETTER)
+    frequency_bounds, frequency_counts = _score_distribution(
+        'frequency_score', 'frequency', FREQUENCY_HIGHER_IS_BETTER)
+    monetary_bounds, monetary_counts = _score_distribution(
+        'monetary_score', 'monetary', MONETARY_HIGHER_IS_BETTER)
+
+    RFMBoundaries.objects.update_or_create(
+        pk=1,
+        defaults={
+            'recency_bounds': recency_bounds,
+            'frequency_bounds': frequency_bounds,
+            # JSON has no decimal type; keep the exact value as a string
+            'monetary_bounds': [
+                None if b is None else str(b) for b in monetary_bounds
+            ],
+            'recency_counts': recency_counts,
+            'frequency_counts': frequency_counts,
+            'monetary_counts': monetary_counts,
+            'customer_count': sum(recency_counts),
+            'calculated_at': timezone.now(),
+        }
+    )
+
+
+def score_value(value, bounds, higher_is_better):
+    """
+    Score a raw value (1-5) against stored quintile boundaries.
+
+    Returns the best score whose boundary the value reaches (is at least
+    the boundary when higher_is_better, at most otherwise); values that
+    reach no boundary get score 1.
+    """
+    for score in reversed(SCORES):
+        bound = bounds[score - 1]
+        if bound is None:
+            continue
+        if (value >= bound) if higher_is_better else (value <= bound):
+            return score
+    return 1
+
+
+def recency_in_days(last_order_date, now):
+    """
+    Days since the last order, rounded like the SQL ::INTEGER cast.
+    """
+    if last_order_date is None:
+        return NO_ORDERS_RECENCY_DAYS
+    days = (now - last_order_date).total_seconds() / 86400
+    return int(math.floor(days + 0.5))
+
+
+def fetch_raw_rfm_values(customer_ids, now, batch_size):
+    """
+    Yields (customer_id, recency_days, frequency, monetary) for the
+    given customers from their order aggregates.
+    """
+    for batch in iter_batches(customer_ids, batch_size):
+        rows = Customer.objects.filter(id__in=batch).values_list(
+            'id',
+            'order_aggregate__last_order_date',
+            'order_aggregate__order_count',
+            'order_aggregate__total_spent',
+        )
+        for customer_id, last_order_date, order_count, order_total in rows:
+            yield (
+                customer_id,
+                recency_in_days(last_order_date, now),
+                order_count or 0,
+                order_total or Decimal('0'),
+            )
+
+
+def score_rows(raw_rows, boundaries):
+    """Turn raw R/F/M tuples into rows in RFM_SCORE_COLUMNS order."""
+    monetary_bounds = [
+        None if b is None else Decimal(b) for b in boundaries.monetary_bounds
+    ]
+    for customer_id, recency_days, frequency, monetary in raw_rows:
+        r = score_value(
+            recency_days, boundaries.recency_bounds, RECENCY_HIGHER_IS_BETTER)
+        f = score_value(
+            frequency, boundaries.frequency_bounds, FREQUENCY_HIGHER_IS_BETTER)
+        m = score_value(monetary, monetary_bounds, MONETARY_HIGHER_IS_BETTER)
+        yield (
+            customer_id, recency_days, frequency, monetary,
+            r, f, m, assign_segment(r, f, m)
+        )
+
+
+def measure_drift(boundaries):
+    """
+    Largest absolute change in the share of customers per score bucket
+    between the last full run and the current rfm_scores table.
+    """
+    _, recency_counts = _score_distribution(
+        'recency_score', 'recency_days', RECENCY_HIGHER_IS_BETTER)
+    _, frequency_counts = _score_distribution(
+        'frequency_score', 'frequency', FREQUENCY_HIGHER_IS_BETTER)
+    _, monetary_counts = _score_distribution(
+        'monetary_score', 'monetary', MONETARY_HIGHER_IS_BETTER)
+
+    total = sum(recency_counts)
+    if not total or not boundaries.customer_count:
+        return 0.0
+
+    drift = 0.0
+    for current, baseline in (
+        (recency_counts, boundaries.recency_counts),
+        (frequency_counts, boundaries.frequency_counts),
+        (monetary_counts, boundaries.monetary_counts),
+    ):
+        for now_count, base_count in zip(current, baseline):
+            drift = max(
+                drift,
+                abs(now_count / total - base_count / boundaries.customer_count)
+            )
+    return drift
+
+
+def calculate_incremental_rfm_scores(batch_size=None, progress=None):
+    """
+    Recalculate RFM scores only for customers marked dirty.
+
+    Args:
+        batch_size: Rows per aggregate query and bulk upsert
+        progress: Optional callable receiving the number of rows processed
+
+    Returns:
+        tuple: (result, reason). result is a dict with mode, total_customers,
+        created, updated and drift; it is None when a full rebuild is
+        required, in which case reason explains why.
+    """
+    batch_size = get_batch_size(batch_size)
+    threshold = getattr(
+        settings, 'RFM_INCREMENTAL_DRIFT_THRESHOLD', DEFAULT_DRIFT_THRESHOLD)
+    max_age = timedelta(days=getattr(
+        settings, 'RFM_INCREMENTAL_MAX_AGE_DAYS', DEFAULT_MAX_AGE_DAYS))
+    started_at = timezone.now()
+
+    boundaries = RFMBoundaries.objects.first()
+    if boundaries is None:
+        return None, 'no boundaries from a previous full run'
+    if started_at - boundaries.calculated_at > max_age:
+        return None, f'boundaries older than {max_age.days} days'
+
+    with transaction.atomic():
+        dirty_ids = list(
+            RFMDirtyCustomer.objects.filter(marked_at__lte=started_at)
+            .values_list('customer_id', flat=True)
+        )
+        rows = score_rows(
+            fetch_raw_rfm_values(dirty_ids, started_at, batch_size), boundaries
+        )
+        created, updated = bulk_upsert_rfm_scores(rows, batch_size, progress)
+        clear_dirty_customers(started_at)
+
+    drift = measure_drift(boundaries)
+    if drift > threshold:
+        return None, f'quintile drift {drift:.3f} exceeds threshold {threshold}'
+
+    return {
+        'mode': 'incremental',
+        'total_customers': created + updated,
+        'created': created,
+        'updated': updated,
+        'drift': round(drift, 4),
+    }, None
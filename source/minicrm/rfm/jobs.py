@@ -0,0 +1,239 @@
+"""
+Background execution of RFM calculations.
+
+POST /api/rfm/calculate enqueues an RFMJob and returns immediately; the
+calculation runs in a per-process thread pool and reports its progress
+(rows processed) on the job row, which GET /api/rfm/jobs/<id> returns.
+
+The calculation itself runs inside a transaction, so progress is written
+through a separate database connection to be visible to pollers in other
+workers. SQLite allows a single writer only, so there progress is kept
+in memory and visible to the process running the job.
+
+A job's updated_at is its heartbeat: a thread refreshes it through the
+same separate connection every third of RFM_JOB_STALE_SECONDS, however
+long the calculation goes without reporting progress (the SQL engine
+reports once, after its single statement). Jobs without a heartbeat for
+RFM_JOB_STALE_SECONDS are failed by the next submission, except the ones
+this process is running (on SQLite, without a separate connection, that
+is the only protection of a running job); a job only records its outcome
+while it is still active, so a job failed that way stays failed.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connection, connections, transaction
+from django.utils import timezone
+
+from .models import RFMJob
+from .services import calculate_rfm_scores
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STALE_SECONDS = 600
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Progress of jobs running in this process: {job_id: rows_processed}
+_live_progress = {}
+# Jobs running in this process, never stale
+_running_jobs = set()
+
+
+def get_stale_seconds():
+    return getattr(settings, 'RFM_JOB_STALE_SECONDS', DEFAULT_STALE_SECONDS)
+
+
+def get_executor():
+    """Returns the process-wide executor, created lazily (fork-safe)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rfm-job')
+        return _executor
+
+
+class ProgressReporter:
+    """
+    Callable that records the rows processed by a running job.
+
+    Args:
+        job_id: RFMJob primary key
+        use_separate_connection: Write progress and the heartbeat to the
+            job row through a connection of its own
+        heartbeat_seconds: Interval of the heartbeat thread refreshing
+            updated_at; None for no heartbeat
+    """
+
+    def __init__(self, job_id, use_separate_connection, heartbeat_seconds=None):
+        self.job_id = job_id
+        self.connection = None
+        self.heartbeat = None
+        self.stopped = threading.Event()
+        # Serializes the heartbeat thread and the calculation on the connection
+        self.lock = threading.Lock()
+        if use_separate_connection:
+            self.connection = connections.create_connection(DEFAULT_DB_ALIAS)
+            # Parallel runs (RFM_WORKERS) report from their partition threads;
+            # calls are serialized by partitioning.CombinedProgress
+            self.connection.inc_thread_sharing()
+            if heartbeat_seconds:
+                self.heartbeat = threading.Thread(
+                    target=self.beat, args=(heartbeat_seconds,),
+                    name='rfm-job-heartbeat', daemon=True)
+                self.heartbeat.start()
+
+    def touch(self, rows_processed=None):
+        """Refresh the heartbeat, and the progress when given."""
+        opts = RFMJob._meta
+        assignments, params = 'updated_at = %s', [
+            opts.get_field('updated_at').get_db_prep_value(timezone.now(), self.connection),
+            opts.pk.get_db_prep_value(self.job_id, self.connection),
+        ]
+        if rows_processed is not None:
+            assignments = 'rows_processed = %s, ' + assignments
+            params.insert(0, rows_processed)
+        try:
+            with self.lock, self.connection.cursor() as cursor:
+                cursor.execute(
+                    f'UPDATE {opts.db_table} SET {assignments} WHERE id = %s',
+                    params
+                )
+        except Exception:
+            # Progress is best effort and must never fail the calculation
+            logger.warning('Could not record progress of RFM job %s', self.job_id,
+                           exc_info=True)
+
+    def beat(self, interval):
+        while not self.stopped.wait(interval):
+            self.touch()
+
+    def __call__(self, rows_processed):
+        _live_progress[self.job_id] = rows_processed
+        if self.connection is not None:
+            self.touch(rows_processed)
+
+    def close(self):
+        _live_progress.pop(self.job_id, None)
+        self.stopped.set()
+        if self.heartbeat is not None:
+            self.heartbeat.join()
+        if self.connection is not None:
+            self.connection.dec_thread_sharing()
+            self.connection.close()
+
+
+def get_rows_processed(job):
+    """Rows processed by a job, preferring live progress from this process."""
+    return _live_progress.get(job.id, job.rows_processed)
+
+
+def run_job(job_id, eager=False):
+    """
+    Execute an RFM job and record its outcome on the job row.
+
+    Args:
+        job_id: RFMJob primary key
+        eager: True when running inside the request (RFM_JOBS_EAGER)
+    """
+    job = RFMJob.objects.get(pk=job_id)
+    now = timezone.now()
+    started = RFMJob.objects.filter(pk=job_id, status=RFMJob.STATUS_PENDING).update(
+        status=RFMJob.STATUS_RUNNING, started_at=now, updated_at=now
+    )
+    if not started:
+        # Failed as stale while it waited for the executor
+        logger.warning('RFM job %s is no longer pending, not running it', job_id)
+        if not eager:
+            connections.close_all()
+        return
+    _running_jobs.add(job_id)
+    reporter = ProgressReporter(
+        job_id,
+        use_separate_connection=not eager and connection.vendor != 'sqlite',
+        heartbeat_seconds=get_stale_seconds() / 3,
+    )
+    # Outcomes are only recorded on jobs still active
+    active_job = RFMJob.objects.filter(pk=job_id, status__in=RFMJob.ACTIVE_STATUSES)
+    try:
+        result = calculate_rfm_scores(
+            incremental=job.incremental,
+            engine=job.engine or None,
+            progress=reporter,
+        )
+    except Exception as e:
+        logger.exception('RFM job %s failed', job_id)
+        now = timezone.now()
+        active_job.update(
+            status=RFMJob.STATUS_FAILED,
+            error=str(e),
+            rows_processed=get_rows_processed(job),
+            finished_at=now,
+            updated_at=now,
+        )
+    else:
+        now = timezone.now()
+        active_job.update(
+            status=RFMJob.STATUS_SUCCEEDED,
+            result=result,
+            rows_processed=result['total_customers'],
+            finished_at=now,
+            updated_at=now,
+        )
+    finally:
+        reporter.close()
+        _running_jobs.discard(job_id)
+        if not eager:
+            connections.close_all()
+
+
+def fail_stale_jobs():
+    """
+    Mark active jobs without a heartbeat for RFM_JOB_STALE_SECONDS as
+    failed, e.g. when the worker running them was killed. Jobs running in
+    this process are alive whatever their heartbeat.
+    """
+    stale_after = timedelta(seconds=get_stale_seconds())
+    now = timezone.now()
+    RFMJob.objects.filter(
+        status__in=RFMJob.ACTIVE_STATUSES, updated_at__lt=now - stale_after
+    ).exclude(pk__in=list(_running_jobs)).update(
+        status=RFMJob.STATUS_FAILED,
+        error='Job stopped reporting progress',
+        finished_at=now,
+        updated_at=now,
+    )
+
+
+def submit_job(incremental=False, engine=''):
+    """
+    Enqueue an RFM calculation, or attach to the one already active.
+
+    Returns:
+        tuple: (job, attached) where attached is True when an already
+        pending/running job was returned instead of a new one
+    """
+    fail_stale_jobs()
+    try:
+        with transaction.atomic():
+            job = RFMJob.objects.create(incremental=incremental, engine=engine or '')
+    except IntegrityError:
+        active = RFMJob.objects.filter(status__in=RFMJob.ACTIVE_STATUSES).first()
+        if active is not None:
+            return active, True
+        # The active job finished in between; try once more
+        job = RFMJob.objects.create(incremental=incremental, engine=engine or '')
+
+    if getattr(settings, 'RFM_JOBS_EAGER', False):
+        run_job(job.pk, eager=True)
+        job.refresh_from_db()
+    else:
+        # Start only once the job row is visible to the worker thread
+        transaction.on_commit(lambda: get_executor().submit(run_job, job.pk))
+    return job, False
@@ -0,0 +1,248 @@
+"""
+Management command running the benchmark suite of the hot paths.
+
+Seeds a throwaway test database with the persona generator of
+scripts/seed_fake_data.py (bulk mode) and measures (see minicrm/bench.py):
+- rfm.calculate: a full RFM calculation (calculate_rfm)
+- rfm.by_segment, rfm.statistics: the summary actions, uncached
+- api.<resource>.list / .detail: a page of 100 and one object of each
+  viewset, through the full request stack
+- order.create: OrderSerializer.create of a one-item order
+
+Your regular database is never touched.
+
+Usage:
+    python manage.py bench
+    python manage.py bench --customers 10000 --repeat 10
+    python manage.py bench --output results.json --baseline baseline.json
+    python manage.py bench --baseline baseline.json --save-baseline
+"""
+
+import contextlib
+import copy
+import io
+import json
+import sys
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from customer.models import Customer
+from minicrm.bench import (
+    DEFAULT_REPEAT, DEFAULT_THRESHOLD, BenchCase, compare, environment, run_cases,
+)
+from order.models import Order, OrderItem
+from order.serializers import OrderSerializer
+from product.models import Product
+from rfm.cache import RFM_CACHE_ALIAS
+from rfm.models import RFMScore
+from rfm.services import calculate_rfm_scores
+
+
+def load_seed_module():
+    """Import scripts/seed_fake_data.py (source tree or container layout)."""
+    for directory in (settings.BASE_DIR.parent / 'scripts', settings.BASE_DIR / 'scripts'):
+        if (directory / 'seed_fake_data.py').exists():
+            sys.path.insert(0, str(directory))
+            import seed_fake_data
+            return seed_fake_data
+    raise CommandError('scripts/seed_fake_data.py not found')
+
+
+def seed_dataset(customers, seed):
+    """Bulk seed personas; returns the dataset description."""
+    seed_fake_data = load_seed_module()
+    config = copy.deepcopy(seed_fake_data.CONFIG)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            seed_fake_data.run(
+                total_customers=customers, bulk=True, seed=seed,
+                end_date=timezone.now().date().isoformat(),
+            )
+    finally:
+        # run() scales the persona counts in place
+        seed_fake_data.CONFIG.clear()
+        seed_fake_data.CONFIG.update(config)
+    return {
+        'customers': Customer.objects.count(),
+        'products': Product.objects.count(),
+        'orders': Order.objects.count(),
+        'items': OrderItem.objects.count(),
+        'seed': seed,
+    }
+
+
+def get(client, url):
+    def request():
+        response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f'GET {url} returned {response.status_code}')
+    return request
+
+
+def build_cases():
+    client = APIClient()
+    customer = Customer.objects.order_by('pk').first()
+    product = Product.objects.order_by('-stock').first()
+    order = Order.objects.order_by('pk').first()
+
+    def clear_rfm_cache():
+        caches[RFM_CACHE_ALIAS].clear()
+
+    def create_order():
+        serializer = OrderSerializer(data={
+            'customer': str(customer.pk),
+            'status': 'new',
+            'items': [{'product': str(product.pk), 'quantity': 1}],
+        })
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+    cases = [
+        BenchCase('rfm.calculate', calculate_rfm_scores),
+        BenchCase('rfm.by_segment', get(client, '/api/rfm/by-segment/'), setup=clear_rfm_cache),
+        BenchCase('rfm.statistics', get(client, '/api/rfm/statistics/'), setup=clear_rfm_cache),
+    ]
+    # Scores exist once rfm.calculate ran; the detail case looks one up then
+    objects = [
+        ('customers', lambda: customer.pk),
+        ('products', lambda: product.pk),
+        ('orders', lambda: order.pk),
+        ('rfm', lambda: RFMScore.objects.values_list('pk', flat=True).first()),
+    ]
+    for resource, pk in objects:
+        cases.append(BenchCase(
+            f'api.{resource}.list', get(client, f'/api/{resource}/?page_size=100')))
+        cases.append(BenchCase(
+            f'api.{resource}.detail', lambda resource=resource, pk=pk: get(
+                client, f'/api/{resource}/{pk()}/')()))
+    cases.append(BenchCase('order.create', create_order))
+    return cases
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the hot paths on a seeded throwaway database and compare with a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--customers',
+            type=int,
+            default=2000,
+            help='Customers to seed with the persona generator (default: 2000)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed of the dataset (default: 42)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=DEFAULT_REPEAT,
+            help=f'Timed runs per case; the median is reported (default: {DEFAULT_REPEAT})',
+        )
+        parser.add_argument(
+            '--output',
+            default='bench-results.json',
+            help='JSON file the results are written to (default: bench-results.json)',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='JSON results of an earlier run to compare against',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=DEFAULT_THRESHOLD,
+            help='Allowed relative increase of wall time and peak memory over '
+                 f'the baseline (default: {DEFAULT_THRESHOLD})',
+        )
+        parser.add_argument(
+            '--save-baseline',
+            action='store_true',
+            help='Also write the results to --baseline instead of comparing',
+        )
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+        if options['save_baseline'] and not options['baseline']:
+            raise CommandError('--save-baseline requires --baseline')
+        baseline = None
+        if options['baseline'] and not options['save_baseline']:
+            try:
+                with open(options['baseline']) as file:
+                    baseline = json.load(file)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read baseline {options['baseline']}: {e}")
+
+        # With DEBUG on, Django keeps the SQL of every query in memory
+        settings.DEBUG = False
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.stdout.write(f"Seeding {options['customers']} customers...")
+            dataset = seed_dataset(options['customers'], options['seed'])
+            self.stdout.write(
+                f"{dataset['customers']} customers, {dataset['orders']} orders, "
+                f"{dataset['items']} items ({connection.vendor})\n"
+            )
+            self.stdout.write(
+                f"{'case':<24} {'median ms':>10} {'min ms':>10} {'queries':>8} {'peak KiB':>10}")
+            results = run_cases(build_cases(), options['repeat'], progress=self.report)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {
+            'environment': environment(),
+            'dataset': dataset,
+            'repeat': options['repeat'],
+            'results': results,
+        }
+        paths = [options['output']]
+        if options['save_baseline']:
+            paths.append(options['baseline'])
+        for path in paths:
+            with open(path, 'w') as file:
+                json.dump(report, file, indent=2)
+        self.stdout.write(f"\nResults written to {', '.join(paths)}")
+
+        if baseline is not None:
+            self.compare(results, baseline, options['threshold'], dataset)
+
+    def report(self, name, result):
+        self.stdout.write(
+            f"{name:<24} {result['wall_ms']:>10.2f} {result['min_ms']:>10.2f} "
+            f"{result['queries']:>8} {result['peak_kib']:>10.1f}"
+        )
+
+    def compare(self, results, baseline, threshold, dataset):
+        if baseline.get('environment', {}).get('database') != connection.vendor:
+            self.stdout.write(self.style.WARNING(
+                'Baseline was measured on another database backend'))
+        if baseline.get('dataset', {}).get('customers') != dataset['customers']:
+            self.stdout.write(self.style.WARNING(
+                'Baseline was measured on a dataset of another size'))
+        comparison = compare(results, baseline.get('results', {}), threshold)
+        self.stdout.write(f"\nAgainst baseline (threshold {threshold:.0%}):")
+        for row in comparison:
+            line = (
+                f"{row['name']:<24} time x{row['wall_ratio'] or 0:.2f} "
+                f"queries {row['queries_delta']:+d} memory x{row['memory_ratio'] or 0:.2f}"
+            )
+            if row['regressions']:
+                self.stdout.write(self.style.ERROR(
+                    f"{line}  REGRESSION: {', '.join(row['regressions'])}"))
+            else:
+                self.stdout.write(line)
+        regressed = [row['name'] for row in comparison if row['regressions']]
+        if regressed:
+            raise CommandError(f"{len(regressed)} cases regressed: {', '.join(regressed)}")
+        self.stdout.write(self.style.SUCCESS('No regressions'))
@@ -4,15 +4,22 @@ Management command to calculate RFM scores for all customers.
 Usage:
     python manage.py calculate_rfm
     python manage.py calculate_rfm --verbose
+    python manage.py calculate_rfm --batch-size 5000
+    python manage.py calculate_rfm --incremental
+    python manage.py calculate_rfm --engine numpy
+    python manage.py calculate_rfm --chunk-size 10000
+    python manage.py calculate_rfm --workers 4
+    python manage.py calculate_rfm --reassign-segments
 """
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.db import connection
 from django.db.models import Count
-from django.utils import timezone
 from customer.models import Customer
+from rfm.engines import ENGINES, get_chunk_size
 from rfm.models import RFMScore
-from rfm.queries import get_rfm_calculation_query
+from rfm.persistence import iter_batches
+from rfm.services import calculate_rfm_scores, fetch_rfm_rows, reassign_segments
 
 
 class Command(BaseCommand):
@@ -29,8 +36,47 @@ class Command(BaseCommand):
             action='store_true',
             help='Show what would be calculated without saving',
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Rows per bulk upsert on non-PostgreSQL backends (default: RFM_BATCH_SIZE)',
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Only rescore customers whose orders changed since the last run',
+        )
+        parser.add_argument(
+            '--engine',
+            choices=sorted(ENGINES),
+            default=None,
+            help='RFM scoring engine (default: RFM_ENGINE setting)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help='Rows streamed from the database per round trip (default: RFM_CHUNK_SIZE)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Score customers in N parallel partitions, one database '
+                 'session each (default: RFM_WORKERS)',
+        )
+        parser.add_argument(
+            '--reassign-segments',
+            action='store_true',
+            help='Only reassign segments from the stored scores after the '
+                 'segment rules changed (no R/F/M recalculation)',
+        )
 
     def handle(self, *args, **options):
+        if options['workers'] is not None and options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+
         verbose = options['verbose']
         dry_run = options['dry_run']
         
@@ -38,110 +84,97 @@ class Command(BaseCommand):
             self.stdout.write('Starting RFM calculation...')
         
         try:
-            with connection.cursor() as cursor:
-                # Execute the RFM calculation query
+            if dry_run:
                 if verbose:
-                    self.stdout.write('Executing RFM calculation SQL query...')
+                    self.stdout.write('Calculating RFM scores...')
                 
-                cursor.execute(get_rfm_calculation_query())
-                results = cursor.fetchall()
+                rows = fetch_rfm_rows(
+                    engine=options['engine'], chunk_size=options['chunk_size']
+                )
                 
-                # Column names from the query
-                columns = [
-                    'customer_id', 'recency_days', 'frequency', 'monetary',
-                    'recency_score', 'frequency_score', 'monetary_score', 'segment'
-                ]
-                
-                if verbose:
-                    self.stdout.write(f'Found {len(results)} customers to process')
-                
-                # Process results and create/update RFMScore records
-                created_count = 0
-                updated_count = 0
+                total_count = 0
                 skipped_count = 0
-                
-                for row in results:
-                    row_dict = dict(zip(columns, row))
-                    customer_id = row_dict['customer_id']
-                    
-                    try:
-                        customer = Customer.objects.get(id=customer_id)
-                    except Customer.DoesNotExist:
-                        skipped_count += 1
-                        if verbose:
-                            self.stdout.write(
-                                self.style.WARNING(f'Customer {customer_id} not found, skipping...')
-                            )
-                        continue
-                    
-                    if dry_run:
+                for batch in iter_batches(rows, get_chunk_size(options['chunk_size'])):
+                    names = dict(
+                        Customer.objects.filter(
+                            id__in=[row[0] for row in batch]
+                        ).values_list('id', 'name')
+                    )
+                    for customer_id, _, _, _, r, f, m, segment in batch:
+                        total_count += 1
+                        name = names.get(Customer._meta.pk.to_python(customer_id))
+                        if name is None:
+                            skipped_count += 1
+                            continue
                         self.stdout.write(
-                            f'Would calculate RFM for {customer.name}: '
-                            f'R={row_dict["recency_score"]} '
-                            f'F={row_dict["frequency_score"]} '
-                            f'M={row_dict["monetary_score"]} '
-                            f'-> {row_dict["segment"]}'
-                        )
-                    else:
-                        # Create or update RFMScore
-                        rfm_score, created = RFMScore.objects.update_or_create(
-                            customer=customer,
-                            defaults={
-                                'recency_days': row_dict['recency_days'],
-                                'frequency': row_dict['frequency'],
-                                'monetary': row_dict['monetary'],
-                                'recency_score': row_dict['recency_score'],
-                                'frequency_score': row_dict['frequency_score'],
-                                'monetary_score': row_dict['monetary_score'],
-                                'segment': row_dict['segment'],
-                            }
+                            f'Would calculate RFM for {name}: '
+                            f'R={r} F={f} M={m} -> {segment}'
                         )
-                        
-                        if created:
-                            created_count += 1
-                            if verbose:
-                                self.stdout.write(
-                                    self.style.SUCCESS(
-                                        f'Created RFM score for {customer.name}: {rfm_score.segment}'
-                                    )
-                                )
-                        else:
-                            updated_count += 1
-                            if verbose:
-                                self.stdout.write(
-                                    f'Updated RFM score for {customer.name}: {rfm_score.segment}'
-                                )
                 
-                # Summary
-                if dry_run:
-                    self.stdout.write(
-                        self.style.WARNING(
-                            f'\nDRY RUN: Would process {len(results)} customers '
-                            f'(skipped: {skipped_count})'
-                        )
-                    )
-                else:
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f'\nRFM calculation completed successfully!'
-                        )
+                self.stdout.write(
+                    self.style.WARNING(
+                        f'\nDRY RUN: Would process {total_count} customers '
+                        f'(skipped: {skipped_count})'
                     )
-                    self.stdout.write(
-                        f'Total customers processed: {len(results)}'
+                )
+                return
+            
+            if options['reassign_segments']:
+                result = reassign_segments()
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f'Reassigned segments of {result["reassigned"]} of '
+                        f'{result["total_customers"]} customers'
                     )
-                    self.stdout.write(
-                        f'Created: {created_count} | Updated: {updated_count} | Skipped: {skipped_count}'
+                )
+                return
+            
+            if verbose:
+                self.stdout.write(
+                    'Calculating and upserting RFM scores in bulk '
+                    f'({connection.vendor} backend)...'
+                )
+            
+            result = calculate_rfm_scores(
+                batch_size=options['batch_size'],
+                incremental=options['incremental'],
+                engine=options['engine'],
+                chunk_size=options['chunk_size'],
+                workers=options['workers'],
+            )
+            
+            # Summary
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'\nRFM calculation completed successfully!'
+                )
+            )
+            if result.get('full_rebuild_reason'):
+                self.stdout.write(
+                    self.style.WARNING(
+                        f'Full rebuild performed: {result["full_rebuild_reason"]}'
                     )
-                    
-                    # Show segment distribution
-                    if verbose:
-                        self.stdout.write('\nSegment distribution:')
-                        from django.db.models import Count
-                        segments = RFMScore.objects.values('segment').annotate(
-                            count=Count('customer_id')
-                        ).order_by('-count')
-                        for seg in segments:
-                            self.stdout.write(f'  {seg["segment"]}: {seg["count"]}')
+                )
+            self.stdout.write(f'Mode: {result["mode"]}')
+            if 'engine' in result:
+                self.stdout.write(
+                    f'Engine: {result["engine"]} ({result["workers"]} workers)'
+                )
+            self.stdout.write(
+                f'Total customers processed: {result["total_customers"]}'
+            )
+            self.stdout.write(
+                f'Created: {result["created"]} | Updated: {result["updated"]}'
+            )
+            
+            # Show segment distribution
+            if verbose:
+                self.stdout.write('\nSegment distribution:')
+                segments = RFMScore.objects.values('segment').annotate(
+                    count=Count('customer_id')
+                ).order_by('-count')
+                for seg in segments:
+                    self.stdout.write(f'  {seg["segment"]}: {seg["count"]}')
                 
         except Exception as e:
             self.stdout.write(
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.7 on 2026-10-17 18:34
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0001_initial'),
+        ('rfm', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RFMBoundaries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recency_bounds', models.JSONField()),
+                ('frequency_bounds', models.JSONField()),
+                ('monetary_bounds', models.JSONField()),
+                ('recency_counts', models.JSONField()),
+                ('frequency_counts', models.JSONField()),
+                ('monetary_counts', models.JSONField()),
+                ('customer_count', models.IntegerField(help_text='Number of scored customers in the full run')),
+                ('calculated_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Timestamp of the full run that produced the boundaries')),
+            ],
+            options={
+                'verbose_name': 'RFM Boundaries',
+                'verbose_name_plural': 'RFM Boundaries',
+                'db_table': 'rfm_boundaries',
+            },
+        ),
+        migrations.CreateModel(
+            name='RFMDirtyCustomer',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='customer.customer')),
+                ('marked_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Timestamp of the most recent order change')),
+            ],
+            options={
+                'verbose_name': 'RFM Dirty Customer',
+                'verbose_name_plural': 'RFM Dirty Customers',
+                'db_table': 'rfm_dirty_customers',
+            },
+        ),
+    ]
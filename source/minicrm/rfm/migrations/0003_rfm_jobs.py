@@ -0,0 +1,39 @@
+# Generated by Django 5.1.7 on 2026-10-17 18:45
+
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rfm', '0002_rfm_incremental'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RFMJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(default='calculate', help_text='Job type; one active job is allowed per kind', max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('incremental', models.BooleanField(default=False)),
+                ('engine', models.CharField(blank=True, help_text='Engine override; empty means the RFM_ENGINE setting', max_length=20)),
+                ('rows_processed', models.BigIntegerField(default=0, help_text='Number of RFM rows written so far')),
+                ('result', models.JSONField(blank=True, help_text='Created/updated counts of a finished job', null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Heartbeat, refreshed on every progress update')),
+            ],
+            options={
+                'verbose_name': 'RFM Job',
+                'verbose_name_plural': 'RFM Jobs',
+                'db_table': 'rfm_jobs',
+                'ordering': ['-created_at'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'running'])), fields=('kind',), name='rfm_jobs_single_active')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.7 on 2026-10-17 18:51
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rfm', '0003_rfm_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RFMRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mode', models.CharField(choices=[('full', 'Full'), ('incremental', 'Incremental')], max_length=20)),
+                ('customer_count', models.IntegerField(default=0, help_text='Number of customers captured in the snapshot')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'RFM Run',
+                'verbose_name_plural': 'RFM Runs',
+                'db_table': 'rfm_runs',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RFMSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer_id', models.UUIDField()),
+                ('recency_score', models.PositiveSmallIntegerField()),
+                ('frequency_score', models.PositiveSmallIntegerField()),
+                ('monetary_score', models.PositiveSmallIntegerField()),
+                ('segment', models.PositiveSmallIntegerField(help_text='Index into rfm.segments.SEGMENT_NAMES')),
+                ('run', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='rfm.rfmrun')),
+            ],
+            options={
+                'verbose_name': 'RFM Snapshot',
+                'verbose_name_plural': 'RFM Snapshots',
+                'db_table': 'rfm_snapshots',
+                'constraints': [models.UniqueConstraint(fields=('run', 'customer_id'), name='rfm_snapshots_run_customer')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-17 18:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rfm', '0004_rfm_snapshots'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='rfmrun',
+            name='mode',
+            field=models.CharField(choices=[('full', 'Full'), ('incremental', 'Incremental'), ('reassign', 'Segment reassignment')], max_length=20),
+        ),
+    ]
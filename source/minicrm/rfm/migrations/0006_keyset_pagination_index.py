@@ -0,0 +1,22 @@
+# Generated by Django 5.1.7 on 2026-10-17 19:09
+
+from django.db import migrations, models
+
+from minicrm.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('customer', '0001_initial'),
+        ('rfm', '0005_rfm_run_reassign_mode'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='rfmscore',
+            index=models.Index(fields=['calculated_at', 'customer'], name='rfm_scores_calc_customer_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.7 on 2026-10-17 19:12
+
+from django.db import migrations, models
+
+from minicrm.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('customer', '0001_initial'),
+        ('rfm', '0006_keyset_pagination_index'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='rfmscore',
+            index=models.Index(fields=['segment'], name='rfm_scores_segment_idx'),
+        ),
+    ]
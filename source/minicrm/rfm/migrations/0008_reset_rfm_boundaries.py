@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+def reset_boundaries(apps, schema_editor):
+    # Stored frequency/monetary boundaries were the lowest value per score,
+    # the wrong edge for the engines' DESC ordering: the next RFM run is a
+    # full one and stores them again
+    apps.get_model('rfm', 'RFMBoundaries').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rfm', '0007_production_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_boundaries, migrations.RunPython.noop),
+    ]
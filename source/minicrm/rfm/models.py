@@ -1,3 +1,4 @@
+import uuid
 from django.db import models
 from django.utils import timezone
 from customer.models import Customer
@@ -78,6 +79,12 @@ class RFMScore(models.Model):
         verbose_name = 'RFM Score'
         verbose_name_plural = 'RFM Scores'
         ordering = ['-calculated_at']
+        indexes = [
+            # Keyset pagination key of the score list (see minicrm/pagination.py)
+            models.Index(fields=['calculated_at', 'customer'], name='rfm_scores_calc_customer_idx'),
+            # Segment summary (GROUP BY segment) and filtering by segment
+            models.Index(fields=['segment'], name='rfm_scores_segment_idx'),
+        ]
     
     def __str__(self):
         return f"{self.customer.name} - {self.segment} (R{self.recency_score}F{self.frequency_score}M{self.monetary_score})"
@@ -86,3 +93,217 @@ class RFMScore(models.Model):
     def rfm_code(self):
         """Returns RFM code as string (e.g., '555', '321')"""
         return f"{self.recency_score}{self.frequency_score}{self.monetary_score}"
+
+
+class RFMDirtyCustomer(models.Model):
+    """
+    Customers whose orders changed since their RFM score was calculated.
+    
+    Rows are added by Order save/delete signals and consumed by
+    incremental RFM recalculation (see rfm/incremental.py).
+    """
+    
+    customer = models.OneToOneField(
+        Customer,
+        on_delete=models.CASCADE,
+        related_name='+',
+        primary_key=True
+    )
+    marked_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="Timestamp of the most recent order change"
+    )
+    
+    class Meta:
+        db_table = 'rfm_dirty_customers'
+        verbose_name = 'RFM Dirty Customer'
+        verbose_name_plural = 'RFM Dirty Customers'
+    
+    def __str__(self):
+        return f"{self.customer_id} (marked {self.marked_at})"
+
+
+class RFMBoundaries(models.Model):
+    """
+    Quintile boundaries captured at the end of the last full RFM run.
+    
+    Incremental recalculation scores changed customers against these
+    boundaries instead of re-ranking every customer. Each *_bounds list
+    has one entry per score 1-5 (None when the quintile is empty):
+    - recency_bounds: maximum recency_days observed with that score
+    - frequency_bounds: minimum frequency observed with that score
+    - monetary_bounds: minimum monetary value observed with that score
+    *_counts hold the number of customers per score, used to detect drift.
+    """
+    
+    recency_bounds = models.JSONField()
+    frequency_bounds = models.JSONField()
+    monetary_bounds = models.JSONField()
+    recency_counts = models.JSONField()
+    frequency_counts = models.JSONField()
+    monetary_counts = models.JSONField()
+    customer_count = models.IntegerField(
+        help_text="Number of scored customers in the full run"
+    )
+    calculated_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="Timestamp of the full run that produced the boundaries"
+    )
+    
+    class Meta:
+        db_table = 'rfm_boundaries'
+        verbose_name = 'RFM Boundaries'
+        verbose_name_plural = 'RFM Boundaries'
+    
+    def __str__(self):
+        return f"RFM boundaries ({self.customer_count} customers, {self.calculated_at})"
+
+
+class RFMJob(models.Model):
+    """
+    Background RFM calculation job started by POST /api/rfm/calculate.
+    
+    At most one job can be pending or running at a time (enforced by a
+    partial unique constraint), so concurrent requests attach to the
+    active job instead of starting a second full scan.
+    """
+    
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    ACTIVE_STATUSES = [STATUS_PENDING, STATUS_RUNNING]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(
+        max_length=20,
+        default='calculate',
+        help_text="Job type; one active job is allowed per kind"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING
+    )
+    incremental = models.BooleanField(default=False)
+    engine = models.CharField(
+        max_length=20,
+        blank=True,
+        help_text="Engine override; empty means the RFM_ENGINE setting"
+    )
+    rows_processed = models.BigIntegerField(
+        default=0,
+        help_text="Number of RFM rows written so far"
+    )
+    result = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="Created/updated counts of a finished job"
+    )
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="Heartbeat, refreshed on every progress update"
+    )
+    
+    class Meta:
+        db_table = 'rfm_jobs'
+        verbose_name = 'RFM Job'
+        verbose_name_plural = 'RFM Jobs'
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['kind'],
+                condition=models.Q(status__in=['pending', 'running']),
+                name='rfm_jobs_single_active',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"RFM job {self.id} ({self.status})"
+    
+    @property
+    def duration_seconds(self):
+        """Seconds the job has been running (or ran), None if not started."""
+        if self.started_at is None:
+            return None
+        end = self.finished_at or timezone.now()
+        return round((end - self.started_at).total_seconds(), 3)
+
+
+class RFMRun(models.Model):
+    """
+    A completed RFM calculation whose scores were captured in rfm_snapshots.
+    """
+    
+    MODE_CHOICES = [
+        ('full', 'Full'),
+        ('incremental', 'Incremental'),
+        ('reassign', 'Segment reassignment'),
+    ]
+    
+    mode = models.CharField(max_length=20, choices=MODE_CHOICES)
+    customer_count = models.IntegerField(
+        default=0,
+        help_text="Number of customers captured in the snapshot"
+    )
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    class Meta:
+        db_table = 'rfm_runs'
+        verbose_name = 'RFM Run'
+        verbose_name_plural = 'RFM Runs'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"RFM run {self.pk} ({self.mode}, {self.created_at})"
+
+
+class RFMSnapshot(models.Model):
+    """
+    Append-only copy of a customer's RFM scores at the end of a run.
+    
+    Kept compact on purpose: scores and segment are small integers
+    (segment is an index into rfm.segments.SEGMENT_NAMES), and customer_id
+    is a plain UUID rather than a foreign key so history survives customer
+    deletion. Old runs are thinned out by rfm.history.compact_snapshots.
+    """
+    
+    run = models.ForeignKey(
+        RFMRun,
+        on_delete=models.CASCADE,
+        related_name='snapshots',
+        # Covered by the (run, customer_id) unique index
+        db_index=False
+    )
+    customer_id = models.UUIDField()
+    recency_score = models.PositiveSmallIntegerField()
+    frequency_score = models.PositiveSmallIntegerField()
+    monetary_score = models.PositiveSmallIntegerField()
+    segment = models.PositiveSmallIntegerField(
+        help_text="Index into rfm.segments.SEGMENT_NAMES"
+    )
+    
+    class Meta:
+        db_table = 'rfm_snapshots'
+        verbose_name = 'RFM Snapshot'
+        verbose_name_plural = 'RFM Snapshots'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['run', 'customer_id'],
+                name='rfm_snapshots_run_customer',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.customer_id} in run {self.run_id}"
@@ -0,0 +1,267 @@
+"""
+Parallel, partitioned RFM calculation.
+
+Customers are split into disjoint ranges of the UUID primary key, one per
+worker, and every partition is processed in its own thread with its own
+database session:
+
+1. load: aggregate the partition's orders into arrays (see
+   NumpyEngine.fetch_aggregates) and summarize each dimension as a sketch,
+   the sorted distinct values with their counts. Sketches merge by adding
+   counts.
+2. merge: the sketches of all partitions are merged into the global
+   distribution, which tells every partition how many customers rank
+   before its first customer with a given value.
+3. score: each partition turns those offsets into global positions and
+   NTILE(5) buckets, then upserts its rows.
+
+Ties are broken by customer id like in the serial engines; since
+partitions are contiguous id ranges, earlier partitions rank first. The
+sketches are exact (one entry per distinct value: at most ~10k for
+recency, the highest order count for frequency and the distinct cent
+totals for monetary), so the result is identical to a serial run, with no
+tolerance at bucket edges.
+
+Partitions commit independently, so unlike a serial run the calculation
+is not a single transaction. SQLite allows one writer at a time: there
+partitions are loaded and scored in parallel but persisted one by one.
+"""
+
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from customer.models import Customer
+from .engines import (
+    NumpyEngine,
+    assign_segments,
+    get_chunk_size,
+    iter_score_rows,
+    ntile,
+    recency_days_from,
+)
+from .models import RFMScore
+from .persistence import bulk_upsert_rfm_scores
+
+
+DEFAULT_WORKERS = 1
+
+DIMENSIONS = ('recency', 'frequency', 'monetary')
+
+
+def get_workers(workers=None):
+    """Returns the explicit worker count or the RFM_WORKERS setting."""
+    return workers or getattr(settings, 'RFM_WORKERS', DEFAULT_WORKERS)
+
+
+def partition_bounds(workers):
+    """
+    Split the UUID space into equal ranges.
+
+    Returns:
+        list: (lower, upper) UUID pairs; lower is inclusive, upper is
+        exclusive and None for the last range
+    """
+    step = 2 ** 128 // workers
+    lowers = [uuid.UUID(int=i * step) for i in range(workers)]
+    return list(zip(lowers, lowers[1:] + [None]))
+
+
+def merge_sketches(sketches):
+    """
+    Merge the sketches of one dimension across partitions.
+
+    Args:
+        sketches: (values, counts) array pairs in partition order, values
+            sorted and distinct within each partition
+
+    Returns:
+        list: One int64 array per partition, aligned with its sketch
+        values: the number of customers ranked before the partition's
+        first customer with that value
+    """
+    values = np.unique(np.concatenate([v for v, _ in sketches]))
+    totals = np.zeros(len(values), dtype=np.int64)
+    for v, counts in sketches:
+        totals[np.searchsorted(values, v)] += counts
+
+    # Customers with a smaller value, plus equal ones in earlier partitions
+    ranked_before = np.cumsum(totals) - totals
+    offsets = []
+    for v, counts in sketches:
+        index = np.searchsorted(values, v)
+        offsets.append(ranked_before[index].copy())
+        ranked_before[index] += counts
+    return offsets
+
+
+class Partition:
+    """A contiguous customer id range scored by one worker."""
+
+    def __init__(self, lower, upper, chunk_size=None):
+        self.lower = lower
+        self.upper = upper
+        self.chunk_size = get_chunk_size(chunk_size)
+
+    def _in_range(self, queryset, field):
+        queryset = queryset.filter(**{f'{field}__gte': self.lower})
+        if self.upper is not None:
+            queryset = queryset.filter(**{f'{field}__lt': self.upper})
+        return queryset
+
+    def load(self, now):
+        """
+        Aggregate this partition's customers and build its sketches.
+
+        Args:
+            now: Reference time for recency, shared by all partitions
+        """
+        (self.customer_ids, last_order_seconds, self.frequency,
+         self.monetary_cents) = NumpyEngine(self.chunk_size).fetch_aggregates(
+            self._in_range(Customer.objects.all(), 'id')
+        )
+        self.recency_days = recency_days_from(last_order_seconds, now)
+
+        # Rank keys: the best customers sort first
+        keys = {
+            'recency': self.recency_days,
+            'frequency': -self.frequency,
+            'monetary': -self.monetary_cents,
+        }
+        self.sketches = {}
+        self.value_index = {}
+        for dimension, key in keys.items():
+            values, inverse, counts = np.unique(
+                key, return_inverse=True, return_counts=True)
+            self.sketches[dimension] = (values, counts)
+            self.value_index[dimension] = inverse
+
+    def score(self, offsets, count):
+        """
+        Compute scores and segments from the merged sketch offsets.
+
+        Args:
+            offsets: {dimension: array from merge_sketches for this partition}
+            count: Total number of customers across all partitions
+        """
+        index = np.arange(len(self.customer_ids))
+        buckets = {}
+        for dimension in DIMENSIONS:
+            value_index = self.value_index[dimension]
+            # Rank among this partition's customers with the same value;
+            # rows are ordered by customer id, so position is the tie-breaker
+            order = np.lexsort((index, value_index))
+            grouped = value_index[order]
+            tie_rank = np.empty_like(index)
+            tie_rank[order] = index - np.searchsorted(grouped, grouped)
+            positions = offsets[dimension][value_index] + tie_rank
+            buckets[dimension] = ntile(positions, count).astype(np.int8)
+
+        self.recency_score = 6 - buckets['recency']
+        self.frequency_score = buckets['frequency']
+        self.monetary_score = buckets['monetary']
+        self.segment = assign_segments(
+            self.recency_score, self.frequency_score, self.monetary_score)
+
+    def fetch_rows(self):
+        """Yields tuples in RFM_SCORE_COLUMNS order, sorted by customer id."""
+        return iter_score_rows(
+            self.customer_ids, self.recency_days, self.frequency,
+            self.monetary_cents, self.recency_score, self.frequency_score,
+            self.monetary_score, self.segment, self.chunk_size
+        )
+
+    def persist(self, batch_size=None, progress=None):
+        """Upsert the scored rows; returns (created, updated) counts."""
+        return bulk_upsert_rfm_scores(
+            self.fetch_rows(), batch_size, progress,
+            scope=self._in_range(RFMScore.objects.all(), 'customer_id'),
+        )
+
+
+class CombinedProgress:
+    """Reports the rows processed by all partitions as one total."""
+
+    def __init__(self, progress):
+        self.progress = progress
+        self.lock = threading.Lock()
+        self.rows = {}
+
+    def for_partition(self, number):
+        if self.progress is None:
+            return None
+
+        def report(rows_processed):
+            with self.lock:
+                self.rows[number] = rows_processed
+                self.progress(sum(self.rows.values()))
+        return report
+
+
+def in_own_session(func, *args):
+    """Run func in a worker thread, closing its database connection after."""
+    try:
+        return func(*args)
+    finally:
+        connection.close()
+
+
+def calculate_partitioned_rfm_scores(workers=None, batch_size=None,
+                                     chunk_size=None, progress=None):
+    """
+    Calculate and persist RFM scores for all customers in parallel.
+
+    Args:
+        workers: Number of partitions/threads (defaults to RFM_WORKERS)
+        batch_size: Rows per INSERT (defaults to RFM_BATCH_SIZE)
+        chunk_size: Rows fetched per round trip; defaults to RFM_CHUNK_SIZE
+        progress: Optional callable receiving the number of rows processed
+
+    Returns:
+        tuple: (created, updated) counts
+    """
+    workers = get_workers(workers)
+    now = timezone.now()
+    partitions = [
+        Partition(lower, upper, chunk_size)
+        for lower, upper in partition_bounds(workers)
+    ]
+
+    with ThreadPoolExecutor(workers, thread_name_prefix='rfm-partition') as executor:
+        list(executor.map(
+            lambda partition: in_own_session(partition.load, now), partitions
+        ))
+        offsets = {
+            dimension: merge_sketches(
+                [partition.sketches[dimension] for partition in partitions])
+            for dimension in DIMENSIONS
+        }
+        count = sum(len(partition.customer_ids) for partition in partitions)
+        list(executor.map(
+            lambda number: partitions[number].score(
+                {dimension: offsets[dimension][number] for dimension in DIMENSIONS},
+                count,
+            ),
+            range(workers),
+        ))
+
+    combined = CombinedProgress(progress)
+    write_workers = 1 if connection.vendor == 'sqlite' else workers
+    with ThreadPoolExecutor(write_workers, thread_name_prefix='rfm-partition') as executor:
+        results = list(executor.map(
+            lambda number: in_own_session(
+                partitions[number].persist, batch_size,
+                combined.for_partition(number),
+            ),
+            range(workers),
+        ))
+
+    return (
+        sum(created for created, _ in results),
+        sum(updated for _, updated in results),
+    )
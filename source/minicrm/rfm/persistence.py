@@ -0,0 +1,119 @@
+"""
+Bulk persistence of RFM scores.
+
+Replaces the per-customer get() + update_or_create() loop with set-based
+writes: a single INSERT ... SELECT ... ON CONFLICT statement on PostgreSQL,
+and batched bulk_create(update_conflicts=True) on other backends.
+"""
+
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import RFMScore
+from .queries import get_rfm_upsert_query
+
+
+# Column order of rows produced by RFM_CALCULATION_QUERY
+RFM_SCORE_COLUMNS = (
+    'customer_id', 'recency_days', 'frequency', 'monetary',
+    'recency_score', 'frequency_score', 'monetary_score', 'segment'
+)
+
+# Fields overwritten when a customer already has an RFM score
+RFM_UPDATE_FIELDS = [
+    'recency_days', 'frequency', 'monetary',
+    'recency_score', 'frequency_score', 'monetary_score',
+    'segment', 'calculated_at'
+]
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def get_batch_size(batch_size=None):
+    """Returns the explicit batch size or the RFM_BATCH_SIZE setting."""
+    return batch_size or getattr(settings, 'RFM_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+
+def iter_batches(rows, batch_size):
+    """Yields lists of at most batch_size items from any iterable."""
+    iterator = iter(rows)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def upsert_rfm_scores_in_database(progress=None):
+    """
+    Calculate and persist RFM scores in one statement (PostgreSQL only).
+
+    Args:
+        progress: Optional callable receiving the number of rows processed
+
+    Returns:
+        tuple: (created, updated) counts
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(get_rfm_upsert_query())
+        created, updated = cursor.fetchone()
+    if progress:
+        progress(created + updated)
+    return created, updated
+
+
+def bulk_upsert_rfm_scores(rows, batch_size=None, progress=None, scope=None):
+    """
+    Persist RFM score rows with batched bulk_create(update_conflicts=True).
+
+    Args:
+        rows: Iterable of tuples in RFM_SCORE_COLUMNS order
+        batch_size: Number of rows per INSERT (defaults to RFM_BATCH_SIZE)
+        progress: Optional callable receiving the number of rows processed
+            after each batch
+        scope: RFMScore queryset covering every customer in rows, used to
+            count created rows (default: the whole table). Concurrent
+            writers must pass disjoint scopes.
+
+    Returns:
+        tuple: (created, updated) counts
+    """
+    batch_size = get_batch_size(batch_size)
+    if scope is None:
+        scope = RFMScore.objects.all()
+    calculated_at = timezone.now()
+    total = 0
+
+    with transaction.atomic():
+        # Counting inside the transaction keeps created/updated accurate
+        # without fetching the set of existing customer ids.
+        existing = scope.count()
+        for batch in iter_batches(rows, batch_size):
+            RFMScore.objects.bulk_create(
+                [
+                    RFMScore(
+                        customer_id=row[0],
+                        recency_days=row[1],
+                        frequency=row[2],
+                        monetary=row[3],
+                        recency_score=row[4],
+                        frequency_score=row[5],
+                        monetary_score=row[6],
+                        segment=row[7],
+                        calculated_at=calculated_at,
+                    )
+                    for row in batch
+                ],
+                update_conflicts=True,
+                unique_fields=['customer'],
+                update_fields=RFM_UPDATE_FIELDS,
+            )
+            total += len(batch)
+            if progress:
+                progress(total)
+        created = scope.count() - existing
+
+    return created, total - created
@@ -6,23 +6,45 @@ using Common Table Expressions (CTEs) and NTILE window function
 for quantile-based scoring.
 """
 
-RFM_CALCULATION_QUERY = """
+from .segments import NEED_ATTENTION, SEGMENT_NAMES, iter_segment_table
+
+# Recency expression per database vendor. Both round to whole days
+# (half away from zero) and use 9999 for customers without orders.
+RECENCY_DAYS_SQL = {
+    'postgresql': (
+        "COALESCE(\n"
+        "            EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - a.last_order_date)) / 86400,\n"
+        "            9999\n"
+        "        )::INTEGER"
+    ),
+    'sqlite': (
+        "CAST(COALESCE(\n"
+        "            ROUND(julianday('now') - julianday(a.last_order_date)),\n"
+        "            9999\n"
+        "        ) AS INTEGER)"
+    ),
+}
+
+RFM_SCORES_QUERY_TEMPLATE = """
 WITH customer_orders AS (
-    -- Calculate raw RFM values for each customer
+    -- Raw RFM values for each customer, read from the per-customer order
+    -- aggregates maintained on write (one row per customer, no scan of
+    -- order_order); customers without orders have no aggregate row
     SELECT
         c.id AS customer_id,
         -- Recency: days since last order (NULL if no orders = very old)
-        COALESCE(
-            EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - MAX(o.order_date))) / 86400,
-            9999
-        )::INTEGER AS recency_days,
+        {recency_days} AS recency_days,
         -- Frequency: total number of orders
-        COUNT(o.id) AS frequency,
+        COALESCE(a.order_count, 0) AS frequency,
         -- Monetary: total value of all orders
-        COALESCE(SUM(o.total_price), 0) AS monetary
+        COALESCE(a.total_spent, 0) AS monetary
     FROM customer_customer c
-    LEFT JOIN order_order o ON o.customer_id = c.id
-    GROUP BY c.id
+    LEFT JOIN order_customer_aggregates a ON a.customer_id = c.id
+),
+segment_lookup (recency_score, frequency_score, monetary_score, segment) AS (
+    -- Segment rules compiled by rfm.segments (125 rows)
+    VALUES
+        {segment_lookup}
 ),
 rfm_with_scores AS (
     -- Calculate quintile-based scores (1-5) using NTILE
@@ -35,54 +57,152 @@ rfm_with_scores AS (
         -- NTILE(5) assigns 1 to lowest values, 5 to highest
         -- For recency, we want 5 for most recent (lowest days)
         -- So we order by recency_days ASC (lowest first)
-        6 - NTILE(5) OVER (ORDER BY recency_days ASC) AS recency_score,
+        -- Ties are broken by customer_id so bucket edges are deterministic
+        6 - NTILE(5) OVER (ORDER BY recency_days ASC, customer_id) AS recency_score,
         -- Frequency: higher = better, order by DESC
-        NTILE(5) OVER (ORDER BY frequency DESC) AS frequency_score,
+        NTILE(5) OVER (ORDER BY frequency DESC, customer_id) AS frequency_score,
         -- Monetary: higher = better, order by DESC
-        NTILE(5) OVER (ORDER BY monetary DESC) AS monetary_score
+        NTILE(5) OVER (ORDER BY monetary DESC, customer_id) AS monetary_score
     FROM customer_orders
 )
 SELECT
+    s.customer_id,
+    s.recency_days,
+    s.frequency,
+    s.monetary,
+    s.recency_score,
+    s.frequency_score,
+    s.monetary_score,
+    -- Segment from the compiled lookup table (one row per R/F/M combination)
+    l.segment
+FROM rfm_with_scores s
+JOIN segment_lookup l
+    ON l.recency_score = s.recency_score
+    AND l.frequency_score = s.frequency_score
+    AND l.monetary_score = s.monetary_score
+"""
+
+# The compiled segment table as rows of a VALUES list
+SEGMENT_LOOKUP_VALUES = ',\n        '.join(
+    f"({r}, {f}, {m}, '{segment}')" for r, f, m, segment in iter_segment_table()
+)
+
+RFM_SCORES_QUERY = RFM_SCORES_QUERY_TEMPLATE.format(
+    recency_days=RECENCY_DAYS_SQL['postgresql'],
+    segment_lookup=SEGMENT_LOOKUP_VALUES,
+)
+
+RFM_CALCULATION_QUERY = RFM_SCORES_QUERY + "ORDER BY customer_id;\n"
+
+# Set-based persistence for PostgreSQL: scores are computed and written to
+# rfm_scores in a single statement. (xmax = 0) is true only for freshly
+# inserted rows, which lets us report created/updated counts accurately.
+RFM_UPSERT_QUERY = """
+WITH upserted AS (
+    INSERT INTO rfm_scores (
+        customer_id,
+        recency_days,
+        frequency,
+        monetary,
+        recency_score,
+        frequency_score,
+        monetary_score,
+        segment,
+        calculated_at
+    )
+    SELECT
+        customer_id,
+        recency_days,
+        frequency,
+        monetary,
+        recency_score,
+        frequency_score,
+        monetary_score,
+        segment,
+        CURRENT_TIMESTAMP
+    FROM (""" + RFM_SCORES_QUERY + """) AS scores
+    ON CONFLICT (customer_id) DO UPDATE SET
+        recency_days = EXCLUDED.recency_days,
+        frequency = EXCLUDED.frequency,
+        monetary = EXCLUDED.monetary,
+        recency_score = EXCLUDED.recency_score,
+        frequency_score = EXCLUDED.frequency_score,
+        monetary_score = EXCLUDED.monetary_score,
+        segment = EXCLUDED.segment,
+        calculated_at = EXCLUDED.calculated_at
+    RETURNING (xmax = 0) AS inserted
+)
+SELECT
+    COUNT(*) FILTER (WHERE inserted) AS created,
+    COUNT(*) FILTER (WHERE NOT inserted) AS updated
+FROM upserted;
+"""
+
+# Re-derive every stored segment from its scores with the current rules:
+# one UPDATE joined to the segment lookup table, touching only rows whose
+# segment changed. Works on PostgreSQL and SQLite 3.33+ (UPDATE ... FROM);
+# no leading WITH, which would hide the row count from the sqlite3 driver.
+RFM_REASSIGN_SEGMENTS_QUERY = """
+UPDATE rfm_scores
+SET segment = segment_lookup.segment
+FROM (
+    -- VALUES columns are named column1..column4 on PostgreSQL and SQLite
+    SELECT
+        column1 AS recency_score,
+        column2 AS frequency_score,
+        column3 AS monetary_score,
+        column4 AS segment
+    FROM (VALUES
+        """ + SEGMENT_LOOKUP_VALUES + """
+    ) AS segment_values
+) AS segment_lookup
+WHERE segment_lookup.recency_score = rfm_scores.recency_score
+    AND segment_lookup.frequency_score = rfm_scores.frequency_score
+    AND segment_lookup.monetary_score = rfm_scores.monetary_score
+    AND segment_lookup.segment <> rfm_scores.segment;
+"""
+
+# Append the current rfm_scores table to rfm_snapshots under a new run id,
+# storing the segment label as its index in SEGMENT_NAMES. Portable SQL.
+RFM_SNAPSHOT_QUERY = """
+INSERT INTO rfm_snapshots (
+    run_id,
     customer_id,
-    recency_days,
-    frequency,
-    monetary,
     recency_score,
     frequency_score,
     monetary_score,
-    -- Segment assignment based on RFM scores
-    CASE
-        -- Champions: R=5, F=5, M=5
-        WHEN recency_score = 5 AND frequency_score = 5 AND monetary_score = 5 THEN 'Champions'
-        -- Loyal Customers: R=4-5, F=4-5, M=3-5
-        WHEN recency_score >= 4 AND frequency_score >= 4 AND monetary_score >= 3 THEN 'Loyal Customers'
-        -- Potential Loyalists: R=4-5, F=1-3, M=1-3
-        WHEN recency_score >= 4 AND frequency_score <= 3 AND monetary_score <= 3 THEN 'Potential Loyalists'
-        -- New Customers: R=4-5, F=1, M=1-2
-        WHEN recency_score >= 4 AND frequency_score = 1 AND monetary_score <= 2 THEN 'New Customers'
-        -- Promising: R=4-5, F=1, M=3-5
-        WHEN recency_score >= 4 AND frequency_score = 1 AND monetary_score >= 3 THEN 'Promising'
-        -- Need Attention: R=3, F=3, M=3
-        WHEN recency_score = 3 AND frequency_score = 3 AND monetary_score = 3 THEN 'Need Attention'
-        -- About to Sleep: R=3, F=1-2, M=1-2
-        WHEN recency_score = 3 AND frequency_score <= 2 AND monetary_score <= 2 THEN 'About to Sleep'
-        -- At Risk: R=1-2, F=4-5, M=3-5
-        WHEN recency_score <= 2 AND frequency_score >= 4 AND monetary_score >= 3 THEN 'At Risk'
-        -- Cannot Lose Them: R=1-2, F=1-2, M=4-5
-        WHEN recency_score <= 2 AND frequency_score <= 2 AND monetary_score >= 4 THEN 'Cannot Lose Them'
-        -- Hibernating: R=1-2, F=1-2, M=1-3
-        WHEN recency_score <= 2 AND frequency_score <= 2 AND monetary_score <= 3 THEN 'Hibernating'
-        -- Lost: R=1, F=1, M=1
-        WHEN recency_score = 1 AND frequency_score = 1 AND monetary_score = 1 THEN 'Lost'
-        -- Default: Need Attention
-        ELSE 'Need Attention'
-    END AS segment
-FROM rfm_with_scores
-ORDER BY customer_id;
+    segment
+)
+SELECT
+    %(run_id)s,
+    customer_id,
+    recency_score,
+    frequency_score,
+    monetary_score,
+    CASE segment
+        {segment_codes}
+        ELSE {default_code}
+    END
+FROM rfm_scores;
 """
 
+# Segment-to-segment transition counts between two runs, for customers
+# present in both. Each side is a lookup on the (run_id, customer_id)
+# unique index.
+RFM_TRANSITIONS_QUERY = """
+SELECT
+    f.segment AS from_segment,
+    t.segment AS to_segment,
+    COUNT(*) AS customers
+FROM rfm_snapshots f
+JOIN rfm_snapshots t
+    ON t.run_id = %(to_run)s AND t.customer_id = f.customer_id
+WHERE f.run_id = %(from_run)s
+GROUP BY f.segment, t.segment;
+"""
 
-def get_rfm_calculation_query():
+
+def get_rfm_calculation_query(vendor='postgresql'):
     """
     Returns the SQL query for RFM calculation.
     
@@ -91,7 +211,74 @@ def get_rfm_calculation_query():
     2. Assigns quintile-based scores (1-5) using NTILE window function
     3. Assigns segment labels based on RFM score combinations
     
+    Args:
+        vendor: Database vendor (connection.vendor); PostgreSQL and SQLite
+            are supported
+    
+    Returns:
+        str: SQL query string
+    """
+    if vendor == 'postgresql':
+        return RFM_CALCULATION_QUERY
+    if vendor not in RECENCY_DAYS_SQL:
+        raise NotImplementedError(
+            f'RFM SQL engine does not support {vendor}; use RFM_ENGINE = "numpy"'
+        )
+    return RFM_SCORES_QUERY_TEMPLATE.format(
+        recency_days=RECENCY_DAYS_SQL[vendor],
+        segment_lookup=SEGMENT_LOOKUP_VALUES,
+    ) + "ORDER BY customer_id;\n"
+
+
+def get_rfm_upsert_query():
+    """
+    Returns the PostgreSQL query that calculates and upserts RFM scores.
+    
+    The query wraps the RFM calculation in an
+    INSERT ... SELECT ... ON CONFLICT (customer_id) DO UPDATE statement
+    and returns a single row with (created, updated) counts.
+    
+    Returns:
+        str: SQL query string
+    """
+    return RFM_UPSERT_QUERY
+
+
+def get_rfm_snapshot_query():
+    """
+    Returns the query that copies rfm_scores into rfm_snapshots.
+    
+    Expects a run_id parameter (RFMRun primary key).
+    
+    Returns:
+        str: SQL query string
+    """
+    segment_codes = '\n        '.join(
+        f"WHEN '{name}' THEN {code}" for code, name in enumerate(SEGMENT_NAMES)
+    )
+    return RFM_SNAPSHOT_QUERY.format(
+        segment_codes=segment_codes, default_code=NEED_ATTENTION
+    )
+
+
+def get_rfm_transitions_query():
+    """
+    Returns the query counting segment transitions between two runs.
+    
+    Expects from_run and to_run parameters (RFMRun primary keys) and
+    yields (from_segment, to_segment, customers) rows with segment codes.
+    
+    Returns:
+        str: SQL query string
+    """
+    return RFM_TRANSITIONS_QUERY
+
+
+def get_segment_reassign_query():
+    """
+    Returns the query that reassigns segments from stored scores.
+    
     Returns:
         str: SQL query string
     """
-    return RFM_CALCULATION_QUERY
+    return RFM_REASSIGN_SEGMENTS_QUERY
@@ -0,0 +1,95 @@
+"""
+Segment assignment rules for RFM scores.
+
+The rules are defined once, in SEGMENT_RULES, and compiled into a lookup
+table with one segment per (R, F, M) combination (5 x 5 x 5 = 125
+entries). Every scoring path reads the table instead of evaluating the
+rules per customer:
+- SQL: joined as a VALUES relation (see rfm/queries.py)
+- NumPy: SEGMENT_TABLE indexed with segment_index(r, f, m) arrays
+- Python: assign_segment(r, f, m)
+
+Since segments depend only on the stored scores, changing a rule needs
+no R/F/M recalculation: `calculate_rfm --reassign-segments` updates all
+customers with a single UPDATE joined to the new table.
+"""
+
+from .models import RFMScore
+
+
+# Segment labels. Positions double as compact integer codes (NumPy
+# engine, rfm_snapshots.segment), so new segments must be appended to
+# RFMScore.SEGMENT_CHOICES.
+SEGMENT_NAMES = [value for value, _ in RFMScore.SEGMENT_CHOICES]
+NEED_ATTENTION = SEGMENT_NAMES.index('Need Attention')
+
+SCORES = range(1, 6)
+
+# (segment, recency, frequency, monetary) with inclusive (low, high) score
+# ranges. The first matching rule wins; combinations matching no rule get
+# DEFAULT_SEGMENT.
+SEGMENT_RULES = [
+    ('Champions', (5, 5), (5, 5), (5, 5)),
+    ('Loyal Customers', (4, 5), (4, 5), (3, 5)),
+    ('Potential Loyalists', (4, 5), (1, 3), (1, 3)),
+    ('New Customers', (4, 5), (1, 1), (1, 2)),
+    ('Promising', (4, 5), (1, 1), (3, 5)),
+    ('Need Attention', (3, 3), (3, 3), (3, 3)),
+    ('About to Sleep', (3, 3), (1, 2), (1, 2)),
+    ('At Risk', (1, 2), (4, 5), (3, 5)),
+    ('Cannot Lose Them', (1, 2), (1, 2), (4, 5)),
+    ('Hibernating', (1, 2), (1, 2), (1, 3)),
+    ('Lost', (1, 1), (1, 1), (1, 1)),
+]
+DEFAULT_SEGMENT = 'Need Attention'
+
+
+def segment_index(recency_score, frequency_score, monetary_score):
+    """
+    Position of a score combination in SEGMENT_TABLE.
+
+    Works on plain integers and on NumPy integer arrays alike.
+    """
+    return (recency_score - 1) * 25 + (frequency_score - 1) * 5 + (monetary_score - 1)
+
+
+def compile_segment_table(rules=SEGMENT_RULES, default=DEFAULT_SEGMENT):
+    """
+    Evaluate the rules for every score combination.
+
+    Returns:
+        list: 125 segment codes (indexes into SEGMENT_NAMES), ordered by
+        segment_index
+    """
+    table = []
+    for r in SCORES:
+        for f in SCORES:
+            for m in SCORES:
+                name = next(
+                    (
+                        segment for segment, *ranges in rules
+                        if all(low <= score <= high
+                               for score, (low, high) in zip((r, f, m), ranges))
+                    ),
+                    default
+                )
+                table.append(SEGMENT_NAMES.index(name))
+    return table
+
+
+SEGMENT_TABLE = compile_segment_table()
+
+
+def iter_segment_table():
+    """Yields (recency_score, frequency_score, monetary_score, segment) rows."""
+    for r in SCORES:
+        for f in SCORES:
+            for m in SCORES:
+                yield r, f, m, SEGMENT_NAMES[SEGMENT_TABLE[segment_index(r, f, m)]]
+
+
+def assign_segment(recency_score, frequency_score, monetary_score):
+    """Returns the segment label for a combination of R, F and M scores."""
+    return SEGMENT_NAMES[
+        SEGMENT_TABLE[segment_index(recency_score, frequency_score, monetary_score)]
+    ]
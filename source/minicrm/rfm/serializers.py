@@ -1,9 +1,12 @@
 from rest_framework import serializers
-from .models import RFMScore
+from minicrm.fieldsets import SparseFieldsetSerializerMixin
+from minicrm.metrics import TimedSerializerMixin
+from .models import RFMJob, RFMRun, RFMScore
+from .jobs import get_rows_processed
 from customer.serializers import CustomerSerializer
 
 
-class RFMScoreSerializer(serializers.ModelSerializer):
+class RFMScoreSerializer(TimedSerializerMixin, SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer for RFM Score model."""
     
     customer = CustomerSerializer(read_only=True)
@@ -26,9 +29,12 @@ class RFMScoreSerializer(serializers.ModelSerializer):
             'calculated_at'
         ]
         read_only_fields = ['calculated_at', 'rfm_code']
+        field_columns = {
+            'rfm_code': ['recency_score', 'frequency_score', 'monetary_score'],
+        }
 
 
-class RFMScoreListSerializer(serializers.ModelSerializer):
+class RFMScoreListSerializer(TimedSerializerMixin, SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Simplified serializer for list view."""
     
     customer_name = serializers.CharField(source='customer.name', read_only=True)
@@ -52,3 +58,43 @@ class RFMScoreListSerializer(serializers.ModelSerializer):
             'calculated_at'
         ]
         read_only_fields = ['customer_id', 'calculated_at', 'rfm_code']
+        expandable_fields = {'customer': CustomerSerializer}
+        field_columns = {
+            'rfm_code': ['recency_score', 'frequency_score', 'monetary_score'],
+        }
+
+
+class RFMJobSerializer(serializers.ModelSerializer):
+    """Serializer for background RFM calculation jobs."""
+    
+    rows_processed = serializers.SerializerMethodField()
+    duration_seconds = serializers.FloatField(read_only=True)
+    
+    class Meta:
+        model = RFMJob
+        fields = [
+            'id',
+            'status',
+            'incremental',
+            'engine',
+            'rows_processed',
+            'duration_seconds',
+            'result',
+            'error',
+            'created_at',
+            'started_at',
+            'finished_at'
+        ]
+        read_only_fields = fields
+    
+    def get_rows_processed(self, obj):
+        return get_rows_processed(obj)
+
+
+class RFMRunSerializer(serializers.ModelSerializer):
+    """Serializer for RFM runs captured in the snapshot history."""
+    
+    class Meta:
+        model = RFMRun
+        fields = ['id', 'mode', 'customer_count', 'created_at']
+        read_only_fields = fields
@@ -0,0 +1,165 @@
+"""
+RFM calculation service shared by the calculate_rfm command and the API.
+"""
+
+import time
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from minicrm.metrics import Counter, Gauge, Histogram
+from .engines import get_engine
+from .history import record_snapshot
+from .incremental import (
+    calculate_incremental_rfm_scores,
+    capture_boundaries,
+    clear_dirty_customers,
+)
+from .partitioning import calculate_partitioned_rfm_scores, get_workers
+from .queries import get_segment_reassign_query
+
+
+RUN_DURATION = Histogram(
+    'minicrm_rfm_run_duration_seconds', 'Duration of RFM calculation runs.', ['mode'],
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600))
+RUN_CUSTOMERS = Counter(
+    'minicrm_rfm_run_customers_total', 'Customers scored by RFM calculation runs.', ['mode'])
+LAST_RUN_CUSTOMERS = Gauge(
+    'minicrm_rfm_last_run_customers', 'Customers scored by the latest RFM run.', ['mode'])
+
+
+def record_run_metrics(result, started):
+    """Export the duration and customer count of a finished run."""
+    RUN_DURATION.observe(result['mode'], value=time.perf_counter() - started)
+    RUN_CUSTOMERS.inc(result['mode'], amount=result['total_customers'])
+    LAST_RUN_CUSTOMERS.set(result['mode'], value=result['total_customers'])
+
+
+def fetch_rfm_rows(engine=None, chunk_size=None):
+    """
+    Calculate RFM scores for all customers without persisting anything.
+
+    Args:
+        engine: Engine name; defaults to the RFM_ENGINE setting
+        chunk_size: Rows fetched per round trip; defaults to RFM_CHUNK_SIZE
+
+    Returns:
+        iterator: Tuples in RFM_SCORE_COLUMNS order, streamed in chunks
+    """
+    return get_engine(engine, chunk_size).fetch_rows()
+
+
+def calculate_full_rfm_scores(batch_size=None, engine=None, chunk_size=None,
+                              progress=None, workers=None):
+    """
+    Calculate RFM scores for all customers and persist them in bulk.
+
+    With the SQL engine on PostgreSQL the scores never leave the database:
+    a single INSERT ... SELECT ... ON CONFLICT statement does the whole job.
+    Otherwise the scored rows are streamed from the engine and upserted in
+    fixed-size batches, so memory does not grow with the customer count.
+    The resulting quintile boundaries are stored for incremental runs.
+
+    With more than one worker, customers are scored in parallel partitions
+    (see rfm/partitioning.py); the engine setting is then ignored and each
+    partition commits on its own.
+
+    Args:
+        batch_size: Rows per INSERT for the bulk_create path
+        engine: Engine name; defaults to the RFM_ENGINE setting
+        chunk_size: Rows fetched per round trip; defaults to RFM_CHUNK_SIZE
+        progress: Optional callable receiving the number of rows processed
+        workers: Parallel partitions; defaults to the RFM_WORKERS setting
+
+    Returns:
+        dict: mode, engine, workers, total_customers, created and updated
+        counts
+    """
+    workers = get_workers(workers)
+    started_at = timezone.now()
+
+    if workers > 1:
+        engine_name = 'numpy'
+        created, updated = calculate_partitioned_rfm_scores(
+            workers, batch_size, chunk_size, progress)
+        with transaction.atomic():
+            capture_boundaries()
+            clear_dirty_customers(started_at)
+    else:
+        engine = get_engine(engine, chunk_size)
+        engine_name = engine.name
+        with transaction.atomic():
+            created, updated = engine.persist(batch_size, progress)
+            capture_boundaries()
+            clear_dirty_customers(started_at)
+
+    return {
+        'mode': 'full',
+        'engine': engine_name,
+        'workers': workers,
+        'total_customers': created + updated,
+        'created': created,
+        'updated': updated,
+    }
+
+
+def calculate_rfm_scores(batch_size=None, incremental=False, engine=None,
+                         chunk_size=None, progress=None, workers=None):
+    """
+    Calculate RFM scores, incrementally when requested and possible,
+    and append the result to the snapshot history.
+
+    Args:
+        batch_size: Rows per INSERT for the bulk_create path
+        incremental: Only rescore customers whose orders changed since the
+            last run; falls back to a full rebuild when required
+        engine: Engine name for full runs; defaults to the RFM_ENGINE setting
+        chunk_size: Rows fetched per round trip; defaults to RFM_CHUNK_SIZE
+        progress: Optional callable receiving the number of rows processed
+        workers: Parallel partitions for full runs; defaults to RFM_WORKERS
+
+    Returns:
+        dict: mode, run_id, total_customers, created and updated counts
+        (plus drift for incremental runs, or full_rebuild_reason when an
+        incremental run fell back to a full rebuild)
+    """
+    started = time.perf_counter()
+    result = None
+    if incremental:
+        result, reason = calculate_incremental_rfm_scores(batch_size, progress)
+    if result is None:
+        result = calculate_full_rfm_scores(
+            batch_size, engine, chunk_size, progress, workers)
+        if incremental:
+            result['full_rebuild_reason'] = reason
+
+    result['run_id'] = record_snapshot(result['mode']).pk
+    record_run_metrics(result, started)
+    return result
+
+
+def reassign_segments():
+    """
+    Re-derive every customer's segment from the stored R/F/M scores.
+
+    Used after the segment rules (rfm/segments.py) change: a single UPDATE
+    joined to the compiled segment table, without recomputing R/F/M. The
+    result is recorded in the snapshot history like a calculation.
+
+    Returns:
+        dict: mode, run_id, total_customers and reassigned (number of
+        customers whose segment changed)
+    """
+    started = time.perf_counter()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(get_segment_reassign_query())
+        reassigned = cursor.rowcount
+    run = record_snapshot('reassign')
+    result = {
+        'mode': 'reassign',
+        'run_id': run.pk,
+        'total_customers': run.customer_count,
+        'reassigned': reassigned,
+    }
+    record_run_metrics(result, started)
+    return result
@@ -0,0 +1,41 @@
+"""
+Signal handlers that track customers needing RFM recalculation.
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from customer.models import Customer
+from order.aggregates import changes_aggregates
+from order.models import Order
+from order.signals import orders_bulk_created, orders_imported
+from .incremental import mark_customers_dirty
+
+
+@receiver(post_save, sender=Order)
+def mark_customer_dirty_on_order_save(sender, instance, update_fields=None, **kwargs):
+    # R/F/M come from the same order fields as the order aggregates
+    if changes_aggregates(update_fields):
+        mark_customers_dirty([instance.customer_id])
+
+
+@receiver(orders_bulk_created, sender=Order)
+@receiver(orders_imported, sender=Order)
+def mark_customers_dirty_on_bulk_orders(sender, customer_ids, **kwargs):
+    mark_customers_dirty(customer_ids)
+
+
+@receiver(post_delete, sender=Order)
+def mark_customer_dirty_on_order_delete(sender, instance, origin=None, **kwargs):
+    # Orders removed by a customer cascade delete have nobody left to rescore
+    origin_model = getattr(origin, 'model', type(origin))
+    if origin_model is Customer:
+        return
+    mark_customers_dirty([instance.customer_id])
+
+
+@receiver(post_save, sender=Customer)
+def mark_new_customer_dirty(sender, instance, created, **kwargs):
+    # New customers have no score yet; give them one on the next run
+    if created:
+        mark_customers_dirty([instance.pk])
@@ -1,3 +1,650 @@
-from django.test import TestCase
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from customer.models import Customer
+from order.aggregates import rebuild_customer_aggregates
+from minicrm.bench import BenchCase, compare, measure
+from minicrm.explain import sequential_scans
+from order.models import Order
+from .engines import NumpyEngine, SQLEngine, assign_segments, ntile
+from .history import compact_snapshots
+from .incremental import (
+    calculate_incremental_rfm_scores,
+    capture_boundaries,
+    clear_dirty_customers,
+)
+from .jobs import ProgressReporter, submit_job
+from .models import (
+    RFMBoundaries,
+    RFMDirtyCustomer,
+    RFMJob,
+    RFMRun,
+    RFMScore,
+    RFMSnapshot,
+)
+from .partitioning import merge_sketches
+from .persistence import bulk_upsert_rfm_scores
+from .queries import get_rfm_calculation_query
+from .services import (
+    LAST_RUN_CUSTOMERS,
+    RUN_CUSTOMERS,
+    calculate_rfm_scores,
+    reassign_segments,
+)
+from .segments import SEGMENT_NAMES, SEGMENT_TABLE, assign_segment
+
+
+def create_customers(count):
+    return [
+        Customer.objects.create(
+            name=f'Customer {i}',
+            email=f'customer{i}@example.com',
+            phone='500000000',
+            address='Test street 1'
+        )
+        for i in range(count)
+    ]
+
+
+def seed_orders(customers, seed=42):
+    """
+    Give customers a reproducible mix of orders, including ties and
+    customers without orders.
+
+    Order dates sit a quarter of a day off whole days and totals are
+    multiples of 0.25 so rounding never depends on the exact clock or on
+    float summation.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    for customer in customers:
+        for _ in range(rng.choice([0, 1, 1, 2, 3, 5, 8])):
+            order = Order.objects.create(
+                customer=customer,
+                status='delivered',
+                total_price=Decimal(rng.randint(1, 400)) / 4
+            )
+            order_date = now - timedelta(days=rng.randint(0, 400), hours=6)
+            Order.objects.filter(pk=order.pk).update(order_date=order_date)
+    # QuerySet.update() bypasses the signals maintaining order aggregates
+    rebuild_customer_aggregates()
+
+
+class BulkUpsertRFMScoresTests(TestCase):
+    def setUp(self):
+        self.customers = create_customers(5)
+
+    def make_rows(self, customers, segment):
+        return [
+            (c.id, 10, 2, Decimal('100.00'), 3, 3, 3, segment)
+            for c in customers
+        ]
+
+    def test_counts_created_and_updated(self):
+        created, updated = bulk_upsert_rfm_scores(
+            self.make_rows(self.customers[:3], 'Need Attention'), batch_size=2
+        )
+        self.assertEqual((created, updated), (3, 0))
+
+        created, updated = bulk_upsert_rfm_scores(
+            self.make_rows(self.customers, 'Hibernating'), batch_size=2
+        )
+        self.assertEqual((created, updated), (2, 3))
+        self.assertEqual(RFMScore.objects.count(), 5)
+        self.assertEqual(
+            set(RFMScore.objects.values_list('segment', flat=True)),
+            {'Hibernating'}
+        )
+
+    def test_update_refreshes_calculated_at(self):
+        bulk_upsert_rfm_scores(self.make_rows(self.customers[:1], 'Lost'))
+        first = RFMScore.objects.get().calculated_at
+        bulk_upsert_rfm_scores(self.make_rows(self.customers[:1], 'Lost'))
+        self.assertGreater(RFMScore.objects.get().calculated_at, first)
+
+
+class IncrementalRFMTests(TestCase):
+    def setUp(self):
+        self.customers = create_customers(10)
+        # Spread customers evenly across the quintiles of a "full run"; like
+        # the engines, the lowest recency, frequency and monetary score 5
+        rows = []
+        for i, c in enumerate(self.customers):
+            score = i // 2 + 1
+            rows.append((
+                c.id, 500 - score * 100, 6 - score, Decimal((6 - score) * 100),
+                score, score, score, assign_segment(score, score, score)
+            ))
+        bulk_upsert_rfm_scores(rows)
+        capture_boundaries()
+        clear_dirty_customers(timezone.now())
+
+    def test_order_changes_mark_customer_dirty(self):
+        order = Order.objects.create(customer=self.customers[0], status='new')
+        self.assertTrue(
+            RFMDirtyCustomer.objects.filter(customer=self.customers[0]).exists()
+        )
+        clear_dirty_customers(timezone.now())
+        order.delete()
+        self.assertTrue(
+            RFMDirtyCustomer.objects.filter(customer=self.customers[0]).exists()
+        )
+
+    def test_customer_cascade_delete_does_not_mark_dirty(self):
+        Order.objects.create(customer=self.customers[0], status='new')
+        self.customers[0].delete()
+        self.assertFalse(RFMDirtyCustomer.objects.exists())
+
+    @override_settings(RFM_INCREMENTAL_DRIFT_THRESHOLD=0.5)
+    def test_rescores_only_dirty_customers(self):
+        customer = self.customers[0]
+        Order.objects.create(customer=customer, status='new', total_price=Decimal('600'))
+
+        result, reason = calculate_incremental_rfm_scores()
+
+        self.assertIsNone(reason)
+        self.assertEqual(result['mode'], 'incremental')
+        self.assertEqual((result['created'], result['updated']), (0, 1))
+        score = RFMScore.objects.get(customer=customer)
+        self.assertEqual(
+            (score.recency_days, score.frequency, score.monetary),
+            (0, 1, Decimal('600'))
+        )
+        self.assertEqual(
+            (score.recency_score, score.frequency_score, score.monetary_score),
+            (5, 5, 1)
+        )
+        self.assertFalse(RFMDirtyCustomer.objects.exists())
+
+    @override_settings(RFM_INCREMENTAL_DRIFT_THRESHOLD=1)
+    def test_matches_full_run_after_new_order(self):
+        # Customer i: i + 1 orders of 10, the last one 10 * i + 5 days ago,
+        # so no raw values tie across quintile edges
+        now = timezone.now()
+        for i, customer in enumerate(self.customers):
+            for _ in range(i + 1):
+                Order.objects.create(
+                    customer=customer, status='delivered', total_price=Decimal('10'))
+            Order.objects.filter(customer=customer).update(
+                order_date=now - timedelta(days=10 * i + 5, hours=6))
+        rebuild_customer_aggregates()
+        calculate_rfm_scores()
+        scores = ('recency_score', 'frequency_score', 'monetary_score')
+        customer = self.customers[2]
+        self.assertEqual(
+            RFMScore.objects.values_list(*scores).get(customer=customer), (4, 4, 4))
+
+        Order.objects.create(customer=customer, status='new', total_price=Decimal('10'))
+        result = calculate_rfm_scores(incremental=True)
+        self.assertEqual(result['mode'], 'incremental')
+        incremental = RFMScore.objects.values_list(*scores).get(customer=customer)
+        calculate_rfm_scores()
+        full = RFMScore.objects.values_list(*scores).get(customer=customer)
+        self.assertEqual(incremental, full)
+
+    def test_drift_requires_full_rebuild(self):
+        for customer in self.customers[:4]:
+            Order.objects.create(customer=customer, status='new', total_price=Decimal('600'))
+
+        result, reason = calculate_incremental_rfm_scores()
+
+        self.assertIsNone(result)
+        self.assertIn('drift', reason)
+
+    def test_missing_boundaries_require_full_rebuild(self):
+        RFMBoundaries.objects.all().delete()
+        result, reason = calculate_incremental_rfm_scores()
+        self.assertIsNone(result)
+        self.assertIn('no boundaries', reason)
+
+
+class RFMEngineParityTests(TestCase):
+    def test_ntile_matches_sql_semantics(self):
+        # NTILE(5) over 7 rows: buckets of 2, 2, 1, 1, 1
+        self.assertEqual(
+            ntile(np.arange(7), 7).tolist(), [1, 1, 2, 2, 3, 4, 5]
+        )
+        self.assertEqual(ntile(np.arange(3), 3).tolist(), [1, 2, 3])
+
+    def test_numpy_engine_matches_sql_engine(self):
+        seed_orders(create_customers(73))
+
+        sql_rows = list(SQLEngine().fetch_rows())
+        numpy_rows = list(NumpyEngine().fetch_rows())
+
+        self.assertEqual(len(sql_rows), 73)
+        self.assertEqual(numpy_rows, sql_rows)
+        for sql_row, numpy_row in zip(sql_rows, numpy_rows):
+            self.assertEqual(
+                [type(value) for value in sql_row], [type(value) for value in numpy_row])
+            self.assertEqual(str(sql_row[3]), str(numpy_row[3]))
+
+    def test_small_chunks_stream_the_same_rows(self):
+        seed_orders(create_customers(23))
+        for engine_class in (SQLEngine, NumpyEngine):
+            rows = engine_class(chunk_size=4).fetch_rows()
+            self.assertNotIsInstance(rows, list)
+            self.assertEqual(list(rows), list(engine_class().fetch_rows()))
+
+
+class PartitionedRFMTests(TransactionTestCase):
+    def test_merge_sketches_offsets(self):
+        # Value 5 appears in both partitions: the first partition ranks first
+        offsets = merge_sketches([
+            (np.array([1, 5]), np.array([2, 1])),
+            (np.array([3, 5, 7]), np.array([1, 2, 1])),
+        ])
+        self.assertEqual(offsets[0].tolist(), [0, 3])
+        self.assertEqual(offsets[1].tolist(), [2, 4, 6])
+
+    def test_parallel_run_matches_serial_engine(self):
+        seed_orders(create_customers(97))
+        expected = [
+            row[:3] + row[4:] for row in NumpyEngine().fetch_rows()
+        ]
+
+        result = calculate_rfm_scores(workers=4)
+
+        self.assertEqual(result['workers'], 4)
+        self.assertEqual(result['created'], 97)
+        actual = list(
+            RFMScore.objects.order_by('customer_id').values_list(
+                'customer_id', 'recency_days', 'frequency', 'recency_score',
+                'frequency_score', 'monetary_score', 'segment'
+            )
+        )
+        self.assertEqual(actual, expected)
+        self.assertEqual(RFMBoundaries.objects.get().customer_count, 97)
+
+
+class SegmentLookupTests(TestCase):
+    def test_compiled_table_applies_first_matching_rule(self):
+        self.assertEqual(len(SEGMENT_TABLE), 125)
+        self.assertEqual(assign_segment(5, 5, 5), 'Champions')
+        self.assertEqual(assign_segment(4, 5, 3), 'Loyal Customers')
+        self.assertEqual(assign_segment(3, 3, 3), 'Need Attention')
+        # Hibernating precedes Lost, like in the original CASE expression
+        self.assertEqual(assign_segment(1, 1, 1), 'Hibernating')
+        # No rule matches: default segment
+        self.assertEqual(assign_segment(3, 5, 5), 'Need Attention')
+
+    def test_vectorized_lookup_matches_scalar_lookup(self):
+        r, f, m = (
+            axis.ravel().astype(np.int8)
+            for axis in np.meshgrid(*[np.arange(1, 6)] * 3, indexing='ij')
+        )
+        self.assertEqual(
+            [SEGMENT_NAMES[code] for code in assign_segments(r, f, m)],
+            [assign_segment(*scores) for scores in zip(r.tolist(), f.tolist(), m.tolist())]
+        )
+
+    def test_reassign_segments_without_recalculation(self):
+        seed_orders(create_customers(25))
+        calculate_rfm_scores()
+        expected = dict(RFMScore.objects.values_list('customer_id', 'segment'))
+        changed = list(expected)[:7]
+        RFMScore.objects.filter(customer_id__in=changed).update(segment='Outdated')
+
+        result = reassign_segments()
+
+        self.assertEqual(result['reassigned'], 7)
+        self.assertEqual(
+            dict(RFMScore.objects.values_list('customer_id', 'segment')), expected
+        )
+        self.assertEqual(RFMRun.objects.get(pk=result['run_id']).mode, 'reassign')
+
+
+class CalculateRFMScoresTests(TestCase):
+    def setUp(self):
+        seed_orders(create_customers(20))
+
+    def test_full_run_with_each_engine(self):
+        for engine, expected in (('sql', (20, 0)), ('numpy', (0, 20))):
+            result = calculate_rfm_scores(engine=engine)
+            self.assertEqual(result['engine'], engine)
+            self.assertEqual((result['created'], result['updated']), expected)
+        self.assertEqual(RFMBoundaries.objects.get().customer_count, 20)
+        self.assertFalse(RFMDirtyCustomer.objects.exists())
+
+    def test_incremental_without_boundaries_falls_back_to_full(self):
+        result = calculate_rfm_scores(incremental=True)
+        self.assertEqual(result['mode'], 'full')
+        self.assertIn('no boundaries', result['full_rebuild_reason'])
+        self.assertEqual(RFMScore.objects.count(), 20)
+
+    def test_runs_are_exported_as_metrics(self):
+        before = RUN_CUSTOMERS.values.get(('full',), 0)
+        calculate_rfm_scores()
+        self.assertEqual(RUN_CUSTOMERS.values[('full',)], before + 20)
+        self.assertEqual(LAST_RUN_CUSTOMERS.values[('full',)][0], 20)
+        metrics = self.client.get('/metrics').content.decode()
+        self.assertIn('minicrm_rfm_run_duration_seconds_count{mode="full"}', metrics)
+        self.assertIn('minicrm_rfm_last_run_customers{mode="full"} 20\n', metrics)
+
+
+@override_settings(RFM_JOBS_EAGER=True)
+class RFMJobAPITests(APITestCase):
+    def setUp(self):
+        seed_orders(create_customers(12))
+
+    def test_calculate_returns_job_and_status_reports_result(self):
+        response = self.client.post('/api/rfm/calculate/')
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertFalse(response.data['attached'])
+        job = self.client.get(response.data['status_url']).data
+        self.assertEqual(job['status'], RFMJob.STATUS_SUCCEEDED)
+        self.assertEqual(job['rows_processed'], 12)
+        self.assertEqual(job['result']['created'], 12)
+        self.assertIsNotNone(job['duration_seconds'])
+        self.assertEqual(RFMScore.objects.count(), 12)
+
+    def test_duplicate_request_attaches_to_running_job(self):
+        running = RFMJob.objects.create(status=RFMJob.STATUS_RUNNING)
+
+        response = self.client.post('/api/rfm/calculate/')
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertTrue(response.data['attached'])
+        self.assertEqual(response.data['job_id'], running.id)
+        self.assertEqual(RFMJob.objects.count(), 1)
+
+    @override_settings(RFM_JOB_STALE_SECONDS=60)
+    def test_stale_job_does_not_block_new_calculation(self):
+        stale = RFMJob.objects.create(
+            status=RFMJob.STATUS_RUNNING,
+            updated_at=timezone.now() - timedelta(minutes=5)
+        )
+
+        response = self.client.post('/api/rfm/calculate/')
+
+        self.assertFalse(response.data['attached'])
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, RFMJob.STATUS_FAILED)
+
+    @override_settings(RFM_JOB_STALE_SECONDS=60)
+    def test_long_running_job_is_not_reaped(self):
+        submissions = []
+
+        def calculate(**kwargs):
+            # No heartbeat for longer than RFM_JOB_STALE_SECONDS
+            RFMJob.objects.update(updated_at=timezone.now() - timedelta(minutes=5))
+            submissions.append(submit_job())
+            return calculate_rfm_scores(**kwargs)
+
+        with mock.patch('rfm.jobs.calculate_rfm_scores', calculate):
+            job, attached = submit_job()
+
+        self.assertEqual(submissions, [(job, True)])
+        self.assertEqual(job.status, RFMJob.STATUS_SUCCEEDED)
+        self.assertEqual(RFMJob.objects.count(), 1)
+
+    def test_failed_job_keeps_its_status(self):
+        def calculate(**kwargs):
+            result = calculate_rfm_scores(**kwargs)
+            # Failed as stale by another worker meanwhile
+            RFMJob.objects.update(status=RFMJob.STATUS_FAILED)
+            return result
+
+        with mock.patch('rfm.jobs.calculate_rfm_scores', calculate):
+            job, attached = submit_job()
+
+        self.assertEqual(job.status, RFMJob.STATUS_FAILED)
+        self.assertIsNone(job.result)
+
+    def test_unknown_job_returns_404(self):
+        response = self.client.get(
+            '/api/rfm/jobs/00000000-0000-0000-0000-000000000000/'
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RFMJobHeartbeatTests(TransactionTestCase):
+    def test_heartbeat_without_progress(self):
+        stale = timezone.now() - timedelta(minutes=5)
+        job = RFMJob.objects.create(status=RFMJob.STATUS_RUNNING, updated_at=stale)
+
+        reporter = ProgressReporter(job.pk, use_separate_connection=True,
+                                    heartbeat_seconds=0.01)
+        try:
+            for _ in range(100):
+                job.refresh_from_db()
+                if job.updated_at > stale:
+                    break
+                time.sleep(0.01)
+        finally:
+            reporter.close()
+
+        self.assertGreater(job.updated_at, stale)
+        self.assertFalse(reporter.heartbeat.is_alive())
+
+
+class RFMSnapshotHistoryTests(APITestCase):
+    def setUp(self):
+        self.customers = create_customers(30)
+        seed_orders(self.customers)
+
+    def test_each_run_appends_a_compact_snapshot(self):
+        first = calculate_rfm_scores()
+        second = calculate_rfm_scores()
+
+        self.assertNotEqual(first['run_id'], second['run_id'])
+        self.assertEqual(RFMRun.objects.get(pk=second['run_id']).customer_count, 30)
+        self.assertEqual(RFMSnapshot.objects.count(), 60)
+        expected = {
+            score.customer_id: SEGMENT_NAMES.index(score.segment)
+            for score in RFMScore.objects.all()
+        }
+        snapshot = dict(
+            RFMSnapshot.objects.filter(run_id=second['run_id'])
+            .values_list('customer_id', 'segment')
+        )
+        self.assertEqual(snapshot, expected)
+
+    def test_transitions_between_runs(self):
+        first = calculate_rfm_scores()['run_id']
+        before = dict(RFMScore.objects.values_list('customer_id', 'segment'))
+        # Customers without orders move to the bottom of every ranking
+        Order.objects.filter(customer__in=self.customers[:10]).delete()
+        second = calculate_rfm_scores()['run_id']
+        after = dict(RFMScore.objects.values_list('customer_id', 'segment'))
+
+        response = self.client.get(
+            '/api/rfm/transitions/', {'from_run': first, 'to_run': second}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        matrix = response.data['matrix']
+        for source in SEGMENT_NAMES:
+            for target in SEGMENT_NAMES:
+                self.assertEqual(
+                    matrix[source][target],
+                    sum(1 for c in before
+                        if before[c] == source and after[c] == target),
+                )
+        # Without parameters the two latest runs are compared
+        latest = self.client.get('/api/rfm/transitions/').data
+        self.assertEqual(latest['matrix'], matrix)
+
+    def test_transitions_require_two_runs(self):
+        calculate_rfm_scores()
+        response = self.client.get('/api/rfm/transitions/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(RFM_SNAPSHOT_KEEP_ALL_DAYS=30,
+                       RFM_SNAPSHOT_KEEP_MONTHLY_DAYS=365)
+    def test_compaction_keeps_recent_and_monthly_runs(self):
+        now = timezone.now().replace(day=15, hour=12)
+        ages = [1, 10, 35, 40, 70, 400]
+        runs = {
+            age: RFMRun.objects.create(
+                mode='full', created_at=now - timedelta(days=age))
+            for age in ages
+        }
+        for run in runs.values():
+            RFMSnapshot.objects.create(
+                run=run, customer_id=self.customers[0].id, recency_score=1,
+                frequency_score=1, monetary_score=1, segment=0
+            )
+
+        deleted = compact_snapshots(now)
+
+        # 35 and 40 days ago fall in the previous month: the later run stays
+        kept = {age for age, run in runs.items()
+                if RFMRun.objects.filter(pk=run.pk).exists()}
+        self.assertEqual(kept, {1, 10, 35, 70})
+        self.assertEqual(deleted, 2)
+        self.assertEqual(RFMSnapshot.objects.count(), 4)
+
+
+class RFMSummaryCacheTests(APITestCase):
+    def setUp(self):
+        caches['rfm'].clear()
+        seed_orders(create_customers(20))
+        calculate_rfm_scores()
+
+    def test_summaries_are_cached_until_the_next_calculation(self):
+        for url in ('/api/rfm/by-segment/', '/api/rfm/statistics/'):
+            self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+            self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        # Only a finished calculation invalidates the cached summaries
+        removed = list(RFMScore.objects.values_list('customer_id', flat=True)[:5])
+        RFMScore.objects.filter(customer_id__in=removed).delete()
+        cached = self.client.get('/api/rfm/by-segment/')
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(cached.data['total_customers'], 20)
+
+        calculate_rfm_scores()
+        fresh = self.client.get('/api/rfm/by-segment/')
+        self.assertEqual(fresh['X-Cache'], 'MISS')
+        self.assertEqual(fresh.data['total_customers'], 20)
+        statistics = self.client.get('/api/rfm/statistics/')
+        self.assertEqual(statistics['X-Cache'], 'MISS')
+        self.assertEqual(statistics.data['total_customers'], 20)
+
+    def test_cache_stats_count_hits_and_misses(self):
+        before = self.client.get('/api/rfm/cache-stats/').data
+        self.client.get('/api/rfm/by-segment/')
+        self.client.get('/api/rfm/by-segment/')
+
+        after = self.client.get('/api/rfm/cache-stats/').data
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['generation'], RFMRun.objects.latest('created_at').pk)
+
+
+@override_settings(ROOT_URLCONF='order.tests')
+class RFMAsyncSummaryTests(APITestCase):
+    def setUp(self):
+        caches['rfm'].clear()
+        seed_orders(create_customers(20))
+        calculate_rfm_scores()
+
+    def test_async_summaries_share_the_cache_of_the_sync_views(self):
+        # order.tests routes the API through its async read views
+        for url in ('/api/rfm/by-segment/', '/api/rfm/statistics/'):
+            expected = self.client.get(url)
+            self.assertEqual(expected['X-Cache'], 'MISS')
+            response = async_to_sync(self.async_client.get)(url)
+            self.assertEqual(response['X-Cache'], 'HIT')
+            self.assertEqual(response.content, expected.content)
+
+        caches['rfm'].clear()
+        response = async_to_sync(self.async_client.get)('/api/rfm/statistics/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['total_customers'], 20)
+        self.assertEqual(self.client.get('/api/rfm/statistics/')['X-Cache'], 'HIT')
+
+
+class RFMScoreListFieldsTests(APITestCase):
+    def setUp(self):
+        seed_orders(create_customers(12))
+        calculate_rfm_scores()
+
+    def test_fields_keep_columns_needed_by_rfm_code(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/rfm/?fields=customer_id,rfm_code')
+        row = response.data['results'][0]
+        score = RFMScore.objects.get(customer_id=row['customer_id'])
+        self.assertEqual(row, {'customer_id': score.customer_id, 'rfm_code': score.rfm_code})
+
+    def test_list_joins_customers_once(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/rfm/?expand=customer')
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertIn('address', response.data['results'][0]['customer'])
+
+    @override_settings(API_FAST_LIST=True)
+    def test_fast_list_matches_serializers(self):
+        for url in ('/api/rfm/', '/api/rfm/?expand=customer&fields=customer,rfm_code'):
+            response = self.client.get(url)
+            with self.settings(API_FAST_LIST=False):
+                expected = self.client.get(url)
+            self.assertEqual(response.content, expected.content, url)
+
+    def test_csv_export_matches_list(self):
+        listed = self.client.get('/api/rfm/?page_size=100').json()['results']
+        response = self.client.get('/api/rfm/export/?format=csv&fields=customer_id,rfm_code')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'customer_id,rfm_code')
+        self.assertEqual(
+            lines[1:], [f"{row['customer_id']},{row['rfm_code']}" for row in listed])
+
+
+class RFMQueryPlanTests(TestCase):
+    """The RFM queries must not read order or score tables in full."""
+
+    def setUp(self):
+        seed_orders(create_customers(30))
+        calculate_rfm_scores()
+
+    def test_calculation_reads_aggregates_by_customer(self):
+        # Every customer is scored, so customers are read in full (by index
+        # or table); orders are only read through their aggregates
+        scans = sequential_scans(get_rfm_calculation_query(connection.vendor))
+        self.assertEqual(scans - {'customer_customer'}, set())
+
+    def test_segment_summary_uses_the_segment_index(self):
+        summary = RFMScore.objects.values('segment').annotate(
+            count=Count('customer_id')).order_by('-count')
+        self.assertEqual(sequential_scans(summary), set())
+
+
+class BenchTests(APITestCase):
+    def test_measure_counts_the_queries_of_requests(self):
+        create_customers(3)
+        case = BenchCase('api.customers.list', lambda: self.client.get('/api/customers/'))
+        result = measure(case, repeat=2)
+        self.assertEqual(result['queries'], 1)
+        self.assertGreater(result['wall_ms'], 0)
+        self.assertGreater(result['peak_kib'], 0)
+
+    def test_compare_flags_regressions_over_the_threshold(self):
+        baseline = {
+            'fast': {'wall_ms': 10.0, 'queries': 2, 'peak_kib': 100.0},
+            'slow': {'wall_ms': 10.0, 'queries': 2, 'peak_kib': 100.0},
+        }
+        results = {
+            'fast': {'wall_ms': 11.0, 'queries': 2, 'peak_kib': 90.0},
+            'slow': {'wall_ms': 13.0, 'queries': 3, 'peak_kib': 100.0},
+            'new': {'wall_ms': 1.0, 'queries': 1, 'peak_kib': 1.0},
+        }
+        comparison = {row['name']: row for row in compare(results, baseline, 0.2)}
+        self.assertEqual(set(comparison), {'fast', 'slow'})
+        self.assertEqual(comparison['fast']['regressions'], [])
+        self.assertEqual(comparison['slow']['regressions'], ['wall_ms', 'queries'])
+        self.assertEqual(comparison['slow']['queries_delta'], 1)
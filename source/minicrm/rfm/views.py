@@ -1,129 +1,247 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db import connection
+from rest_framework.reverse import reverse
 from django.db.models import Count, Avg, Min, Max
-from .models import RFMScore
-from .serializers import RFMScoreSerializer, RFMScoreListSerializer
-from .queries import get_rfm_calculation_query
-from customer.models import Customer
+from django.shortcuts import get_object_or_404
+from minicrm.export import ExportViewSetMixin
+from minicrm.fastlist import FastListViewSetMixin
+from minicrm.fieldsets import SparseFieldsetViewSetMixin
+from minicrm.asyncviews import AsyncReadViewSetMixin
+from .cache import aget_cached, get_cached, get_generation, stats as cache_stats
+from .history import transition_matrix
+from .jobs import submit_job
+from .models import RFMJob, RFMRun, RFMScore
+from .serializers import (
+    RFMJobSerializer,
+    RFMRunSerializer,
+    RFMScoreSerializer,
+    RFMScoreListSerializer,
+)
 
 
-class RFMScoreViewSet(viewsets.ReadOnlyModelViewSet):
+def is_true(value):
+    """Interpret a query parameter or JSON value as a boolean flag."""
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+def cached_response(name, compute):
+    """Response from the versioned RFM cache, with an X-Cache header."""
+    data, hit = get_cached(name, compute)
+    response = Response(data)
+    response['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+
+async def acached_response(name, compute):
+    """cached_response() for async views (see rfm.cache.aget_cached)."""
+    data, hit = await aget_cached(name, compute)
+    response = Response(data)
+    response['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+
+def segment_counts():
+    return RFMScore.objects.values('segment').annotate(
+        count=Count('customer_id')
+    ).order_by('-count')
+
+
+def summarize_segments(segments):
+    return {
+        'segments': segments,
+        'total_customers': sum(segment['count'] for segment in segments)
+    }
+
+
+def segment_summary():
+    """Customers per segment; the total is derived from the same query."""
+    return summarize_segments(list(segment_counts()))
+
+
+async def asegment_summary():
+    """segment_summary() through the async ORM."""
+    return summarize_segments([segment async for segment in segment_counts()])
+
+
+def score_aggregates():
+    return {
+        'total_customers': Count('customer_id'),
+        'avg_recency_days': Avg('recency_days'),
+        'avg_frequency': Avg('frequency'),
+        'avg_monetary': Avg('monetary'),
+        'min_recency_days': Min('recency_days'),
+        'max_recency_days': Max('recency_days'),
+        'min_frequency': Min('frequency'),
+        'max_frequency': Max('frequency'),
+        'min_monetary': Min('monetary'),
+        'max_monetary': Max('monetary'),
+    }
+
+
+def score_statistics():
+    """Aggregate statistics over all RFM scores."""
+    return RFMScore.objects.aggregate(**score_aggregates())
+
+
+async def ascore_statistics():
+    """score_statistics() through the async ORM."""
+    return await RFMScore.objects.aaggregate(**score_aggregates())
+
+
+class RFMScoreViewSet(AsyncReadViewSetMixin, ExportViewSetMixin, FastListViewSetMixin, SparseFieldsetViewSetMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for RFM Scores.
     
     Provides read-only access to RFM scores.
     Use the 'calculate' action to recalculate RFM scores for all customers.
+    Customers are joined for the returned fields only (?fields=, ?expand=).
     """
     
-    queryset = RFMScore.objects.select_related('customer').all()
+    queryset = RFMScore.objects.all()
     serializer_class = RFMScoreSerializer
+    keyset_ordering = ('-calculated_at', '-customer_id')
+    # Served from read replicas (see minicrm/routers.py); job status and
+    # history follow the primary, where calculations write
+    replica_actions = ('list', 'retrieve', 'export', 'by_segment', 'statistics')
     
     def get_serializer_class(self):
-        if self.action == 'list':
+        if self.action in ('list', 'export'):
             return RFMScoreListSerializer
         return RFMScoreSerializer
     
     @action(detail=False, methods=['post'], url_path='calculate')
     def calculate(self, request):
         """
-        Calculate RFM scores for all customers using SQL query.
+        Start a background RFM calculation for all customers.
+        
+        Returns 202 Accepted with a job id; poll GET /api/rfm/jobs/<id>/
+        for status, progress, duration and result counts. While a job is
+        pending or running, further requests attach to it instead of
+        starting a second calculation.
         
-        This endpoint executes the RFM calculation SQL query and
-        creates/updates RFMScore records for all customers.
+        Pass `incremental=true` (query parameter or request body) to only
+        rescore customers whose orders changed since the last run.
         """
+        incremental = request.query_params.get(
+            'incremental', request.data.get('incremental', False)
+        )
         try:
-            with connection.cursor() as cursor:
-                # Execute the RFM calculation query
-                cursor.execute(get_rfm_calculation_query())
-                results = cursor.fetchall()
-                
-                # Column names from the query
-                columns = [
-                    'customer_id', 'recency_days', 'frequency', 'monetary',
-                    'recency_score', 'frequency_score', 'monetary_score', 'segment'
-                ]
-                
-                # Process results and create/update RFMScore records
-                created_count = 0
-                updated_count = 0
-                
-                for row in results:
-                    row_dict = dict(zip(columns, row))
-                    customer_id = row_dict['customer_id']
-                    
-                    try:
-                        customer = Customer.objects.get(id=customer_id)
-                    except Customer.DoesNotExist:
-                        continue
-                    
-                    # Create or update RFMScore
-                    rfm_score, created = RFMScore.objects.update_or_create(
-                        customer=customer,
-                        defaults={
-                            'recency_days': row_dict['recency_days'],
-                            'frequency': row_dict['frequency'],
-                            'monetary': row_dict['monetary'],
-                            'recency_score': row_dict['recency_score'],
-                            'frequency_score': row_dict['frequency_score'],
-                            'monetary_score': row_dict['monetary_score'],
-                            'segment': row_dict['segment'],
-                        }
-                    )
-                    
-                    if created:
-                        created_count += 1
-                    else:
-                        updated_count += 1
-                
-                return Response({
-                    'message': 'RFM scores calculated successfully',
-                    'total_customers': len(results),
-                    'created': created_count,
-                    'updated': updated_count
-                }, status=status.HTTP_200_OK)
-                
+            job, attached = submit_job(incremental=is_true(incremental))
         except Exception as e:
             return Response({
-                'error': 'Failed to calculate RFM scores',
+                'error': 'Failed to start RFM calculation',
                 'detail': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        return Response({
+            'message': (
+                'RFM calculation already in progress' if attached
+                else 'RFM calculation started'
+            ),
+            'job_id': job.id,
+            'attached': attached,
+            'status': job.status,
+            'status_url': reverse(
+                'rfm-job', kwargs={'job_id': job.id}, request=request
+            ),
+        }, status=status.HTTP_202_ACCEPTED)
     
-    @action(detail=False, methods=['get'], url_path='by-segment')
-    def by_segment(self, request):
+    @action(detail=False, methods=['get'], url_path=r'jobs/(?P<job_id>[0-9a-f-]{36})',
+            url_name='job')
+    def job(self, request, job_id=None):
         """
-        Get RFM scores grouped by segment.
+        Get the state of a background RFM calculation job.
+        """
+        job = get_object_or_404(RFMJob, pk=job_id)
+        return Response(RFMJobSerializer(job).data)
+    
+    @action(detail=False, methods=['get'], url_path='runs')
+    def runs(self, request):
+        """
+        List the most recent RFM runs kept in the snapshot history.
+        
+        Use their ids with the 'transitions' action.
+        """
+        runs = RFMRun.objects.all()[:100]
+        return Response({'runs': RFMRunSerializer(runs, many=True).data})
+    
+    @action(detail=False, methods=['get'], url_path='transitions')
+    def transitions(self, request):
+        """
+        Get the segment-to-segment transition matrix between two runs.
         
-        Returns a summary of customers per segment.
+        Query parameters `from_run` and `to_run` select the runs (see
+        the 'runs' action); they default to the two most recent runs.
+        matrix[from_segment][to_segment] counts customers present in both
+        runs.
         """
-        segments = RFMScore.objects.values('segment').annotate(
-            count=Count('customer_id')
-        ).order_by('-count')
+        from_run_id = request.query_params.get('from_run')
+        to_run_id = request.query_params.get('to_run')
+        for value in (from_run_id, to_run_id):
+            if value is not None and not value.isdigit():
+                return Response({
+                    'error': 'from_run and to_run must be RFM run ids'
+                }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if from_run_id is None and to_run_id is None:
+            latest = list(RFMRun.objects.all()[:2])
+            if len(latest) < 2:
+                return Response({
+                    'error': 'At least two RFM runs are required for transitions'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            to_run, from_run = latest
+        elif from_run_id is None or to_run_id is None:
+            return Response({
+                'error': 'Pass both from_run and to_run, or neither'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            from_run = get_object_or_404(RFMRun, pk=from_run_id)
+            to_run = get_object_or_404(RFMRun, pk=to_run_id)
         
         return Response({
-            'segments': list(segments),
-            'total_customers': RFMScore.objects.count()
+            'from_run': RFMRunSerializer(from_run).data,
+            'to_run': RFMRunSerializer(to_run).data,
+            'matrix': transition_matrix(from_run, to_run),
         })
     
+    @action(detail=False, methods=['get'], url_path='by-segment')
+    def by_segment(self, request):
+        """
+        Get RFM scores grouped by segment.
+        
+        Returns a summary of customers per segment. Cached until the next
+        RFM calculation finishes.
+        """
+        return cached_response('by-segment', segment_summary)
+    
+    async def aby_segment(self, request):
+        """by_segment() of the async read path (minicrm/asyncviews.py)."""
+        return await acached_response('by-segment', asegment_summary)
+    
     @action(detail=False, methods=['get'], url_path='statistics')
     def statistics(self, request):
         """
         Get RFM statistics.
         
-        Returns aggregate statistics about RFM scores.
+        Returns aggregate statistics about RFM scores. Cached until the
+        next RFM calculation finishes.
         """
-        stats = RFMScore.objects.aggregate(
-            total_customers=Count('customer_id'),
-            avg_recency_days=Avg('recency_days'),
-            avg_frequency=Avg('frequency'),
-            avg_monetary=Avg('monetary'),
-            min_recency_days=Min('recency_days'),
-            max_recency_days=Max('recency_days'),
-            min_frequency=Min('frequency'),
-            max_frequency=Max('frequency'),
-            min_monetary=Min('monetary'),
-            max_monetary=Max('monetary'),
-        )
-        
-        return Response(stats)
+        return cached_response('statistics', score_statistics)
+    
+    async def astatistics(self, request):
+        """statistics() of the async read path (minicrm/asyncviews.py)."""
+        return await acached_response('statistics', ascore_statistics)
+    
+    @action(detail=False, methods=['get'], url_path='cache-stats')
+    def cache_stats(self, request):
+        """
+        Get hit/miss counters of the RFM summary cache (this process)
+        and the current RFM generation.
+        """
+        return Response({
+            **cache_stats.as_dict(),
+            'generation': get_generation(),
+        })
@@ -49,15 +49,32 @@ if [ -z "$DISABLE_MIGRATE" ]; then
         exit 1
     }
     echo "Migrations completed successfully!"
+    # Creates the table of database caches (RFM_CACHE_BACKEND=db); no-op otherwise
+    $PYTHON_CMD manage.py createcachetable
 else
     echo "Skipping database migrations (DISABLE_MIGRATE is set)"
 fi
 
+# Metrics files of the gunicorn workers (see minicrm/metrics.py); stale files
+# of a previous run would be added to the new counters
+export METRICS_DIR=${METRICS_DIR:-/tmp/minicrm-metrics}
+rm -rf "$METRICS_DIR"
+
+# ASGI deployment: uvicorn workers serving the async read views
+# (API_ASYNC_READS, see minicrm/asyncviews.py). The image sets APP_MODULE to
+# the WSGI application, which uvicorn workers cannot serve: the ASGI
+# application comes from ASGI_APP_MODULE instead
+if [ "$API_ASYNC_READS" = "True" ]; then
+    APP_MODULE=${ASGI_APP_MODULE:-minicrm.asgi:application}
+    WORKER_CLASS=${WORKER_CLASS:-uvicorn_worker.UvicornWorker}
+fi
+
 # Start Gunicorn
 echo "Starting Gunicorn with module: ${APP_MODULE:-minicrm.wsgi:application}"
 exec gunicorn \
     --bind 0.0.0.0:8080 \
     --workers 4 \
+    --worker-class ${WORKER_CLASS:-sync} \
     --timeout 120 \
     --access-logfile - \
     --error-logfile - \
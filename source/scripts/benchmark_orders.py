@@ -0,0 +1,254 @@
+"""
+Benchmark order creation through the API.
+
+Creates a throwaway test database with customers and products, then posts
+the same synthetic orders through:
+- POST /api/orders/ one request per order (OrderSerializer.create)
+- POST /api/orders/bulk/ in batches of each requested size (order/bulk.py)
+
+and reports orders/sec and items/sec for each. Requests go through the
+full Django stack in-process (APIClient), so the numbers include
+serialization and validation but no network.
+
+With --threads it instead measures stock reservation under contention
+(see order/stock.py): for each thread count, threads post single orders
+that all take the same few hot products, whose stock covers only half of
+them. It reports orders/sec and checks that exactly the available stock
+was sold.
+
+Your regular database is never touched.
+"""
+
+import os
+import sys
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, script_dir)
+# Sets up Django and the minicrm path
+from benchmark_rfm import benchmark_database, timed
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Sum
+from django.test.utils import setup_test_environment
+from rest_framework.test import APIClient
+
+from customer.models import Customer
+from order.models import Order
+from product.models import Product
+
+
+def seed_references(customers, products, seed=42):
+    """Insert customers and products; returns their ids."""
+    rng = random.Random(seed)
+    Customer.objects.bulk_create([
+        Customer(
+            name=f'Customer {i}',
+            email=f'customer{i}@example.com',
+            phone='500000000',
+            address='Benchmark street 1',
+        )
+        for i in range(customers)
+    ])
+    Product.objects.bulk_create([
+        Product(
+            name=f'Product {i}',
+            description='Benchmark product',
+            price=Decimal(rng.randint(100, 20000)) / 100,
+            stock=1000000,
+        )
+        for i in range(products)
+    ])
+    return (
+        [str(pk) for pk in Customer.objects.values_list('id', flat=True)],
+        [str(pk) for pk in Product.objects.values_list('id', flat=True)],
+    )
+
+
+def make_orders(count, customer_ids, product_ids, items_per_order, seed=42):
+    """Synthetic order payloads in the format of POST /api/orders/."""
+    rng = random.Random(seed)
+    return [
+        {
+            'customer': rng.choice(customer_ids),
+            'status': 'new',
+            'items': [
+                {'product': product, 'quantity': rng.randint(1, 5)}
+                for product in rng.sample(product_ids, items_per_order)
+            ],
+        }
+        for _ in range(count)
+    ]
+
+
+def post_one_by_one(client, orders):
+    for order in orders:
+        response = client.post('/api/orders/', order, format='json')
+        assert response.status_code == 201, response.data
+
+
+def post_in_batches(client, orders, batch_size):
+    for start in range(0, len(orders), batch_size):
+        response = client.post(
+            '/api/orders/bulk/', orders[start:start + batch_size], format='json')
+        assert response.status_code == 201, response.data
+
+
+def benchmark(orders, batch_sizes, repeat):
+    """Time each endpoint; returns a list of result dicts."""
+    client = APIClient()
+    items = sum(len(order['items']) for order in orders)
+    cases = [('single', None, lambda: post_one_by_one(client, orders))] + [
+        ('bulk', size, lambda size=size: post_in_batches(client, orders, size))
+        for size in batch_sizes
+    ]
+    results = []
+    for endpoint, batch_size, func in cases:
+        times = []
+        for _ in range(repeat):
+            Order.objects.all().delete()
+            seconds, _ = timed(func)
+            times.append(seconds)
+        results.append({
+            'endpoint': endpoint,
+            'batch_size': batch_size,
+            'orders': len(orders),
+            'items': items,
+            'seconds': min(times),
+        })
+    return results
+
+
+def print_results(results):
+    # Speedup is relative to the per-order endpoint
+    baseline = results[0]['seconds']
+    print(f"{'endpoint':<8} {'batch':>6} {'orders':>7} {'seconds':>9} "
+          f"{'orders/s':>9} {'items/s':>9} {'speedup':>8}")
+    for r in results:
+        print(
+            f"{r['endpoint']:<8} {r['batch_size'] or 1:>6} {r['orders']:>7} "
+            f"{r['seconds']:>9.3f} {r['orders'] / r['seconds']:>9.0f} "
+            f"{r['items'] / r['seconds']:>9.0f} {baseline / r['seconds']:>7.2f}x"
+        )
+
+
+def benchmark_contention(orders, thread_counts, customer_ids, hot_products):
+    """Time concurrent single-order POSTs on hot products; returns result dicts."""
+    products = list(Product.objects.order_by('?')[:hot_products])
+    stock = orders // 2
+    rng = random.Random(42)
+    payload = [
+        {
+            'customer': rng.choice(customer_ids),
+            'status': 'new',
+            'items': [
+                {'product': str(product.id), 'quantity': 1}
+                for product in rng.sample(products, len(products))
+            ],
+        }
+        for _ in range(orders)
+    ]
+    results = []
+    for threads in thread_counts:
+        Order.objects.all().delete()
+        Product.objects.filter(pk__in=[p.pk for p in products]).update(stock=stock)
+        start = threading.Barrier(threads)
+
+        def place_orders(thread):
+            client = APIClient()
+            created = 0
+            start.wait()
+            try:
+                for order in payload[thread::threads]:
+                    response = client.post('/api/orders/', order, format='json')
+                    created += response.status_code == 201
+            finally:
+                connection.close()
+            return created
+
+        with ThreadPoolExecutor(threads) as executor:
+            seconds, created = timed(
+                lambda: sum(executor.map(place_orders, range(threads))))
+        remaining = Product.objects.filter(
+            pk__in=[p.pk for p in products]).aggregate(total=Sum('stock'))['total']
+        results.append({
+            'threads': threads,
+            'orders': orders,
+            'created': created,
+            'seconds': seconds,
+            'consistent': (
+                created == stock == Order.objects.count() and remaining == 0
+            ),
+        })
+    return results
+
+
+def print_contention_results(results):
+    print(f"{'threads':>7} {'orders':>7} {'created':>8} {'seconds':>9} "
+          f"{'orders/s':>9} {'stock ok':>9}")
+    for r in results:
+        print(
+            f"{r['threads']:>7} {r['orders']:>7} {r['created']:>8} "
+            f"{r['seconds']:>9.3f} {r['orders'] / r['seconds']:>9.0f} "
+            f"{'yes' if r['consistent'] else 'NO':>9}"
+        )
+
+
+def run(orders, batch_sizes, customers, products, items_per_order, repeat,
+        threads=None):
+    # With DEBUG on, Django keeps the SQL of every query in memory
+    settings.DEBUG = False
+    setup_test_environment()
+    print("=" * 60)
+    kind = 'contention ' if threads else ''
+    print(f"Order creation {kind}benchmark ({connection.vendor})")
+    print("=" * 60)
+    with benchmark_database():
+        customer_ids, product_ids = seed_references(customers, products)
+        if threads:
+            print(f"\n{orders} orders on {items_per_order} hot products, "
+                  f"stock for {orders // 2}")
+            print_contention_results(benchmark_contention(
+                orders, threads, customer_ids, items_per_order))
+            return
+        payload = make_orders(orders, customer_ids, product_ids, items_per_order)
+        print(f"\n{orders} orders, {items_per_order} items each, "
+              f"{customers} customers, {products} products")
+        print_results(benchmark(payload, batch_sizes, repeat))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark order creation endpoints')
+    parser.add_argument('--orders', type=int, default=2000,
+                        help='Orders posted per run (default: 2000)')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[100, 1000],
+                        help='Orders per bulk request (default: 100 1000)')
+    parser.add_argument('--customers', type=int, default=500,
+                        help='Customers to spread orders over (default: 500)')
+    parser.add_argument('--products', type=int, default=50,
+                        help='Products to pick items from (default: 50)')
+    parser.add_argument('--items-per-order', type=int, default=3,
+                        help='Items per order (default: 3)')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Runs per endpoint; the fastest is reported (default: 1)')
+    parser.add_argument('--threads', type=int, nargs='+',
+                        help='Measure concurrent orders on hot products with these '
+                             'thread counts instead (e.g. 1 4 16)')
+
+    args = parser.parse_args()
+
+    run(
+        orders=args.orders,
+        batch_sizes=args.batch_sizes,
+        customers=args.customers,
+        products=args.products,
+        items_per_order=args.items_per_order,
+        repeat=args.repeat,
+        threads=args.threads
+    )
@@ -0,0 +1,136 @@
+"""
+Benchmark deep-page latency of the order list.
+
+Creates a throwaway test database with synthetic customers and orders
+(see benchmark_rfm.seed_synthetic_data) and, for each dataset size,
+times GET /api/orders/ at increasing depths:
+- keyset: the page after a cursor (minicrm/pagination.py)
+- offset: the same page through the former PageNumberPagination
+  (COUNT(*) + OFFSET), for comparison
+
+Keyset latency should stay flat with depth and table size; offset
+latency grows with both. Your regular database is never touched.
+"""
+
+import os
+import sys
+import time
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, script_dir)
+# Sets up Django and the minicrm path
+from benchmark_rfm import benchmark_database, seed_synthetic_data
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import setup_test_environment
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.test import APIClient
+
+from minicrm.pagination import KeysetPagination
+from order.models import Order
+from order.views import OrderViewSet
+
+
+PAGE_FIELDS = 'id,customer,status,order_date,total_price'
+
+
+def median_ms(func, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return sorted(times)[len(times) // 2] * 1000
+
+
+class OffsetPagination(PageNumberPagination):
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+def get_page(client, params):
+    response = client.get(f'/api/orders/?fields={PAGE_FIELDS}&{params}')
+    assert response.status_code == 200, response.data
+
+
+def offset_page(client, offset, page_size):
+    OrderViewSet.pagination_class = OffsetPagination
+    try:
+        get_page(client, f'page_size={page_size}&page={offset // page_size + 1}')
+    finally:
+        del OrderViewSet.pagination_class
+
+
+def benchmark(depths, page_size, repeat):
+    """Time keyset and offset pages at each relative depth; returns result dicts."""
+    client = APIClient()
+    total = Order.objects.count()
+    paginator = KeysetPagination()
+    paginator.ordering = ('-order_date', '-id')
+    results = []
+    for depth in depths:
+        # Whole pages, so both paginators return the same rows
+        offset = min(int(total * depth), max(total - page_size, 0)) // page_size * page_size
+        cursor = None
+        if offset:
+            # The cursor a client would hold after paging down to `offset`
+            previous = Order.objects.order_by('-order_date', '-id')[offset - 1]
+            cursor = paginator.encode_cursor(paginator.key_of(previous), reverse=False)
+        results.append({
+            'orders': total,
+            'offset': offset,
+            'keyset_ms': median_ms(lambda: get_page(
+                client, f'page_size={page_size}&cursor={cursor or ""}'), repeat),
+            'offset_ms': median_ms(lambda: offset_page(client, offset, page_size), repeat),
+        })
+    return results
+
+
+def print_results(results):
+    print(f"{'orders':>9} {'offset':>9} {'keyset ms':>10} {'offset ms':>10}")
+    for r in results:
+        print(
+            f"{r['orders']:>9} {r['offset']:>9} "
+            f"{r['keyset_ms']:>10.2f} {r['offset_ms']:>10.2f}"
+        )
+
+
+def run(sizes, orders_per_customer, depths, page_size, repeat):
+    # With DEBUG on, Django keeps the SQL of every query in memory
+    settings.DEBUG = False
+    setup_test_environment()
+    print("=" * 60)
+    print(f"Order list pagination benchmark ({connection.vendor})")
+    print("=" * 60)
+    with benchmark_database():
+        for size in sizes:
+            print(f"\nSeeding {size} customers (~{orders_per_customer} orders each)...")
+            seed_synthetic_data(size, orders_per_customer)
+            print_results(benchmark(depths, page_size, repeat))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark order list pagination')
+    parser.add_argument('--customers', type=int, nargs='+', default=[1000, 10000],
+                        help='Dataset sizes to benchmark (default: 1000 10000)')
+    parser.add_argument('--orders-per-customer', type=int, default=5,
+                        help='Average number of orders per customer (default: 5)')
+    parser.add_argument('--depths', type=float, nargs='+', default=[0, 0.5, 0.99],
+                        help='Page positions as a fraction of the table (default: 0 0.5 0.99)')
+    parser.add_argument('--page-size', type=int, default=100,
+                        help='Orders per page (default: 100)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Requests per measurement; the median is reported (default: 5)')
+
+    args = parser.parse_args()
+
+    run(
+        sizes=args.customers,
+        orders_per_customer=args.orders_per_customer,
+        depths=args.depths,
+        page_size=args.page_size,
+        repeat=args.repeat
+    )
@@ -0,0 +1,289 @@
+"""
+Benchmark the RFM scoring engines.
+
+Creates a throwaway test database, fills it with synthetic customers and
+orders using bulk inserts, and measures the throughput of each RFM engine
+(see rfm/engines.py):
+- score: calculate scores without persisting (engine.fetch_rows)
+- persist: calculate and upsert scores into rfm_scores (engine.persist)
+
+With --memory it instead reports the peak Python heap (tracemalloc) of
+streaming every scored row through the client and upserting it in
+batches, next to the old fetchall() + dict-per-row approach.
+
+With --workers it times full runs scored in parallel partitions (see
+rfm/partitioning.py) for each worker count and reports the speedup over
+a single worker.
+
+Your regular database is never touched.
+"""
+
+import os
+import sys
+import django
+import random
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+# Add the minicrm directory to the Python path
+# In container: /app/scripts -> /app/ (where Django app is)
+# Locally: source/scripts -> source/minicrm
+script_dir = os.path.dirname(os.path.abspath(__file__))
+if os.path.exists(os.path.join(script_dir, '..', 'minicrm')):
+    # Local development: source/scripts -> source/minicrm
+    sys.path.insert(0, os.path.join(script_dir, '..', 'minicrm'))
+else:
+    # Container: /app/scripts -> /app/
+    sys.path.insert(0, os.path.join(script_dir, '..'))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'minicrm.settings')
+django.setup()
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from customer.models import Customer
+from order.aggregates import rebuild_customer_aggregates
+from order.models import Order
+from rfm.engines import ENGINES, RFMEngine, get_engine
+from rfm.models import RFMScore
+from rfm.persistence import RFM_SCORE_COLUMNS
+from rfm.queries import get_rfm_calculation_query
+from rfm.services import calculate_full_rfm_scores
+
+
+@contextmanager
+def explicit_order_dates():
+    """Let bulk_create store the generated order_date instead of now()."""
+    field = Order._meta.get_field('order_date')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+@contextmanager
+def benchmark_database():
+    """Create a throwaway test database for the duration of the benchmark."""
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def seed_synthetic_data(customers, orders_per_customer=5, seed=42, batch_size=5000):
+    """
+    Insert synthetic customers and orders with bulk_create.
+
+    Order counts are drawn uniformly from 0..2*orders_per_customer, order
+    dates from the last two years and totals from 10-500.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    Order.objects.all().delete()
+    Customer.objects.all().delete()
+
+    with explicit_order_dates():
+        for start in range(0, customers, batch_size):
+            batch = [
+                Customer(
+                    name=f'Customer {i}',
+                    email=f'customer{i}@example.com',
+                    phone='500000000',
+                    address='Benchmark street 1',
+                )
+                for i in range(start, min(start + batch_size, customers))
+            ]
+            Customer.objects.bulk_create(batch)
+            orders = [
+                Order(
+                    customer=customer,
+                    status='delivered',
+                    total_price=Decimal(rng.randint(1000, 50000)) / 100,
+                    order_date=now - timedelta(seconds=rng.randint(0, 730 * 86400)),
+                )
+                for customer in batch
+                for _ in range(rng.randint(0, 2 * orders_per_customer))
+            ]
+            Order.objects.bulk_create(orders, batch_size=batch_size)
+    # bulk_create bypasses the signals maintaining order aggregates
+    rebuild_customer_aggregates()
+
+
+def timed(func):
+    """Returns (seconds, result) of calling func."""
+    started = time.perf_counter()
+    result = func()
+    return time.perf_counter() - started, result
+
+
+def benchmark_engines(engine_names, repeat):
+    """Time each engine; returns a list of result dicts."""
+    customers = Customer.objects.count()
+    results = []
+    for name in engine_names:
+        engine = get_engine(name)
+        score_times = []
+        persist_times = []
+        for _ in range(repeat):
+            seconds, _ = timed(lambda: list(engine.fetch_rows()))
+            score_times.append(seconds)
+            RFMScore.objects.all().delete()
+            seconds, _ = timed(engine.persist)
+            persist_times.append(seconds)
+        results.append({
+            'engine': name,
+            'customers': customers,
+            'score_seconds': min(score_times),
+            'persist_seconds': min(persist_times),
+        })
+    return results
+
+
+def benchmark_workers(worker_counts, repeat, chunk_size=None):
+    """Time partitioned full runs per worker count; returns result dicts."""
+    customers = Customer.objects.count()
+    results = []
+    for workers in worker_counts:
+        times = []
+        for _ in range(repeat):
+            RFMScore.objects.all().delete()
+            seconds, _ = timed(lambda: calculate_full_rfm_scores(
+                chunk_size=chunk_size, workers=workers))
+            times.append(seconds)
+        results.append({
+            'workers': workers,
+            'customers': customers,
+            'seconds': min(times),
+        })
+    return results
+
+
+def print_worker_results(results):
+    # Speedup is relative to the first (usually single-worker) run
+    baseline = results[0]['seconds']
+    print(f"{'workers':>7} {'customers':>10} {'seconds':>9} {'rows/s':>10} {'speedup':>8}")
+    for r in results:
+        print(
+            f"{r['workers']:>7} {r['customers']:>10} {r['seconds']:>9.3f} "
+            f"{r['customers'] / r['seconds']:>10.0f} "
+            f"{baseline / r['seconds']:>7.2f}x"
+        )
+
+
+def peak_memory(func):
+    """Returns the peak traced Python heap in bytes while calling func."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def materialize_all_rows():
+    """The pre-streaming approach: fetchall() and one dict per row."""
+    with connection.cursor() as cursor:
+        cursor.execute(get_rfm_calculation_query(connection.vendor))
+        return [dict(zip(RFM_SCORE_COLUMNS, row)) for row in cursor.fetchall()]
+
+
+def benchmark_memory(engine_names, chunk_size):
+    """Measure peak heap per engine; returns a list of result dicts."""
+    customers = Customer.objects.count()
+    results = [{
+        'engine': 'fetchall',
+        'customers': customers,
+        'peak_bytes': peak_memory(materialize_all_rows),
+    }]
+    for name in engine_names:
+        engine = get_engine(name, chunk_size)
+        RFMScore.objects.all().delete()
+        results.append({
+            'engine': name,
+            'customers': customers,
+            # Force the client-side streaming path on every backend
+            'peak_bytes': peak_memory(lambda: RFMEngine.persist(engine)),
+        })
+    return results
+
+
+def print_memory_results(results):
+    print(f"{'engine':<8} {'customers':>10} {'peak MB':>9} {'bytes/customer':>15}")
+    for r in results:
+        print(
+            f"{r['engine']:<8} {r['customers']:>10} "
+            f"{r['peak_bytes'] / 2 ** 20:>9.1f} "
+            f"{r['peak_bytes'] / max(r['customers'], 1):>15.0f}"
+        )
+
+
+def print_results(results):
+    print(f"{'engine':<8} {'customers':>10} {'score s':>9} {'rows/s':>10} "
+          f"{'persist s':>10} {'rows/s':>10}")
+    for r in results:
+        print(
+            f"{r['engine']:<8} {r['customers']:>10} "
+            f"{r['score_seconds']:>9.3f} {r['customers'] / r['score_seconds']:>10.0f} "
+            f"{r['persist_seconds']:>10.3f} {r['customers'] / r['persist_seconds']:>10.0f}"
+        )
+
+
+def run(sizes, engine_names, orders_per_customer, repeat, memory=False, chunk_size=None,
+        workers=None):
+    # With DEBUG on, Django keeps the SQL of every query in memory
+    settings.DEBUG = False
+    print("=" * 60)
+    kind = 'memory ' if memory else 'parallel ' if workers else ''
+    print(f"RFM engine {kind}benchmark ({connection.vendor})")
+    print("=" * 60)
+    with benchmark_database():
+        for size in sizes:
+            print(f"\nSeeding {size} customers (~{orders_per_customer} orders each)...")
+            seed_synthetic_data(size, orders_per_customer)
+            if memory:
+                print_memory_results(benchmark_memory(engine_names, chunk_size))
+            elif workers:
+                print_worker_results(benchmark_workers(workers, repeat, chunk_size))
+            else:
+                print_results(benchmark_engines(engine_names, repeat))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark RFM scoring engines')
+    parser.add_argument('--customers', type=int, nargs='+', default=[1000, 10000],
+                        help='Dataset sizes to benchmark (default: 1000 10000)')
+    parser.add_argument('--orders-per-customer', type=int, default=5,
+                        help='Average number of orders per customer (default: 5)')
+    parser.add_argument('--engines', nargs='+', choices=sorted(ENGINES),
+                        default=sorted(ENGINES), help='Engines to benchmark')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs per engine; the fastest is reported (default: 3)')
+    parser.add_argument('--memory', action='store_true',
+                        help='Report peak memory of streamed persistence instead of throughput')
+    parser.add_argument('--chunk-size', type=int,
+                        help='Rows per fetch when streaming (default: RFM_CHUNK_SIZE)')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        help='Benchmark partitioned full runs with these worker '
+                             'counts instead of the engines (e.g. 1 2 4 8)')
+
+    args = parser.parse_args()
+
+    run(
+        sizes=args.customers,
+        engine_names=args.engines,
+        orders_per_customer=args.orders_per_customer,
+        repeat=args.repeat,
+        memory=args.memory,
+        chunk_size=args.chunk_size,
+        workers=args.workers
+    )
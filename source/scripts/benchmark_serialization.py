@@ -0,0 +1,153 @@
+"""
+Benchmark list endpoint serialization throughput.
+
+Creates a throwaway test database with synthetic customers, orders (two
+items each) and RFM scores (see benchmark_rfm.seed_synthetic_data) and
+reads the first pages of every list endpoint twice:
+- serializer: model instances through the DRF serializers
+- fast: values_list() rows through the compiled row readers
+  (API_FAST_LIST, minicrm/fastlist.py)
+
+Reports rows/sec of each and checks both return the same bytes. Your
+regular database is never touched.
+"""
+
+import os
+import sys
+import time
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, script_dir)
+# Sets up Django and the minicrm path
+from benchmark_rfm import benchmark_database, seed_synthetic_data
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import setup_test_environment
+from rest_framework.test import APIClient
+
+from order.models import Order, OrderItem
+from product.models import Product
+from rfm.services import calculate_full_rfm_scores
+
+
+ENDPOINTS = [
+    '/api/customers/',
+    '/api/products/',
+    '/api/orders/',
+    '/api/orders/?expand=customer',
+    '/api/rfm/',
+]
+
+
+def seed_items(products=50, items_per_order=2, batch_size=5000):
+    """Products and order items for the synthetic orders."""
+    Product.objects.bulk_create([
+        Product(name=f'Product {i}', description='Benchmark product',
+                price=f'{10 + i}.99', stock=1000)
+        for i in range(products)
+    ])
+    product_ids = list(Product.objects.values_list('id', flat=True))
+    order_ids = list(Order.objects.values_list('id', flat=True))
+    items = [
+        OrderItem(order_id=order_id, product_id=product_ids[(n + i) % len(product_ids)],
+                  quantity=i + 1)
+        for n, order_id in enumerate(order_ids)
+        for i in range(items_per_order)
+    ]
+    OrderItem.objects.bulk_create(items, batch_size=batch_size)
+
+
+def read_pages(client, url, pages, page_size):
+    """Contents and row count of the first `pages` pages of a list."""
+    separator = '&' if '?' in url else '?'
+    url = f'{url}{separator}page_size={page_size}'
+    contents, rows = [], 0
+    for _ in range(pages):
+        response = client.get(url)
+        assert response.status_code == 200, response.content
+        contents.append(response.content)
+        rows += len(response.data['results'])
+        url = response.data['next']
+        if not url:
+            break
+    return contents, rows
+
+
+def measure(client, url, pages, page_size, fast, repeat):
+    """Best rows/sec over `repeat` runs, and the contents of the last."""
+    settings.API_FAST_LIST = fast
+    best = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        contents, rows = read_pages(client, url, pages, page_size)
+        best = max(best, rows / (time.perf_counter() - started))
+    return best, contents
+
+
+def benchmark(pages, page_size, repeat):
+    client = APIClient()
+    results = []
+    for url in ENDPOINTS:
+        before, expected = measure(client, url, pages, page_size, False, repeat)
+        after, contents = measure(client, url, pages, page_size, True, repeat)
+        results.append({
+            'endpoint': url,
+            'serializer_rows_per_sec': before,
+            'fast_rows_per_sec': after,
+            'identical': contents == expected,
+        })
+    return results
+
+
+def print_results(results):
+    print(f"{'endpoint':<30} {'serializer':>12} {'fast':>12} {'speedup':>8} {'identical':>9}")
+    for r in results:
+        print(
+            f"{r['endpoint']:<30} {r['serializer_rows_per_sec']:>12.0f} "
+            f"{r['fast_rows_per_sec']:>12.0f} "
+            f"{r['fast_rows_per_sec'] / r['serializer_rows_per_sec']:>7.1f}x "
+            f"{'yes' if r['identical'] else 'NO':>9}"
+        )
+
+
+def run(customers, orders_per_customer, pages, page_size, repeat):
+    # With DEBUG on, Django keeps the SQL of every query in memory
+    settings.DEBUG = False
+    setup_test_environment()
+    print("=" * 60)
+    print(f"List serialization benchmark ({connection.vendor})")
+    print("=" * 60)
+    with benchmark_database():
+        print(f"\nSeeding {customers} customers (~{orders_per_customer} orders each)...")
+        seed_synthetic_data(customers, orders_per_customer)
+        seed_items()
+        calculate_full_rfm_scores()
+        print(f"Rows/sec over {pages} pages of {page_size}, best of {repeat}:\n")
+        print_results(benchmark(pages, page_size, repeat))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark list endpoint serialization')
+    parser.add_argument('--customers', type=int, default=5000,
+                        help='Number of synthetic customers (default: 5000)')
+    parser.add_argument('--orders-per-customer', type=int, default=5,
+                        help='Average number of orders per customer (default: 5)')
+    parser.add_argument('--pages', type=int, default=20,
+                        help='Pages read per endpoint (default: 20)')
+    parser.add_argument('--page-size', type=int, default=100,
+                        help='Rows per page (default: 100)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs per measurement; the best is reported (default: 3)')
+
+    args = parser.parse_args()
+
+    run(
+        customers=args.customers,
+        orders_per_customer=args.orders_per_customer,
+        pages=args.pages,
+        page_size=args.page_size,
+        repeat=args.repeat
+    )
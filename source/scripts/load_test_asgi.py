@@ -0,0 +1,383 @@
+"""
+Load test of the WSGI and ASGI deployments at equal CPU.
+
+Starts gunicorn on the configured database (seed it first, e.g. with
+seed_fake_data.py --bulk and calculate_rfm; the load test only reads),
+once per deployment, with the same number of workers pinned to the same
+CPUs (--cpus, Linux):
+- wsgi: sync workers and minicrm.wsgi, the default of start.sh
+- asgi: uvicorn workers and minicrm.asgi with the async read views
+  (API_ASYNC_READS=True, minicrm/asyncviews.py)
+
+For every --slow-clients level, that many slow clients keep connections
+busy, each sending its requests a few bytes at a time over
+--slow-seconds (mobile clients, or a proxy that does not buffer
+requests), while --clients fast clients read the list, detail and RFM
+summary endpoints for --duration seconds. Reported per deployment and
+level: requests/sec and latency percentiles of the fast clients, their
+errors and timeouts, and the slow requests that completed.
+
+The load generator is a single asyncio process with plain HTTP/1.1
+connections; it runs on the CPUs not given to the servers when there
+are any.
+"""
+
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import urllib.request
+
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+DEPLOYMENTS = {
+    'wsgi': {
+        'app': 'minicrm.wsgi:application',
+        'worker_class': 'sync',
+        'env': {'API_ASYNC_READS': 'False'},
+    },
+    'asgi': {
+        'app': 'minicrm.asgi:application',
+        'worker_class': 'uvicorn_worker.UvicornWorker',
+        'env': {'API_ASYNC_READS': 'True'},
+    },
+}
+
+LIST_PATHS = [
+    '/api/customers/?page_size=50',
+    '/api/products/?page_size=50',
+    '/api/orders/?page_size=50',
+    '/api/rfm/?page_size=50',
+    '/api/rfm/by-segment/',
+    '/api/rfm/statistics/',
+]
+# Detail endpoints, looked up from the first row of these lists
+DETAIL_RESOURCES = {'customers': 'id', 'products': 'id', 'orders': 'id'}
+
+REQUEST_TIMEOUT = 30.0
+SLOW_CHUNKS = 10
+
+
+def find_app_dir():
+    """The Django project directory (source tree or container layout)."""
+    for directory in (os.path.join(script_dir, '..', 'minicrm'), os.getcwd()):
+        if os.path.exists(os.path.join(directory, 'manage.py')):
+            return os.path.abspath(directory)
+    sys.exit('manage.py not found: run from the Django project directory')
+
+
+def raise_open_files_limit():
+    """Thousands of connections need as many file descriptors."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+def start_server(deployment, port, workers, cpus, app_dir):
+    config = DEPLOYMENTS[deployment]
+    env = dict(
+        os.environ,
+        DEBUG='False',
+        ALLOWED_HOSTS='127.0.0.1,localhost',
+        # Metrics files of the throwaway servers are not needed
+        METRICS_DIR='',
+        **config['env'],
+    )
+
+    def pin():
+        if cpus:
+            os.sched_setaffinity(0, cpus)
+
+    server = subprocess.Popen(
+        [
+            sys.executable, '-m', 'gunicorn',
+            '--bind', f'127.0.0.1:{port}',
+            '--workers', str(workers),
+            '--worker-class', config['worker_class'],
+            '--timeout', '120',
+            '--backlog', '4096',
+            '--log-level', 'warning',
+            config['app'],
+        ],
+        cwd=app_dir, env=env, preexec_fn=pin,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            sys.exit(f'{deployment} server exited with {server.returncode}')
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/health/live', timeout=1):
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    sys.exit(f'{deployment} server did not start within 30s')
+
+
+def stop_server(server):
+    server.terminate()
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+def discover_paths(port):
+    """LIST_PATHS plus one detail URL per resource."""
+    paths = list(LIST_PATHS)
+    for resource_name, key in DETAIL_RESOURCES.items():
+        url = f'http://127.0.0.1:{port}/api/{resource_name}/?page_size=1'
+        with urllib.request.urlopen(url, timeout=REQUEST_TIMEOUT) as response:
+            results = json.load(response)['results']
+        if not results:
+            sys.exit(f'No {resource_name} in the database: seed it first')
+        paths.append(f'/api/{resource_name}/{results[0][key]}/')
+    return paths
+
+
+def build_request(path):
+    return (
+        f'GET {path} HTTP/1.1\r\n'
+        f'Host: 127.0.0.1\r\n'
+        f'Accept: application/json\r\n'
+        f'\r\n'
+    ).encode()
+
+
+async def read_response(reader):
+    """
+    Returns:
+        tuple: (status code, whether the connection stays open)
+    """
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ', 2)[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+        keep_alive = headers.get('connection', '').lower() != 'close'
+    else:
+        await reader.read()
+        keep_alive = False
+    return status, keep_alive
+
+
+class Results:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.timeouts = 0
+        self.slow_completed = 0
+        self.slow_failed = 0
+
+
+async def close(writer):
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+
+
+async def fast_client(port, paths, offset, deadline, results):
+    """Requests paths in turn, reusing the connection when the server allows."""
+    connection = None
+    n = offset
+    while time.monotonic() < deadline:
+        path = paths[n % len(paths)]
+        n += 1
+        started = time.perf_counter()
+        try:
+            if connection is None:
+                connection = await asyncio.wait_for(
+                    asyncio.open_connection('127.0.0.1', port), REQUEST_TIMEOUT)
+            reader, writer = connection
+            writer.write(build_request(path))
+            await writer.drain()
+            status, keep_alive = await asyncio.wait_for(read_response(reader), REQUEST_TIMEOUT)
+        except asyncio.TimeoutError:
+            results.timeouts += 1
+            keep_alive, status = False, None
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            results.errors += 1
+            keep_alive, status = False, None
+        else:
+            if status == 200:
+                results.latencies.append(time.perf_counter() - started)
+            else:
+                results.errors += 1
+        if not keep_alive and connection is not None:
+            await close(connection[1])
+            connection = None
+    if connection is not None:
+        await close(connection[1])
+
+
+async def slow_client(port, paths, offset, deadline, slow_seconds, results):
+    """Sends each request in SLOW_CHUNKS pieces spread over slow_seconds."""
+    n = offset
+    while time.monotonic() < deadline:
+        request = build_request(paths[n % len(paths)])
+        n += 1
+        size = -(-len(request) // SLOW_CHUNKS)
+        writer = None
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection('127.0.0.1', port), REQUEST_TIMEOUT)
+            for start in range(0, len(request), size):
+                writer.write(request[start:start + size])
+                await writer.drain()
+                await asyncio.sleep(slow_seconds / SLOW_CHUNKS)
+            await asyncio.wait_for(read_response(reader), REQUEST_TIMEOUT + slow_seconds)
+            results.slow_completed += 1
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            results.slow_failed += 1
+        finally:
+            if writer is not None:
+                await close(writer)
+
+
+async def run_load(port, paths, clients, slow_clients, slow_seconds, duration):
+    results = Results()
+    deadline = time.monotonic() + duration
+    # The slow clients get their connections going first
+    slow = [
+        asyncio.create_task(slow_client(port, paths, i, deadline, slow_seconds, results))
+        for i in range(slow_clients)
+    ]
+    await asyncio.sleep(min(slow_seconds / 2, 1.0) if slow_clients else 0)
+    started = time.monotonic()
+    await asyncio.gather(*(
+        fast_client(port, paths, i, deadline, results) for i in range(clients)))
+    elapsed = time.monotonic() - started
+    await asyncio.gather(*slow)
+    return summarize(results, elapsed)
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def summarize(results, elapsed):
+    latencies = results.latencies
+
+    def ms(value):
+        return round(value * 1000, 1) if value is not None else None
+
+    return {
+        'requests': len(latencies),
+        'requests_per_sec': round(len(latencies) / elapsed, 1) if elapsed else 0,
+        'p50_ms': ms(percentile(latencies, 0.5)),
+        'p95_ms': ms(percentile(latencies, 0.95)),
+        'p99_ms': ms(percentile(latencies, 0.99)),
+        'errors': results.errors,
+        'timeouts': results.timeouts,
+        'slow_completed': results.slow_completed,
+        'slow_failed': results.slow_failed,
+    }
+
+
+def print_row(deployment, slow_clients, result):
+    def number(value):
+        return f'{value:>9.1f}' if value is not None else f"{'-':>9}"
+
+    print(
+        f"{deployment:<6} {slow_clients:>6} {result['requests_per_sec']:>9.1f} "
+        f"{number(result['p50_ms'])} {number(result['p95_ms'])} {number(result['p99_ms'])} "
+        f"{result['errors'] + result['timeouts']:>7} "
+        f"{result['slow_completed']:>5}/{result['slow_completed'] + result['slow_failed']:<5}"
+    )
+
+
+def run(deployments, workers, cpus, clients, slow_clients, slow_seconds, duration, port,
+        output=None):
+    app_dir = find_app_dir()
+    open_files = raise_open_files_limit()
+    needed = clients + max(slow_clients) + 100
+    if open_files < needed:
+        print(f'WARNING: open files limit {open_files} is below the ~{needed} connections')
+    if cpus:
+        others = set(os.sched_getaffinity(0)) - set(cpus)
+        if others:
+            os.sched_setaffinity(0, others)
+
+    print('=' * 70)
+    print(f"WSGI vs ASGI: {workers} workers per deployment"
+          f"{f' on CPUs {sorted(cpus)}' if cpus else ''}, {clients} fast clients, "
+          f"{duration}s per level, slow requests take {slow_seconds}s")
+    print('=' * 70)
+    print(f"{'server':<6} {'slow':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'errors':>7} {'slow done'}")
+
+    report = {'workers': workers, 'cpus': sorted(cpus or []), 'clients': clients,
+              'slow_seconds': slow_seconds, 'duration': duration, 'results': {}}
+    for deployment in deployments:
+        server = start_server(deployment, port, workers, cpus, app_dir)
+        try:
+            paths = discover_paths(port)
+            for level in slow_clients:
+                result = asyncio.run(
+                    run_load(port, paths, clients, level, slow_seconds, duration))
+                report['results'].setdefault(deployment, {})[str(level)] = result
+                print_row(deployment, level, result)
+        finally:
+            stop_server(server)
+
+    if output:
+        with open(output, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f'\nResults written to {output}')
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Load test the WSGI and ASGI deployments at equal CPU')
+    parser.add_argument('--deployments', nargs='+', choices=list(DEPLOYMENTS),
+                        default=list(DEPLOYMENTS),
+                        help='Deployments to test (default: wsgi asgi)')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='gunicorn workers of each deployment (default: 4, as start.sh)')
+    parser.add_argument('--cpus', type=int, nargs='+',
+                        help='CPUs the servers are pinned to (default: not pinned)')
+    parser.add_argument('--clients', type=int, default=50,
+                        help='Concurrent fast clients (default: 50)')
+    parser.add_argument('--slow-clients', type=int, nargs='+', default=[0, 100, 1000],
+                        help='Concurrent slow clients, one run per level (default: 0 100 1000)')
+    parser.add_argument('--slow-seconds', type=float, default=5.0,
+                        help='Seconds a slow client takes to send a request (default: 5)')
+    parser.add_argument('--duration', type=float, default=20.0,
+                        help='Seconds per level (default: 20)')
+    parser.add_argument('--port', type=int, default=8099,
+                        help='Port the servers listen on (default: 8099)')
+    parser.add_argument('--output',
+                        help='Also write the results to this JSON file')
+
+    args = parser.parse_args()
+
+    run(
+        deployments=args.deployments,
+        workers=args.workers,
+        cpus=set(args.cpus) if args.cpus else None,
+        clients=args.clients,
+        slow_clients=args.slow_clients,
+        slow_seconds=args.slow_seconds,
+        duration=args.duration,
+        port=args.port,
+        output=args.output,
+    )
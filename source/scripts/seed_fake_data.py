@@ -8,13 +8,25 @@ with Gaussian distribution to simulate different purchasing behaviors:
 - New Customers: High recency, low frequency and monetary value
 - At-Risk Customers: Previously high frequency, now low recency
 - Lapsed Customers: Low scores across all dimensions
+
+By default every object is saved one at a time through the ORM. With
+--bulk, customers, orders and items are generated in memory with
+pre-assigned UUIDs and explicit order dates (in parallel with
+--workers) and written with bulk_create in large batches. --seed makes
+the generated data reproducible.
 """
 
 import os
 import sys
 import django
 import random
-from datetime import datetime, timedelta
+import time
+import uuid
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
 from django.utils import timezone
 from faker import Faker
 
@@ -32,8 +44,11 @@ else:
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'minicrm.settings')
 django.setup()
 
+from django.db import connections, transaction
+
 from customer.models import Customer
 from product.models import Product
+from order.aggregates import rebuild_customer_aggregates
 from order.models import Order, OrderItem
 
 fake = Faker('pl_PL')  # Polish locale for more realistic data
@@ -92,9 +107,17 @@ CONFIG = {
 }
 
 
-def generate_gaussian_value(mean, std, min_value=0):
+# Customers generated per task in --bulk mode; shards (and their random
+# seeds) do not depend on the number of workers
+BULK_SHARD_SIZE = 1000
+DEFAULT_BULK_BATCH_SIZE = 5000
+
+SeedProduct = namedtuple('SeedProduct', ['id', 'price'])
+
+
+def generate_gaussian_value(mean, std, min_value=0, rng=random):
     """Generate a value from Gaussian distribution with minimum constraint."""
-    value = random.gauss(mean, std)
+    value = rng.gauss(mean, std)
     return max(min_value, int(round(value)))
 
 
@@ -119,34 +142,40 @@ def seed_products(n=20):
     return products
 
 
-def generate_orders_for_customer(customer, persona_config, products, end_date):
+def plan_orders(persona_config, products, end_date, rng=random):
     """
-    Generate orders for a customer based on persona configuration.
+    Generate the orders of one customer based on persona configuration.
     
     Args:
-        customer: Customer instance
         persona_config: Dictionary with frequency_mean, monetary_mean, etc.
-        products: List of available products
+        products: List of available products (anything with a price)
         end_date: End date for order generation
+        rng: Random number generator (default: the random module)
+    
+    Returns:
+        list: (order_date, status, [(product, quantity), ...], total) per order
     """
     # Calculate target values from persona
     target_frequency = generate_gaussian_value(
         persona_config['frequency_mean'],
         persona_config['frequency_std'],
-        min_value=1
+        min_value=1,
+        rng=rng
     )
     
     target_monetary = generate_gaussian_value(
         persona_config['monetary_mean'],
         persona_config['monetary_std'],
-        min_value=50
+        min_value=50,
+        rng=rng
     )
     
     # Calculate recency (days since last order)
     target_recency_days = generate_gaussian_value(
         persona_config['recency_mean'],
         persona_config['recency_std'],
-        min_value=1
+        min_value=1,
+        rng=rng
     )
     
     # Calculate last order date
@@ -159,21 +188,21 @@ def generate_orders_for_customer(customer, persona_config, products, end_date):
         order_dates = []
         for i in range(target_frequency):
             # Bias towards recent dates
-            days_ago = random.randint(0, min(90, target_recency_days + 30))
+            days_ago = rng.randint(0, min(90, target_recency_days + 30))
             order_date = end_date - timedelta(days=days_ago)
             order_dates.append(order_date)
     elif persona_config['recency_mean'] > 100:  # At-risk or lapsed
         # Orders in the past, not recent
         order_dates = []
         for i in range(target_frequency):
-            days_ago = random.randint(target_recency_days - 30, target_recency_days + 100)
+            days_ago = rng.randint(target_recency_days - 30, target_recency_days + 100)
             order_date = end_date - timedelta(days=days_ago)
             order_dates.append(order_date)
     else:  # Champions, loyal
         # Spread evenly over time
         order_dates = []
         for i in range(target_frequency):
-            days_ago = random.randint(0, target_recency_days + 60)
+            days_ago = rng.randint(0, target_recency_days + 60)
             order_date = end_date - timedelta(days=days_ago)
             order_dates.append(order_date)
     
@@ -185,15 +214,59 @@ def generate_orders_for_customer(customer, persona_config, products, end_date):
     # Calculate average order value
     avg_order_value = target_monetary / max(target_frequency, 1)
     
-    # Generate orders
+    orders = []
+    for order_date in order_dates:
+        status = rng.choice(['delivered', 'shipped', 'delivered'])  # Mostly completed
+        
+        # Generate order items
+        num_items = rng.randint(1, 5)
+        selected_products = rng.sample(products, min(num_items, len(products)))
+        
+        items = []
+        order_total = 0
+        for product in selected_products:
+            quantity = rng.randint(1, 3)
+            items.append((product, quantity))
+            order_total += product.price * quantity
+        
+        # Adjust order value to match target monetary (with some variance)
+        variance = rng.uniform(0.7, 1.3)
+        target_order_value = avg_order_value * variance
+        
+        if order_total < target_order_value:
+            # Add more items or increase quantity
+            additional_items = rng.randint(1, 2)
+            for _ in range(additional_items):
+                product = rng.choice(products)
+                quantity = rng.randint(1, 2)
+                items.append((product, quantity))
+                order_total += product.price * quantity
+        
+        orders.append((order_date, status, items, order_total))
+    
+    return orders
+
+
+def generate_orders_for_customer(customer, persona_config, products, end_date):
+    """
+    Generate and save orders for a customer based on persona configuration.
+    
+    Args:
+        customer: Customer instance
+        persona_config: Dictionary with frequency_mean, monetary_mean, etc.
+        products: List of available products
+        end_date: End date for order generation
+    """
     orders = []
     total_generated = 0
     
-    for order_date in order_dates:
+    for order_date, status, items, order_total in plan_orders(
+        persona_config, products, end_date
+    ):
         # Create order - we'll set the date after creation
         order = Order(
             customer=customer,
-            status=random.choice(['delivered', 'shipped', 'delivered']),  # Mostly completed
+            status=status,
             total_price=0
         )
         # Save without date first
@@ -202,36 +275,12 @@ def generate_orders_for_customer(customer, persona_config, products, end_date):
         Order.objects.filter(id=order.id).update(order_date=order_date)
         order.refresh_from_db()
         
-        # Generate order items
-        num_items = random.randint(1, 5)
-        selected_products = random.sample(products, min(num_items, len(products)))
-        
-        order_total = 0
-        for product in selected_products:
-            quantity = random.randint(1, 3)
+        for product, quantity in items:
             OrderItem.objects.create(
                 order=order,
                 product=product,
                 quantity=quantity
             )
-            order_total += product.price * quantity
-        
-        # Adjust order value to match target monetary (with some variance)
-        variance = random.uniform(0.7, 1.3)
-        target_order_value = avg_order_value * variance
-        
-        if order_total < target_order_value:
-            # Add more items or increase quantity
-            additional_items = random.randint(1, 2)
-            for _ in range(additional_items):
-                product = random.choice(products)
-                quantity = random.randint(1, 2)
-                OrderItem.objects.create(
-                    order=order,
-                    product=product,
-                    quantity=quantity
-                )
-                order_total += product.price * quantity
         
         # Update order total
         order.total_price = round(order_total, 2)
@@ -279,6 +328,181 @@ def seed_customers_with_personas(products, end_date):
     return all_customers
 
 
+def seeded_uuid(rng):
+    """Random UUID4 drawn from rng, so --seed reproduces primary keys."""
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+@contextmanager
+def explicit_order_dates():
+    """Let bulk_create store the generated order_date instead of now()."""
+    field = Order._meta.get_field('order_date')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def seed_products_bulk(n, rng, fake):
+    """Generate product catalog with one bulk insert."""
+    print(f"Generating {n} products...")
+    products = [
+        Product(
+            id=seeded_uuid(rng),
+            name=fake.word().capitalize() + " " + fake.word().capitalize(),
+            description=fake.sentence(),
+            price=Decimal(f'{rng.uniform(10, 500):.2f}'),
+            stock=rng.randint(50, 1000),
+        )
+        for _ in range(n)
+    ]
+    Product.objects.bulk_create(products)
+    print(f"Created {len(products)} products")
+    return [SeedProduct(product.id, product.price) for product in products]
+
+
+def generate_shard(task):
+    """
+    Generate the customers, orders and items of one shard of a persona.
+    
+    Runs in worker processes: only builds rows, never touches the database.
+    The random state depends on (seed, persona, shard) only, so the data
+    is the same for any number of workers.
+    
+    Args:
+        task: (seed, persona_name, persona_config, first customer number,
+            number of customers, products, end_date)
+    
+    Returns:
+        dict: 'customers', 'orders' and 'items' rows, and per customer
+        'stats' for print_summary
+    """
+    seed, persona_name, persona_config, first, count, products, end_date = task
+    rng = random.Random(f'{seed}:{persona_name}:{first}')
+    fake = Faker('pl_PL')
+    fake.seed_instance(rng.getrandbits(64))
+    
+    shard = {'customers': [], 'orders': [], 'items': [], 'stats': []}
+    for number in range(first, first + count):
+        customer_id = seeded_uuid(rng)
+        # The customer number keeps emails unique across shards
+        email = f'{fake.user_name()}.{number}@{fake.free_email_domain()}'
+        shard['customers'].append(
+            (customer_id, fake.name(), email, fake.msisdn()[:10], fake.address())
+        )
+        
+        orders = plan_orders(persona_config, products, end_date, rng=rng)
+        total_value = 0
+        for order_date, status, items, order_total in orders:
+            order_id = seeded_uuid(rng)
+            shard['orders'].append(
+                (order_id, customer_id, status, order_date, round(order_total, 2))
+            )
+            shard['items'].extend(
+                (order_id, product.id, quantity) for product, quantity in items
+            )
+            total_value += order_total
+        shard['stats'].append({
+            'persona': persona_name,
+            'orders_count': len(orders),
+            'total_value': total_value,
+        })
+    return shard
+
+
+def generate_shards(tasks, workers):
+    """
+    Yield generated shards in task order.
+    
+    With several workers, at most 2 * workers shards are generated ahead of
+    the one being written, which bounds memory for any dataset size.
+    """
+    if workers <= 1:
+        yield from map(generate_shard, tasks)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for task in tasks:
+            pending.append(executor.submit(generate_shard, task))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def write_shard(shard, batch_size):
+    """Insert the rows of one shard with bulk_create, in one transaction."""
+    with transaction.atomic():
+        Customer.objects.bulk_create(
+            [
+                Customer(id=id, name=name, email=email, phone=phone, address=address)
+                for id, name, email, phone, address in shard['customers']
+            ],
+            batch_size=batch_size
+        )
+        Order.objects.bulk_create(
+            [
+                Order(
+                    id=id,
+                    customer_id=customer_id,
+                    status=status,
+                    order_date=order_date,
+                    total_price=total_price
+                )
+                for id, customer_id, status, order_date, total_price in shard['orders']
+            ],
+            batch_size=batch_size
+        )
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(order_id=order_id, product_id=product_id, quantity=quantity)
+                for order_id, product_id, quantity in shard['items']
+            ],
+            batch_size=batch_size
+        )
+
+
+def seed_customers_bulk(products, end_date, seed, workers=1, batch_size=None):
+    """
+    Generate customers based on predefined personas and bulk insert them.
+    
+    Personas are split into shards of BULK_SHARD_SIZE customers, generated
+    by `workers` processes and written by this one.
+    """
+    print(f"\n=== Generating customers with personas (bulk, {workers} workers) ===")
+    batch_size = batch_size or DEFAULT_BULK_BATCH_SIZE
+    
+    tasks = []
+    first = 0
+    for persona_name, persona_config in CONFIG['personas'].items():
+        count = persona_config['count']
+        for start in range(0, count, BULK_SHARD_SIZE):
+            tasks.append((
+                seed, persona_name, persona_config, first + start,
+                min(BULK_SHARD_SIZE, count - start), products, end_date
+            ))
+        first += count
+    
+    # Worker processes must not inherit open database connections
+    connections.close_all()
+    all_customers = []
+    rows = 0
+    started = time.perf_counter()
+    with explicit_order_dates():
+        for shard in generate_shards(tasks, workers):
+            write_shard(shard, batch_size)
+            all_customers.extend(shard['stats'])
+            rows += len(shard['customers']) + len(shard['orders']) + len(shard['items'])
+            elapsed = time.perf_counter() - started
+            print(f"  Written {len(all_customers)}/{first} customers "
+                  f"({rows} rows, {rows / elapsed:.0f} rows/sec)")
+    
+    # bulk_create bypasses the signals maintaining order aggregates
+    rebuild_customer_aggregates()
+    return all_customers
+
+
 def print_summary(customers_data):
     """Print summary of generated data."""
     print("\n=== Generation Summary ===")
@@ -303,13 +527,19 @@ def print_summary(customers_data):
         print(f"    Total value: {persona_value:.2f}")
 
 
-def run(total_customers=None, date_range_days=None):
+def run(total_customers=None, date_range_days=None, bulk=False, workers=1, seed=None,
+        batch_size=None, end_date=None):
     """
     Main function to generate synthetic data.
     
     Args:
         total_customers: Override total number of customers (optional)
         date_range_days: Override date range in days (optional)
+        bulk: Generate in memory and write with bulk_create
+        workers: Processes generating customers in bulk mode
+        seed: Random seed for a reproducible dataset (optional)
+        batch_size: Rows per INSERT in bulk mode (optional)
+        end_date: Date of the most recent orders (default: now)
     """
     if total_customers:
         # Adjust persona counts proportionally
@@ -330,19 +560,40 @@ def run(total_customers=None, date_range_days=None):
     print("=" * 60)
     
     # Calculate end date (today) - use timezone-aware datetime
-    end_date = timezone.now()
+    if end_date is None:
+        end_date = timezone.now()
+    else:
+        end_date = datetime.fromisoformat(end_date)
+        if timezone.is_naive(end_date):
+            end_date = end_date.replace(tzinfo=dt_timezone.utc)
     start_date = end_date - timedelta(days=CONFIG['date_range_days'])
     
     print(f"Date range: {start_date.date()} to {end_date.date()}")
     
-    # Generate products first
-    products = seed_products(20)
+    if bulk and seed is None:
+        # Printed so the dataset can be generated again
+        seed = random.randrange(2 ** 32)
+    if seed is not None:
+        print(f"Random seed: {seed}")
+        random.seed(seed)
+        Faker.seed(seed)
     
-    # Generate customers with personas
-    customers_data = seed_customers_with_personas(products, end_date)
+    started = time.perf_counter()
+    if bulk:
+        products = seed_products_bulk(20, random.Random(f'{seed}:products'), fake)
+        customers_data = seed_customers_bulk(
+            products, end_date, seed, workers=workers, batch_size=batch_size
+        )
+    else:
+        # Generate products first
+        products = seed_products(20)
+        
+        # Generate customers with personas
+        customers_data = seed_customers_with_personas(products, end_date)
     
     # Print summary
     print_summary(customers_data)
+    print(f"Elapsed: {time.perf_counter() - started:.1f}s")
     
     print("\n✅ Data generation completed!")
     print("\nNext steps:")
@@ -357,10 +608,27 @@ if __name__ == "__main__":
     parser.add_argument('--customers', type=int, help='Total number of customers to generate')
     parser.add_argument('--days', type=int, help='Date range in days (default: 730 = 2 years)')
     parser.add_argument('--verbose', '-v', action='store_true', help='Verbose output')
+    parser.add_argument('--bulk', action='store_true',
+                        help='Generate in memory and write with bulk_create in large batches')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Processes generating customers in --bulk mode (default: 1)')
+    parser.add_argument('--seed', type=int,
+                        help='Random seed for a reproducible dataset (with --end-date)')
+    parser.add_argument('--batch-size', type=int,
+                        help=f'Rows per INSERT in --bulk mode (default: {DEFAULT_BULK_BATCH_SIZE})')
+    parser.add_argument('--end-date',
+                        help='Date of the most recent orders, YYYY-MM-DD (default: now)')
     
     args = parser.parse_args()
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
     
     run(
         total_customers=args.customers,
-        date_range_days=args.days
+        date_range_days=args.days,
+        bulk=args.bulk,
+        workers=args.workers,
+        seed=args.seed,
+        batch_size=args.batch_size,
+        end_date=args.end_date
     )
@@ -0,0 +1,122 @@
+"""
+Smoke test of start.sh in the WSGI and ASGI deployments.
+
+Runs start.sh from source/minicrm with the environment of the image
+(Containerfile, .s2i/environment: APP_MODULE=minicrm.wsgi:application),
+once with API_ASYNC_READS=False and once with True, and checks that
+gunicorn comes up on port 8080 with the expected worker class and
+serves the health probe and an API list. Migrations run as on container
+start, against the configured database.
+
+Exits with status 1 when a deployment fails.
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+PORT = 8080
+# Environment of the image
+IMAGE_ENV = {'APP_MODULE': 'minicrm.wsgi:application'}
+
+DEPLOYMENTS = {
+    # Server header of the deployment's workers
+    'wsgi': {'env': {'API_ASYNC_READS': 'False'}, 'server': 'gunicorn'},
+    'asgi': {'env': {'API_ASYNC_READS': 'True'}, 'server': 'uvicorn'},
+}
+
+CHECK_PATHS = ['/health/live', '/api/customers/?page_size=1']
+
+
+def get(path, timeout=5):
+    with urllib.request.urlopen(f'http://127.0.0.1:{PORT}{path}', timeout=timeout) as response:
+        return response.status, response.headers.get('Server', ''), response.read()
+
+
+def wait_until_up(server, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            return False
+        try:
+            get('/health/live', timeout=1)
+            return True
+        except OSError:
+            time.sleep(0.5)
+    return False
+
+
+def stop(server):
+    # start.sh execs gunicorn, which runs in the process group of the script
+    os.killpg(server.pid, signal.SIGTERM)
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        os.killpg(server.pid, signal.SIGKILL)
+        server.wait()
+
+
+def check(deployment, app_dir, timeout):
+    """
+    Start one deployment with start.sh and request CHECK_PATHS.
+
+    Returns:
+        list: Failure messages, empty when the deployment works
+    """
+    config = DEPLOYMENTS[deployment]
+    env = dict(os.environ, ALLOWED_HOSTS='127.0.0.1,localhost', **IMAGE_ENV, **config['env'])
+    server = subprocess.Popen(
+        ['bash', 'start.sh'], cwd=app_dir, env=env, start_new_session=True,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        if not wait_until_up(server, timeout):
+            return [f'server did not answer /health/live within {timeout}s']
+        failures = []
+        for path in CHECK_PATHS:
+            try:
+                status, server_header, body = get(path)
+                json.loads(body)
+            except (OSError, ValueError) as exc:
+                failures.append(f'{path}: {exc}')
+                continue
+            if status != 200:
+                failures.append(f'{path}: status {status}')
+            if config['server'] not in server_header.lower():
+                failures.append(f'{path}: served by {server_header!r}, '
+                                f'expected {config["server"]}')
+        return failures
+    finally:
+        stop(server)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--deployments', nargs='+', choices=DEPLOYMENTS,
+                        default=list(DEPLOYMENTS),
+                        help='Deployments to start (default: wsgi asgi)')
+    parser.add_argument('--timeout', type=float, default=60,
+                        help='Seconds to wait for a deployment to start (default: 60)')
+    args = parser.parse_args()
+
+    app_dir = os.path.join(os.path.dirname(script_dir), 'minicrm')
+    failed = False
+    for deployment in args.deployments:
+        failures = check(deployment, app_dir, args.timeout)
+        print(f'{deployment}: {"FAILED" if failures else "ok"}')
+        for failure in failures:
+            print(f'  {failure}')
+        failed = failed or bool(failures)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()